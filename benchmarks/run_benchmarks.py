@@ -0,0 +1,407 @@
+"""
+Benchmarks of the data pipeline on synthetic listings.
+
+Run one benchmark with its integer arguments, from the repository root:
+
+    python -m benchmarks.run_benchmarks backends 10000 100000
+"""
+import sys
+import time
+from dataclasses import fields, replace
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import WORDS, synthetic_records
+from src import data_cleaning, file_management, graph_utils, utilities
+from src.config import DASHBOARD_RENDER_MODE, GOCAR_RESULTS
+from src.data import electric_car_models, fair_price, normalization, price_changes
+from src.data.backends import BACKENDS, PandasBackend, get_backend, pl
+from src.data.car_batch import CarBatch
+from src.data.electric_car_data import ElectricCar
+from src.data.price_index import SortedPriceIndex
+from src.data.watchlists import Watchlist, WatchlistIndex
+from src.logging_config import setup_logging
+from src.sites.gocar.gocar_data import Formatted
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+def _run_backend_pipeline(backend, batch):
+    models = [f"{car.brand_name} {car.model_name}" for car in batch]
+    years = [car.first_registration_year or 0 for car in batch]
+
+    df = backend.create_dataframe(batch)
+    df = backend.add_columns(df, model=models, year=years)
+    df = backend.add_row_hash(df)
+    df = backend.sort_and_deduplicate(df)
+    return backend.to_pandas(df)
+
+
+def benchmark_backends(*sizes):
+    """Time the display dataset pipeline and the price drops on each backend."""
+    sizes = sizes or (10_000, 100_000, 1_000_000, 5_000_000)
+    names = [name for name in BACKENDS if name != "polars" or pl is not None]
+    for rows in sizes:
+        batch = CarBatch.from_records(synthetic_records(rows))
+        frame = PandasBackend().create_dataframe(batch)
+        other_frame = PandasBackend().create_dataframe(
+            CarBatch.from_records(synthetic_records(rows, seed=1))
+        )
+        for name in names:
+            backend = get_backend(name)
+            start = time.perf_counter()
+            _run_backend_pipeline(backend, batch)
+            prepared = time.perf_counter()
+            backend.detect_price_drops(frame, other_frame)
+            done = time.perf_counter()
+            logger.info(
+                f"{name:>6} {rows:>9} rows: dataset {prepared - start:.3f}s, "
+                f"price drops {done - prepared:.3f}s"
+            )
+
+
+def synthetic_gocar_hit():
+    """Return a Gocar search hit with the attributes the scraper reads."""
+    formatted = {field.name: None for field in fields(Formatted)}
+    formatted.update(
+        id=123456,
+        l_bmarque="Tesla",
+        l_model="Model 3",
+        l_b_version="Long Range",
+        is_pro=1,
+        new=False,
+        first_registration_year="2021",
+        kilometers=45000,
+        price={"for_filtering": 32990, "unformatted": 32990.0},
+        warranty_months=12,
+        description="Tesla Model 3 Long Range, autopilot",
+        url="https://www.gocar.be/fr/voiture-occasion/123456",
+        cover="https://images.gocar.be/123456.jpg",
+    )
+    return {"_formatted": formatted}
+
+
+def _decode_with_dataclass(hit):
+    # Decoding of a hit through the full Formatted dataclass, as the Gocar
+    # scraper did before _decode_hit()
+    formatted_data = Formatted(**hit["_formatted"])
+    p = formatted_data.price
+    return {
+        "id": normalization.to_str(formatted_data.id),
+        "brand_name": formatted_data.l_bmarque.upper(),
+        "model_name": formatted_data.l_model.upper(),
+        "version": formatted_data.l_b_version.upper(),
+        "body_style": formatted_data.body_style,
+        "vehicle_type": formatted_data.vehicle_type,
+        "published_date": formatted_data.published_date,
+        "is_pro": normalization.to_bool(formatted_data.is_pro),
+        "new": normalization.to_bool(formatted_data.new),
+        "first_registration_year": utilities.extract_year(
+            normalization.to_str(formatted_data.first_registration_year)
+        ),
+        "kilometers": normalization.to_int(formatted_data.kilometers),
+        "price": float(p.get("for_filtering", p.get("unformatted", 0.0))),
+        "warranty_months": normalization.to_int(formatted_data.warranty_months),
+        "car_pass": normalization.to_bool(formatted_data.has_carpass_check),
+        "description": formatted_data.description,
+        "url": formatted_data.url,
+        "point_of_sale_city": formatted_data.point_of_sale_city,
+        "image_url": formatted_data.cover,
+        "source": "gocar",
+    }
+
+
+def benchmark_gocar_decoding(hit_count=200_000):
+    """
+    Compare the decoding throughput of the Gocar _decode_hit() with building the
+    full Formatted dataclass of each hit, on the last saved Gocar response.
+    """
+    # Imported here, the Gocar scraper requiring GOCAR_BEARER_TOKEN on import
+    from src.sites.gocar import gocar
+
+    json_file_path = file_management.get_last_generated_file_path(
+        GOCAR_RESULTS, gocar.file_name, ".json"
+    )
+    if json_file_path is None:
+        logger.info("No saved Gocar response, benchmarking on a synthetic hit")
+        saved_hits = [synthetic_gocar_hit()]
+    else:
+        saved_hits = file_management.load_json(json_file_path)["results"][0]["hits"]
+
+    if _decode_with_dataclass(saved_hits[0]) != gocar._decode_hit(saved_hits[0]):
+        logger.warning("The two decoders disagree on the first hit")
+
+    hits = (saved_hits * (hit_count // len(saved_hits) + 1))[:hit_count]
+    for name, decode in (
+        ("Formatted dataclass", _decode_with_dataclass),
+        ("_decode_hit", gocar._decode_hit),
+    ):
+        start = time.perf_counter()
+        for hit in hits:
+            decode(hit)
+        elapsed = time.perf_counter() - start
+        logger.info(f"{name}: {len(hits) / elapsed:,.0f} hits/s")
+
+
+def benchmark_price_changes(
+    listings=1_000_000, snapshot_count=90, churn=0.02, repricing=0.05
+):
+    """
+    Time compare_prices() over synthetic snapshots, each one relisting,
+    delisting and repricing a share of the listings of the previous one.
+    """
+    generator = np.random.default_rng(0)
+    next_key = 0
+
+    def listed(count):
+        # Listing keys are dense, new listings getting the next ones
+        nonlocal next_key
+        next_key += count
+        return np.arange(next_key - count, next_key, dtype=np.int64)
+
+    keys = listed(listings)
+    prices = generator.integers(500, 60000, len(keys)).astype(np.float64)
+
+    elapsed = 0.0
+    event_count = 0
+    for _ in range(snapshot_count - 1):
+        kept = generator.random(len(keys)) >= churn
+        new_keys = listed(int(len(keys) * churn))
+        next_keys = np.concatenate([keys[kept], new_keys])
+        next_prices = np.concatenate(
+            [prices[kept], generator.integers(500, 60000, len(new_keys))]
+        )
+        repriced = generator.random(len(next_prices)) < repricing
+        next_prices[repriced] *= generator.uniform(0.8, 1.1, repriced.sum())
+        order = np.argsort(next_keys)
+
+        start = time.perf_counter()
+        comparison = price_changes.compare_prices(
+            (keys, prices), (next_keys[order], next_prices[order])
+        )
+        elapsed += time.perf_counter() - start
+        event_count += (
+            len(comparison.changed_keys)
+            + len(comparison.new_keys)
+            + len(comparison.removed_keys)
+        )
+        keys, prices = next_keys[order], next_prices[order]
+
+    logger.info(
+        f"{snapshot_count} snapshots of {listings} listings compared in "
+        f"{elapsed:.2f}s ({elapsed / (snapshot_count - 1) * 1000:.1f} ms per "
+        f"snapshot), {event_count} events"
+    )
+
+
+def benchmark_watchlists(watchlist_count=5000, listings=100_000):
+    """Time matching synthetic listings against synthetic watchlists."""
+    generator = np.random.default_rng(0)
+    makes = [
+        ("TESLA", "MODEL 3"),
+        ("TESLA", "MODEL Y"),
+        ("RENAULT", "ZOE"),
+        ("NISSAN", "LEAF"),
+        ("VOLKSWAGEN", "ID.3"),
+        ("KIA", "EV6"),
+    ]
+
+    watchlists = []
+    for number in range(watchlist_count):
+        brand, model = makes[generator.integers(len(makes))]
+        scope = generator.random()
+        watchlists.append(
+            Watchlist(
+                f"watchlist_{number}",
+                brand if scope < 0.98 else None,
+                model if scope < 0.9 else None,
+                max_price=int(generator.integers(5000, 40000)),
+                min_year=int(generator.integers(2018, 2025)),
+                max_km=int(generator.integers(20000, 120000)),
+            )
+        )
+
+    chosen = generator.integers(len(makes), size=listings)
+    df = pd.DataFrame(
+        {
+            "Brand Name": [makes[number][0] for number in chosen],
+            "Model Name": [makes[number][1] for number in chosen],
+            "Price": generator.integers(2000, 70000, listings).astype(np.float64),
+            "year": generator.integers(2012, 2025, listings),
+            "Kilometers": generator.integers(0, 250000, listings),
+        }
+    )
+
+    start = time.perf_counter()
+    matches = WatchlistIndex(watchlists).match(df)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"{listings} listings matched against {watchlist_count} watchlists in "
+        f"{elapsed:.3f}s, {sum(len(rows) for rows in matches.values())} matches"
+    )
+
+
+def benchmark_fair_price(rows=100_000, model_count=200):
+    """Time fitting synthetic listings of many models, without the cache."""
+    generator = np.random.default_rng(0)
+    groups = generator.integers(model_count, size=rows)
+    years = generator.integers(2012, 2025, rows)
+    kilometers = generator.integers(0, 250000, rows).astype(np.float64)
+    base_prices = generator.uniform(15000, 60000, model_count)[groups]
+    prices = (
+        base_prices
+        * 0.88 ** (2024 - years)
+        * 0.97 ** (kilometers / 10000)
+        * generator.lognormal(0, 0.1, rows)
+    )
+
+    start = time.perf_counter()
+    x, _ = fair_price.features(years, kilometers)
+    coefficients = fair_price.fit(groups, x, np.log(prices), model_count)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Fitted {model_count} models on {rows} listings in {elapsed:.3f}s, "
+        f"mean yearly depreciation {1 - np.exp(-coefficients[:, 1]).mean():.1%}"
+    )
+
+
+def benchmark_price_index(rows=100_000, selections=200, figures=10):
+    """
+    Time price range selections with boolean masks and with the sorted index,
+    then the graph callback path of the dashboard, building the figure of a
+    selection and getting it again from the figure cache.
+    """
+    # Imported here, the dashboard importing Dash
+    from src import main
+
+    generator = np.random.default_rng(0)
+    model_names = generator.choice(electric_car_models.models, 40, replace=False)
+    df = pd.DataFrame(
+        {
+            "URL": [f"https://www.gocar.be/a/{number}" for number in range(rows)],
+            "Image URL": None,
+            "Description": " ".join(WORDS),
+            "Brand Name": "",
+            "Model Name": "",
+            "year": generator.integers(2012, 2025, rows).astype(np.int16),
+            "Kilometers": generator.integers(0, 250000, rows),
+            "Price": generator.integers(500, 150000, rows).astype(np.float32),
+            "Days On Market": generator.integers(0, 100, rows).astype(np.int32),
+            "model": generator.choice(model_names, rows),
+            "Outlier": generator.random(rows) < 0.02,
+        }
+    )
+    ranges = np.sort(generator.integers(500, 150000, (selections, 2)), axis=1)
+
+    start = time.perf_counter()
+    for low, high in ranges:
+        masked = df[(df["Price"] >= low) & (df["Price"] <= high)]
+    mask_time = (time.perf_counter() - start) / selections
+
+    start = time.perf_counter()
+    index = SortedPriceIndex(df)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for low, high in ranges:
+        selected = index.select(low, high)
+    index_time = (time.perf_counter() - start) / selections
+
+    if not selected.equals(masked):
+        logger.warning("The sorted index and the masks selected different rows")
+    logger.info(
+        f"Price range over {rows} rows: {mask_time * 1000:.2f} ms with masks, "
+        f"{index_time * 1000:.2f} ms with the sorted index "
+        f"(built once in {build_time * 1000:.1f} ms)"
+    )
+
+    figure_cache = graph_utils.FigureCache(max_size=figures)
+    outliers = df["Outlier"].to_numpy(dtype=bool)
+    callback_times = []
+    for _ in ("built", "cached"):
+        start = time.perf_counter()
+        for low, high in ranges[:figures]:
+            main.get_figure(figure_cache, None, index, outliers, [low, high], ["hide"])
+        callback_times.append((time.perf_counter() - start) / figures)
+    logger.info(
+        f"Graph callback over {rows} rows ({DASHBOARD_RENDER_MODE} mode): "
+        f"{callback_times[0] * 1000:.1f} ms per built figure, "
+        f"{callback_times[1] * 1000:.3f} ms per cached one "
+        f"({figure_cache.misses} built, {figure_cache.hits} cached)"
+    )
+
+
+def _misspell(word, generator):
+    """Swap two adjacent letters of a word, as in 'MODLE' for 'MODEL'."""
+    if len(word) < 4:
+        return word
+    position = int(generator.integers(1, len(word) - 2))
+    return word[:position] + word[position + 1] + word[position] + word[position + 2 :]
+
+
+def benchmark_fuzzy_matching(cars=20_000, misspelled_percent=20):
+    """
+    Time the make and model matching of the cleaning step on synthetic cars, a
+    share of them having a misspelled make or model, without a warm cache.
+    """
+    generator = np.random.default_rng(0)
+    rules = data_cleaning.CleaningRules({})
+
+    template = ElectricCar(**{field.name: None for field in fields(ElectricCar)})
+    batch = []
+    for number in range(cars):
+        make, model = electric_car_models.models[
+            generator.integers(len(electric_car_models.models))
+        ].split(" ", 1)
+        if generator.integers(100) < misspelled_percent:
+            if generator.random() < 0.5:
+                make = _misspell(make, generator)
+            else:
+                model = " ".join(_misspell(word, generator) for word in model.split())
+        description = " ".join(generator.choice(WORDS, size=8))
+        batch.append(
+            replace(
+                template,
+                id=str(number),
+                version="",
+                brand_name=make,
+                model_name=model,
+                description=f"{description} {number}",
+            )
+        )
+
+    electric_car_models._is_make_like.cache_clear()
+    electric_car_models._match_window.cache_clear()
+    electric_car_models._match_model.cache_clear()
+    start = time.perf_counter()
+    matched = sum(data_cleaning.clean_car(car, rules) for car in batch)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"{cars} cars ({misspelled_percent}% misspelled) matched in "
+        f"{elapsed:.3f}s, {cars / elapsed:,.0f} cars per second, {matched} kept"
+    )
+
+
+BENCHMARKS = {
+    "backends": benchmark_backends,
+    "fair_price": benchmark_fair_price,
+    "fuzzy_matching": benchmark_fuzzy_matching,
+    "gocar_decoding": benchmark_gocar_decoding,
+    "price_changes": benchmark_price_changes,
+    "price_index": benchmark_price_index,
+    "watchlists": benchmark_watchlists,
+}
+
+
+def main(arguments):
+    if not arguments or arguments[0] not in BENCHMARKS:
+        logger.error(f"Choose a benchmark: {', '.join(BENCHMARKS)}")
+        return 1
+    BENCHMARKS[arguments[0]](*[int(argument) for argument in arguments[1:]])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,46 @@
+"""Synthetic listings shared by the benchmarks and the tests."""
+import numpy as np
+
+
+MAKES = [("TESLA", "MODEL 3"), ("RENAULT", "ZOE"), ("NISSAN", "LEAF")]
+SITES = ["https://www.gocar.be/a/", "https://www.autoscout24.be/o/", "x/"]
+WORDS = ["nice", "car", "Electric", "battery", "warranty", "GPS", "cam"]
+
+
+def synthetic_records(rows, seed=0, missing_ids=0.0):
+    """
+    Yield scraped listing records, with duplicated Ids.
+
+    Args:
+        rows (int): Number of records.
+        seed (int): Seed of the random generator.
+        missing_ids (float): Share of the records without an Id.
+    """
+    generator = np.random.default_rng(seed)
+    for _ in range(rows):
+        make, model = MAKES[generator.integers(len(MAKES))]
+        # Ids are drawn from a smaller range so that duplicates exist
+        listing_id = str(generator.integers(max(1, rows * 9 // 10)))
+        record = {
+            "id": listing_id,
+            "brand_name": make,
+            "model_name": model,
+            "version": "",
+            "body_style": "BERLINE",
+            "vehicle_type": "",
+            "published_date": "2024-01-01",
+            "is_pro": bool(generator.random() < 0.5),
+            "new": None if generator.random() < 0.1 else False,
+            "first_registration_year": [None, 2019, 2021][generator.integers(3)],
+            "kilometers": [None, 12000, 45000][generator.integers(3)],
+            "price": float(generator.integers(500, 60000)),
+            "warranty_months": 0,
+            "car_pass": None,
+            "description": " ".join(generator.choice(WORDS, size=6)),
+            "url": f"{SITES[generator.integers(len(SITES))]}{listing_id}",
+            "point_of_sale_city": None,
+            "image_url": None,
+        }
+        if missing_ids and generator.random() < missing_ids:
+            record["id"] = None
+        yield record
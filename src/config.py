@@ -5,11 +5,47 @@ import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)  # Go up one level from src/ to project root
 RESULTS_DIR = os.path.join(PROJECT_ROOT, "results")
+CACHE_DIR = os.path.join(RESULTS_DIR, "cache")
 
 # Site-specific paths
 AUTOSCOUT24_RESULTS = os.path.join(RESULTS_DIR, "autoscout24")
 DEUXIEMEMAIN_RESULTS = os.path.join(RESULTS_DIR, "2ememain")
 GOCAR_RESULTS = os.path.join(RESULTS_DIR, "gocar")
+WATCHLIST_RESULTS = os.path.join(RESULTS_DIR, "watchlists")
+
+# Data files
+CLEANING_RULES_FILE = os.path.join(BASE_DIR, "data", "cleaning_rules.json")
+WATCHLISTS_FILE = os.path.join(BASE_DIR, "data", "watchlists.json")
+LISTING_INDEX_FILE = os.path.join(RESULTS_DIR, "listing_index.pkl")
+LIFECYCLE_FILE = os.path.join(RESULTS_DIR, "lifecycle.pkl")
+PRICE_EVENTS_FILE = os.path.join(RESULTS_DIR, "price_events.jsonl")
+
+# Key identifying duplicate listings in the display dataset:
+# "listing" for the (source, Id) pair, "content" for a normalized content fingerprint
+DEDUPLICATION_KEY = "listing"
+
+# Number of latest snapshots compared by the price drop detection
+PRICE_DROP_WINDOW = 2
+
+# DataFrame engine of the display dataset pipeline: "pandas", or "polars" if installed
+DATAFRAME_BACKEND = os.environ.get("DATAFRAME_BACKEND", "pandas")
+
+# Price outliers of a model and year: "iqr" flags prices further than
+# OUTLIER_IQR_FACTOR interquartile ranges from the quartiles, "mad" prices further
+# than OUTLIER_MAD_THRESHOLD scaled median absolute deviations from the median.
+# Groups smaller than OUTLIER_MIN_GROUP_SIZE use the bounds of the whole model.
+OUTLIER_METHOD = "iqr"
+OUTLIER_IQR_FACTOR = 1.5
+OUTLIER_MAD_THRESHOLD = 3.5
+OUTLIER_MIN_GROUP_SIZE = 5
+HIDE_OUTLIERS = True  # Default of the dashboard "Hide outliers" option
+FIGURE_CACHE_SIZE = 32  # Number of dashboard figures kept in memory
+
+# Dashboard graph: "points" sends every listing of the price range to the browser,
+# "summary" sends box statistics computed by the server, and only a sample of
+# about DASHBOARD_SAMPLE_SIZE listings and the listings beyond the whiskers
+DASHBOARD_RENDER_MODE = "summary"
+DASHBOARD_SAMPLE_SIZE = 2000
 
 # Files and directories that need to exist
 REQUIRED_DIRS = [
@@ -17,6 +53,8 @@ REQUIRED_DIRS = [
     AUTOSCOUT24_RESULTS,
     DEUXIEMEMAIN_RESULTS,
     GOCAR_RESULTS,
+    WATCHLIST_RESULTS,
+    CACHE_DIR,
 ]
 
 # Create required directories if they don't exist
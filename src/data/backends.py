@@ -0,0 +1,208 @@
+"""Interchangeable DataFrame engines for the display dataset pipeline."""
+import numpy as np
+import pandas as pd
+
+from src.config import DATAFRAME_BACKEND, DEDUPLICATION_KEY
+from src.data import dataframes
+from src.data.car_batch import BOOLEAN_FIELDS, COLUMN_NAMES, INTEGER_FIELDS, CarBatch
+from src.data.deduplication import SOURCES
+from src.logging_config import setup_logging
+
+
+try:
+    import polars as pl
+except ImportError:  # polars is an optional dependency
+    pl = None
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+# Columns converted to pandas nullable dtypes, as CarBatch.to_dataframe() does
+NULLABLE_INTEGER_COLUMNS = {COLUMN_NAMES[name] for name in INTEGER_FIELDS}
+NULLABLE_BOOLEAN_COLUMNS = {COLUMN_NAMES[name] for name in BOOLEAN_FIELDS}
+
+
+class PandasBackend:
+    """Single-threaded pandas implementation, the reference for other backends."""
+
+    name = "pandas"
+
+    def create_dataframe(self, cars, columns=None):
+        return dataframes.create_dataframe(cars, columns)
+
+    def add_columns(self, df, **columns):
+        return df.assign(
+            **{name: pd.Series(values) for name, values in columns.items()}
+        )
+
+    def add_row_hash(self, df, key=DEDUPLICATION_KEY):
+        return dataframes.add_row_hash(df, key)
+
+    def sort_and_deduplicate(self, df):
+        df = df.sort_values(by=["year", "model"], ascending=[True, True])
+        return dataframes.drop_duplicate_rows(df)
+
+    def select(self, df, columns):
+        return df[columns]
+
+    def detect_price_drops(self, df_day1, df_day2):
+        return dataframes.detect_price_drops(df_day1, df_day2)
+
+    def to_pandas(self, df):
+        return df
+
+
+class PolarsBackend:
+    """
+    Multi-threaded Polars implementation.
+
+    Frames stay Polars DataFrames between the pipeline stages and are converted
+    to pandas by to_pandas(), at the plotting boundary.
+    """
+
+    name = "polars"
+
+    def create_dataframe(self, cars, columns=None):
+        attributes = None
+        if columns is not None:
+            attributes = [
+                name for name, column in COLUMN_NAMES.items() if column in columns
+            ]
+        return CarBatch.from_cars(cars).to_polars(attributes)
+
+    def add_columns(self, df, **columns):
+        return df.with_columns(
+            [pl.Series(name, values) for name, values in columns.items()]
+        )
+
+    def add_row_hash(self, df, key=DEDUPLICATION_KEY):
+        source = _listing_source(pl.col("URL"))
+        if "Source" in df.columns:
+            source = pl.coalesce(pl.col("Source"), source)
+        df = df.with_columns(source.alias("Source"))
+
+        # The key columns are hashed by pandas, so that both backends give the
+        # same row hashes and save the same snapshots
+        key_columns = [
+            column
+            for column in dataframes.row_hash_input_columns(key)
+            if column != "URL"
+        ]
+        hashes = dataframes.row_hashes(self.to_pandas(df.select(key_columns)), key)
+        return df.with_columns(pl.Series("Row Hash", hashes, dtype=pl.UInt64))
+
+    def sort_and_deduplicate(self, df):
+        df = df.sort(["year", "model"], maintain_order=True)
+        return df.unique(subset="Row Hash", keep="first", maintain_order=True)
+
+    def select(self, df, columns):
+        return df.select(columns)
+
+    def detect_price_drops(self, df_day1, df_day2):
+        by_listing_key = (
+            "Listing Key" in df_day1.columns and "Listing Key" in df_day2.columns
+        )
+        key = ["Key"] if by_listing_key else ["Source", "Key"]
+        day1 = _price_frame(df_day1, by_listing_key).unique(
+            subset=key, keep="first", maintain_order=True
+        )
+        day2 = _price_frame(df_day2, by_listing_key).unique(
+            subset=key, keep="first", maintain_order=True
+        )
+        drops = (
+            day1.join(day2, on=key, how="inner", maintain_order="left", suffix="_day2")
+            .with_columns((pl.col("Price") - pl.col("Price_day2")).alias("Price_Drop"))
+            .filter(pl.col("Price_Drop") > 0)
+        )
+        return pd.DataFrame(
+            {
+                "Id": df_day1["Id"].to_numpy()[drops["Row"].to_numpy()],
+                "Price_day1": drops["Price"].to_numpy(),
+                "Price_day2": drops["Price_day2"].to_numpy(),
+                "Price_Drop": drops["Price_Drop"].to_numpy(),
+            },
+            index=df_day2.index[drops["Row_day2"].to_numpy()],
+        )
+
+    def to_pandas(self, df):
+        """
+        Convert to pandas without pyarrow, with the dtypes of the pandas backend.
+        """
+        data = {}
+        for series in df.get_columns():
+            mask = series.is_null().to_numpy()
+            if series.name in NULLABLE_INTEGER_COLUMNS:
+                data[series.name] = pd.arrays.IntegerArray(
+                    series.fill_null(0).to_numpy().astype(np.int64), mask
+                )
+            elif series.name in NULLABLE_BOOLEAN_COLUMNS:
+                data[series.name] = pd.arrays.BooleanArray(
+                    series.fill_null(False).to_numpy().astype(np.bool_), mask
+                )
+            elif series.dtype == pl.String:
+                values = np.empty(len(series), dtype=object)
+                values[:] = series.to_list()
+                data[series.name] = values
+            else:
+                data[series.name] = series.to_numpy()
+        return pd.DataFrame(data, copy=False)
+
+
+BACKENDS = {"pandas": PandasBackend, "polars": PolarsBackend}
+
+
+def get_backend(name=DATAFRAME_BACKEND):
+    """
+    Return the DataFrame backend to run the pipeline with.
+
+    Args:
+        name (str): 'pandas' or 'polars', defaults to the DATAFRAME_BACKEND setting.
+
+    Returns:
+        PandasBackend or PolarsBackend: The backend.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+        ImportError: If the polars backend is requested but not installed.
+    """
+    if name not in BACKENDS:
+        raise ValueError("Invalid dataframe backend. Choose 'pandas' or 'polars'.")
+    if name == "polars" and pl is None:
+        raise ImportError("The polars backend requires polars: pip install polars")
+    return BACKENDS[name]()
+
+
+def _listing_source(url):
+    # Same result as deduplication.listing_source(), on the URL host or the URL
+    lowered = url.str.to_lowercase()
+    netloc = lowered.str.extract(r"^[a-z][a-z0-9+.-]*://([^/?#]*)", 1)
+    host = pl.when(netloc.is_null() | (netloc == "")).then(lowered).otherwise(netloc)
+
+    source = pl.lit("unknown")
+    for name in reversed(SOURCES):
+        source = (
+            pl.when(host.str.contains(name, literal=True))
+            .then(pl.lit(name))
+            .otherwise(source)
+        )
+    return source
+
+
+def _price_frame(df, by_listing_key=False):
+    # Listing key, or (source, Id as a string or content hash) key, price and row
+    # of each listing of a pandas frame
+    prices = df["Price"].to_numpy(dtype=np.float64)
+    if by_listing_key:
+        return pl.DataFrame(
+            {"Key": df["Listing Key"].to_numpy(dtype=np.int64), "Price": prices}
+        ).with_row_index("Row")
+    return pl.DataFrame(
+        {
+            "Source": pl.Series(
+                dataframes.listing_sources(df).tolist(), dtype=pl.String
+            ),
+            "Key": pl.Series(dataframes.listing_ids(df).tolist(), dtype=pl.String),
+            "Price": prices,
+        }
+    ).with_row_index("Row")
@@ -0,0 +1,415 @@
+"""Compact struct-of-arrays container for electric car listings."""
+import json
+import math
+import numbers
+import sys
+from array import array
+from dataclasses import fields
+
+import numpy as np
+import pandas as pd
+
+from src.data.electric_car_data import ElectricCar
+
+
+# ElectricCar attribute -> DataFrame column name
+COLUMN_NAMES = {
+    "id": "Id",
+    "brand_name": "Brand Name",
+    "model_name": "Model Name",
+    "version": "Version",
+    "body_style": "Body Style",
+    "vehicle_type": "Vehicle Type",
+    "published_date": "Published Date",
+    "is_pro": "Is Pro",
+    "new": "New",
+    "first_registration_year": "First Registration Year",
+    "kilometers": "Kilometers",
+    "price": "Price",
+    "warranty_months": "Warranty Months",
+    "car_pass": "Car Pass",
+    "description": "Description",
+    "url": "URL",
+    "point_of_sale_city": "Point of Sale City",
+    "image_url": "Image URL",
+    "source": "Source",
+}
+
+FIELD_NAMES = tuple(field.name for field in fields(ElectricCar))
+
+INTEGER_FIELDS = ("first_registration_year", "kilometers", "warranty_months")
+FLOAT_FIELDS = ("price",)
+BOOLEAN_FIELDS = ("is_pro", "new", "car_pass")
+# Low-cardinality strings, stored once in memory whatever the number of cars
+INTERNED_FIELDS = (
+    "brand_name",
+    "model_name",
+    "version",
+    "body_style",
+    "vehicle_type",
+    "point_of_sale_city",
+    "published_date",
+    "source",
+)
+
+
+class _IntegerColumn:
+    """Nullable 64-bit integers stored as a value array and a missing-value mask."""
+
+    def __init__(self):
+        self.values = array("q")
+        self.mask = bytearray()
+
+    def convert(self, value):
+        if value is None:
+            return None
+        if isinstance(value, numbers.Integral) and not isinstance(value, bool):
+            return int(value)
+        raise TypeError(f"Expected an integer or None, got {value!r}")
+
+    def append(self, value):
+        self.values.append(0 if value is None else value)
+        self.mask.append(value is None)
+
+    def get(self, index):
+        return None if self.mask[index] else self.values[index]
+
+    def set(self, index, value):
+        value = self.convert(value)
+        self.values[index] = 0 if value is None else value
+        self.mask[index] = value is None
+
+    def extend(self, other):
+        self.values.extend(other.values)
+        self.mask.extend(other.mask)
+
+    def take(self, indices):
+        column = _IntegerColumn()
+        column.values = array("q", [self.values[i] for i in indices])
+        column.mask = bytearray(self.mask[i] for i in indices)
+        return column
+
+    def to_pandas(self):
+        return pd.arrays.IntegerArray(
+            np.frombuffer(self.values, dtype=np.int64).copy(),
+            np.frombuffer(self.mask, dtype=np.bool_).copy(),
+        )
+
+    def to_polars(self, name):
+        import polars as pl
+
+        values = pl.Series(name, np.frombuffer(self.values, dtype=np.int64).copy())
+        return values.set(pl.Series(np.frombuffer(self.mask, dtype=np.bool_)), None)
+
+
+class _BooleanColumn(_IntegerColumn):
+    """Nullable booleans stored as one byte per value and a missing-value mask."""
+
+    def __init__(self):
+        self.values = bytearray()
+        self.mask = bytearray()
+
+    def convert(self, value):
+        if value is None or isinstance(value, (bool, np.bool_)):
+            return None if value is None else bool(value)
+        raise TypeError(f"Expected a boolean or None, got {value!r}")
+
+    def append(self, value):
+        self.values.append(bool(value))
+        self.mask.append(value is None)
+
+    def get(self, index):
+        return None if self.mask[index] else bool(self.values[index])
+
+    def set(self, index, value):
+        value = self.convert(value)
+        self.values[index] = bool(value)
+        self.mask[index] = value is None
+
+    def take(self, indices):
+        column = _BooleanColumn()
+        column.values = bytearray(self.values[i] for i in indices)
+        column.mask = bytearray(self.mask[i] for i in indices)
+        return column
+
+    def to_pandas(self):
+        return pd.arrays.BooleanArray(
+            np.frombuffer(self.values, dtype=np.bool_).copy(),
+            np.frombuffer(self.mask, dtype=np.bool_).copy(),
+        )
+
+    def to_polars(self, name):
+        import polars as pl
+
+        values = pl.Series(name, np.frombuffer(self.values, dtype=np.bool_).copy())
+        return values.set(pl.Series(np.frombuffer(self.mask, dtype=np.bool_)), None)
+
+
+class _FloatColumn:
+    """64-bit floats, missing values being stored as NaN."""
+
+    def __init__(self):
+        self.values = array("d")
+
+    def convert(self, value):
+        if value is None:
+            return math.nan
+        if isinstance(value, numbers.Real) and not isinstance(value, bool):
+            return float(value)
+        raise TypeError(f"Expected a number or None, got {value!r}")
+
+    def append(self, value):
+        self.values.append(value)
+
+    def get(self, index):
+        return self.values[index]
+
+    def set(self, index, value):
+        self.values[index] = self.convert(value)
+
+    def extend(self, other):
+        self.values.extend(other.values)
+
+    def take(self, indices):
+        column = _FloatColumn()
+        column.values = array("d", [self.values[i] for i in indices])
+        return column
+
+    def to_pandas(self):
+        return np.frombuffer(self.values, dtype=np.float64).copy()
+
+    def to_polars(self, name):
+        import polars as pl
+
+        return pl.Series(name, np.frombuffer(self.values, dtype=np.float64).copy())
+
+
+class _ObjectColumn:
+    """Python objects, strings being optionally interned."""
+
+    def __init__(self, intern=False):
+        self.intern = intern
+        self.values = []
+
+    def convert(self, value):
+        if self.intern and type(value) is str:
+            return sys.intern(value)
+        return value
+
+    def append(self, value):
+        self.values.append(value)
+
+    def get(self, index):
+        return self.values[index]
+
+    def set(self, index, value):
+        self.values[index] = self.convert(value)
+
+    def extend(self, other):
+        self.values.extend(other.values)
+
+    def take(self, indices):
+        column = _ObjectColumn(self.intern)
+        column.values = [self.values[i] for i in indices]
+        return column
+
+    def to_pandas(self):
+        values = np.empty(len(self.values), dtype=object)
+        values[:] = self.values
+        return values
+
+    def to_polars(self, name):
+        import polars as pl
+
+        return pl.Series(name, self.values, dtype=pl.String)
+
+
+class CarBatch:
+    """
+    Electric car listings stored column by column.
+
+    Each ElectricCar attribute is kept in a typed array (nullable integers,
+    booleans and floats) or in a list of interned strings, instead of one
+    dataclass instance with its own __dict__ per car. Rows are accessed through
+    CarView objects, which expose the ElectricCar attribute API.
+
+    Values must already be typed, see src.data.normalization: appending a
+    string as a number raises a TypeError.
+    """
+
+    def __init__(self):
+        self._columns = {name: _new_column(name) for name in FIELD_NAMES}
+
+    @classmethod
+    def from_records(cls, records):
+        """Create a batch from dictionaries of ElectricCar attributes."""
+        batch = cls()
+        for record in records:
+            batch.append(**record)
+        return batch
+
+    @classmethod
+    def from_cars(cls, cars):
+        """
+        Create a batch from any iterable of cars.
+
+        Views over a single batch are gathered with take(), without going through
+        the attributes of each car.
+
+        Args:
+            cars: A CarBatch, or an iterable of CarView or ElectricCar objects.
+
+        Returns:
+            CarBatch: The cars as a batch.
+        """
+        if isinstance(cars, CarBatch):
+            return cars
+        cars = list(cars)
+        batches = {id(car.batch) for car in cars if isinstance(car, CarView)}
+        if len(batches) == 1 and all(isinstance(car, CarView) for car in cars):
+            return cars[0].batch.take([car.index for car in cars])
+
+        batch = cls()
+        for car in cars:
+            batch.append_car(car)
+        return batch
+
+    def __len__(self):
+        return len(self._columns["id"].values)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("CarBatch index out of range")
+        return CarView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield CarView(self, index)
+
+    def append(self, **values):
+        """
+        Append a car given its ElectricCar attributes as keyword arguments.
+
+        Returns:
+            CarView: The view over the appended car.
+
+        Raises:
+            TypeError: If an argument is not an ElectricCar attribute.
+        """
+        unknown = set(values) - set(FIELD_NAMES)
+        if unknown:
+            raise TypeError(f"Unexpected car attributes: {sorted(unknown)}")
+        # Convert every value before appending any, so that a failing value
+        # cannot leave the columns with different lengths
+        converted = [
+            (column, column.convert(values.get(name)))
+            for name, column in self._columns.items()
+        ]
+        for column, value in converted:
+            column.append(value)
+        return CarView(self, len(self) - 1)
+
+    def append_car(self, car):
+        """Append a copy of a CarView or ElectricCar."""
+        return self.append(**{name: getattr(car, name) for name in FIELD_NAMES})
+
+    def extend(self, cars):
+        """Append all the cars of another batch or of an iterable of cars."""
+        if not isinstance(cars, CarBatch):
+            for car in cars:
+                self.append_car(car)
+            return
+        for name, column in self._columns.items():
+            column.extend(cars._columns[name])
+
+    def take(self, indices):
+        """Return a new batch holding the cars at the given positions."""
+        batch = CarBatch()
+        batch._columns = {
+            name: column.take(indices) for name, column in self._columns.items()
+        }
+        return batch
+
+    def to_records(self):
+        """Return the cars as a list of dictionaries of ElectricCar attributes."""
+        return [car.to_dict() for car in self]
+
+    def to_dataframe(self, columns=None):
+        """
+        Convert the batch to a DataFrame.
+
+        Numeric columns are copied out of the batch arrays, which would otherwise
+        be locked against growing and be written through by any car update.
+
+        Args:
+            columns (list): ElectricCar attributes to convert, defaults to all.
+
+        Returns:
+            pd.DataFrame: One column per attribute, named after COLUMN_NAMES.
+        """
+        names = FIELD_NAMES if columns is None else columns
+        data = {COLUMN_NAMES[name]: self._columns[name].to_pandas() for name in names}
+        return pd.DataFrame(data, copy=False)
+
+    def to_polars(self, columns=None):
+        """
+        Convert the batch to a Polars DataFrame, polars being an optional
+        dependency only imported by this method.
+
+        Args:
+            columns (list): ElectricCar attributes to convert, defaults to all.
+
+        Returns:
+            polars.DataFrame: One column per attribute, named after COLUMN_NAMES.
+        """
+        import polars as pl
+
+        names = FIELD_NAMES if columns is None else columns
+        return pl.DataFrame(
+            [self._columns[name].to_polars(COLUMN_NAMES[name]) for name in names]
+        )
+
+
+class CarView:
+    """View over one car of a CarBatch with the ElectricCar attribute API."""
+
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in FIELD_NAMES}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    def __repr__(self):
+        return f"CarView({self.to_dict()!r})"
+
+
+def _column_property(name):
+    def getter(view):
+        return view.batch._columns[name].get(view.index)
+
+    def setter(view, value):
+        view.batch._columns[name].set(view.index, value)
+
+    return property(getter, setter)
+
+
+for _name in FIELD_NAMES:
+    setattr(CarView, _name, _column_property(_name))
+
+
+def _new_column(name):
+    if name in INTEGER_FIELDS:
+        return _IntegerColumn()
+    if name in FLOAT_FIELDS:
+        return _FloatColumn()
+    if name in BOOLEAN_FIELDS:
+        return _BooleanColumn()
+    return _ObjectColumn(intern=name in INTERNED_FIELDS)
@@ -1,80 +1,283 @@
+import numpy as np
 import pandas as pd
 
+from src.config import DEDUPLICATION_KEY
+from src.data import listing_index, price_changes
+from src.data.car_batch import COLUMN_NAMES, CarBatch
+from src.data.deduplication import listing_source
+from src.data.near_duplicates import normalize_description
 
-def create_dataframe(electric_cars):
-    # Create lists for each attribute of ElectricCar
-    ids = [car.id for car in electric_cars]
-    brand_names = [car.brand_name for car in electric_cars]
-    model_names = [car.model_name for car in electric_cars]
-    versions = [car.version for car in electric_cars]
-    body_styles = [car.body_style for car in electric_cars]
-    vehicle_types = [car.vehicle_type for car in electric_cars]
-    published_dates = [car.published_date for car in electric_cars]
-    is_pros = [car.is_pro for car in electric_cars]
-    news = [car.new for car in electric_cars]
-    first_registration_years = [car.first_registration_year for car in electric_cars]
-    kilometers = [car.kilometers for car in electric_cars]
-    prices = [car.price for car in electric_cars]
-    warranty_months = [car.warranty_months for car in electric_cars]
-    car_passes = [car.car_pass for car in electric_cars]
-    descriptions = [car.description for car in electric_cars]
-    urls = [car.url for car in electric_cars]
-    point_of_sale_cities = [car.point_of_sale_city for car in electric_cars]
-    image_urls = [car.image_url for car in electric_cars]
-
-    # Create dictionary for DataFrame construction
-    data = {
-        "Id": ids,
-        "Brand Name": brand_names,
-        "Model Name": model_names,
-        "Version": versions,
-        "Body Style": body_styles,
-        "Vehicle Type": vehicle_types,
-        "Published Date": published_dates,
-        "Is Pro": is_pros,
-        "New": news,
-        "First Registration Year": first_registration_years,
-        "Kilometers": kilometers,
-        "Price": prices,
-        "Warranty Months": warranty_months,
-        "Car Pass": car_passes,
-        "Description": descriptions,
-        "URL": urls,
-        "Point of Sale City": point_of_sale_cities,
-        "Image URL": image_urls,
-    }
-
-    # Create DataFrame
-    df = pd.DataFrame(data)
+
+# Low-cardinality string columns, stored as categories of the display dataset
+CATEGORICAL_COLUMNS = (
+    "Brand Name",
+    "Model Name",
+    "model",
+    "Body Style",
+    "Point of Sale City",
+    "Vehicle Type",
+    "Source",
+)
+
+# Columns identifying a listing for the content deduplication key
+CONTENT_KEY_COLUMNS = (
+    "Brand Name",
+    "Model Name",
+    "First Registration Year",
+    "Kilometers",
+    "Price",
+    "Description",
+)
+
+# Nullable integer dtypes, smallest first
+_INTEGER_DTYPES = ("Int8", "Int16", "Int32", "Int64")
+
+
+def create_dataframe(electric_cars, columns=None):
+    """
+    Create a DataFrame with one row per car.
+
+    Args:
+    electric_cars: A CarBatch, or an iterable of CarView or ElectricCar objects.
+    columns (list): DataFrame column names to build, defaults to all of them.
+
+    Returns:
+    pd.DataFrame: One column per ElectricCar attribute.
+    """
+    attributes = None
+    if columns is not None:
+        attributes = [
+            name for name, column in COLUMN_NAMES.items() if column in columns
+        ]
+    return CarBatch.from_cars(electric_cars).to_dataframe(attributes)
+
+
+def add_row_hash(df, key=DEDUPLICATION_KEY):
+    """
+    Add the 'Source' of each listing and a 64-bit 'Row Hash' of its key.
+
+    Args:
+    df (pd.DataFrame): DataFrame created by create_dataframe().
+    key (str): 'listing' to hash the (source, Id) pair, or 'content' to hash the
+        make, model, year, mileage, price and normalized description, so that
+        descriptions only differing by case, punctuation or spacing match.
+
+    Returns:
+    pd.DataFrame: A new DataFrame with 'Source' and uint64 'Row Hash' columns.
+    """
+    df = df.assign(Source=listing_sources(df))
+    df["Row Hash"] = row_hashes(df, key)
     return df
 
 
+def row_hashes(df, key=DEDUPLICATION_KEY):
+    """
+    Compute the 64-bit hash of the deduplication key of each row.
+
+    Args:
+    df (pd.DataFrame): DataFrame with the row_hash_input_columns() of the key.
+    key (str): 'listing' or 'content', see add_row_hash().
+
+    Returns:
+    np.ndarray: One uint64 hash per row.
+    """
+    if key == "listing":
+        return listing_hashes(df)
+    if key == "content":
+        key_df = df[list(CONTENT_KEY_COLUMNS)].assign(
+            Description=df["Description"].map(normalize_description)
+        )
+        return pd.util.hash_pandas_object(key_df, index=False).to_numpy()
+    raise ValueError("Invalid deduplication key. Choose 'listing' or 'content'.")
+
+
+def listing_hashes(df):
+    """
+    Compute the 64-bit hash of the (source, Id) pair of each listing, unlike the
+    dense 'Listing Key' column which is assigned by listing_index.
+
+    Ids are hashed as strings, so that an Id read as an integer from one file
+    and as a string from another still gives the same hash, see listing_ids().
+
+    Args:
+    df (pd.DataFrame): DataFrame with 'Id', listing_index.CONTENT_COLUMNS and
+        either 'Source' or 'URL' columns.
+
+    Returns:
+    np.ndarray: One uint64 hash per row.
+    """
+    key_df = pd.DataFrame(
+        {
+            "Source": listing_sources(df).to_numpy(dtype=object),
+            "Id": listing_ids(df),
+        }
+    )
+    return pd.util.hash_pandas_object(key_df, index=False).to_numpy()
+
+
+def listing_ids(df):
+    """
+    Return the Id of each listing as a string, or a hash of its content if it
+    has none, as listing_index.listing_id() does.
+
+    Args:
+    df (pd.DataFrame): DataFrame with 'Id' and listing_index.CONTENT_COLUMNS.
+
+    Returns:
+    np.ndarray: One string per row.
+    """
+    ids = df["Id"].astype(object)
+    missing = (ids.isna() | (ids.astype(str).str.strip() == "")).to_numpy()
+    ids = ids.astype(str).to_numpy(dtype=object)
+    if missing.any():
+        ids[missing] = [
+            listing_index.listing_id(None, content)
+            for content in listing_index.frame_contents(df[missing])
+        ]
+    return ids
+
+
+def listing_sources(df):
+    """
+    Return the 'Source' of each listing, derived from its 'URL' when missing.
+
+    Args:
+    df (pd.DataFrame): DataFrame with a 'URL' column and optionally a 'Source' one.
+
+    Returns:
+    pd.Series: The web site of each listing, see deduplication.SOURCES.
+    """
+    if "Source" not in df.columns:
+        return df["URL"].map(listing_source)
+    sources = df["Source"].astype(object)
+    missing = sources.isna()
+    if missing.any():
+        sources = sources.where(~missing, df.loc[missing, "URL"].map(listing_source))
+    return sources.astype(str)
+
+
+def row_hash_input_columns(key=DEDUPLICATION_KEY):
+    """Return the create_dataframe() columns add_row_hash() reads for the key."""
+    if key == "content":
+        return ["URL", "Source", *CONTENT_KEY_COLUMNS]
+    return ["URL", "Source", "Id", *listing_index.CONTENT_COLUMNS]
+
+
+def drop_duplicate_rows(df):
+    """Keep the first row of each 'Row Hash', see add_row_hash()."""
+    return df.drop_duplicates(subset="Row Hash")
+
+
 def detect_price_drops(df_day1, df_day2):
     """
     Compares two dataframes containing ads from different days and detects the rows where the price has dropped.
 
+    Listings are matched on their integer 'Listing Key' when both days have one,
+    otherwise on the hash of their (source, Id) pair, with a binary search in
+    the sorted keys of day 2. The first row of a key duplicated within a day
+    is used.
+
+    Args:
+    df_day1 (pd.DataFrame): DataFrame containing 'Id', 'Price' and 'Listing Key' or 'URL' for day 1.
+    df_day2 (pd.DataFrame): DataFrame containing 'Id', 'Price' and 'Listing Key' or 'URL' for day 2.
+
+    Returns:
+    pd.DataFrame: DataFrame containing 'Id', 'Price_day1', 'Price_day2', and 'Price_Drop',
+    in day 1 order and indexed by the label of the matching day 2 row.
+    """
+    if "Listing Key" in df_day1.columns and "Listing Key" in df_day2.columns:
+        keys_day1 = df_day1["Listing Key"].to_numpy(dtype=np.int64)
+        keys_day2 = df_day2["Listing Key"].to_numpy(dtype=np.int64)
+    else:
+        keys_day1, keys_day2 = listing_hashes(df_day1), listing_hashes(df_day2)
+    sorted_keys_day2, rows_day2 = price_changes.sorted_key_index(keys_day2)
+
+    # First row of each key of day 1, in day 1 order
+    rows_day1 = np.sort(price_changes.sorted_key_index(keys_day1)[1])
+    positions = price_changes.lookup(sorted_keys_day2, keys_day1[rows_day1])
+    matched = positions >= 0
+    rows_day1 = rows_day1[matched]
+    rows_day2 = rows_day2[positions[matched]]
+
+    prices_day1 = df_day1["Price"].to_numpy(dtype=np.float64)[rows_day1]
+    prices_day2 = df_day2["Price"].to_numpy(dtype=np.float64)[rows_day2]
+    price_drops = prices_day1 - prices_day2
+    dropped = price_drops > 0
+
+    return pd.DataFrame(
+        {
+            "Id": df_day1["Id"].to_numpy()[rows_day1[dropped]],
+            "Price_day1": prices_day1[dropped],
+            "Price_day2": prices_day2[dropped],
+            "Price_Drop": price_drops[dropped],
+        },
+        index=df_day2.index[rows_day2[dropped]],
+    )
+
+
+def optimize_dataframe(df):
+    """
+    Convert a display dataset to a memory-efficient schema.
+
+    Low-cardinality string columns become categoricals, nullable integer columns
+    are downcast to the smallest integer type holding all their values, 'year'
+    becomes int16 and 'Price' becomes float32 when no price loses precision.
+
     Args:
-    df_day1 (pd.DataFrame): DataFrame containing 'Id' and 'Price' for day 1.
-    df_day2 (pd.DataFrame): DataFrame containing 'Id' and 'Price' for day 2.
+    df (pd.DataFrame): DataFrame created by create_dataframe().
 
     Returns:
-    pd.DataFrame: DataFrame containing 'Id', 'Price_day1', 'Price_day2', and 'Price_Drop'.
+    pd.DataFrame: A new DataFrame with the optimized dtypes.
     """
+    dtypes = {}
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            dtypes[column] = "category"
+
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.Int64Dtype):
+            dtypes[column] = _smallest_integer_dtype(df[column])
+
+    if "year" in df.columns and pd.api.types.is_integer_dtype(df["year"].dtype):
+        dtypes["year"] = np.int16
 
-    # Renaming the columns to avoid confusion after merging
-    df_day1 = df_day1.rename(columns={"Price": "Price_day1"})
-    df_day2 = df_day2.rename(columns={"Price": "Price_day2"})
+    if "Price" in df.columns:
+        prices = df["Price"].to_numpy(dtype=np.float64)
+        if np.array_equal(
+            prices.astype(np.float32).astype(np.float64), prices, equal_nan=True
+        ):
+            dtypes["Price"] = np.float32
 
-    # Merging the dataframes on 'Id'
-    merged_df = pd.merge(df_day1, df_day2, on="Id", how="inner")
+    return df.astype(dtypes)
 
-    # Calculating the price drop
-    merged_df["Price_Drop"] = merged_df["Price_day1"] - merged_df["Price_day2"]
 
-    # Filtering the rows where the price has dropped
-    price_drop_df = merged_df[merged_df["Price_Drop"] > 0]
+def memory_usage_report(df):
+    """
+    Report the memory used by each column of a DataFrame, largest first.
+
+    Args:
+    df (pd.DataFrame): The DataFrame to measure.
+
+    Returns:
+    pd.DataFrame: 'Column', 'Dtype' and 'Bytes' of each column.
+    """
+    usage = df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame(
+        {
+            "Column": usage.index,
+            "Dtype": [str(df[column].dtype) for column in usage.index],
+            "Bytes": usage.to_numpy(),
+        }
+    )
+    return report.sort_values("Bytes", ascending=False, ignore_index=True)
 
-    # Selecting relevant columns
-    result_df = price_drop_df[["Id", "Price_day1", "Price_day2", "Price_Drop"]]
 
-    return result_df
+def _smallest_integer_dtype(series):
+    if series.isna().all():
+        return _INTEGER_DTYPES[0]
+    low, high = series.min(), series.max()
+    for dtype in _INTEGER_DTYPES:
+        info = np.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            return dtype
+    return "Int64"
@@ -0,0 +1,251 @@
+"""Cross-source duplicate detection for car listings."""
+import os
+import re
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+KM_BUCKET_SIZE = 5000
+PRICE_TOLERANCE = 0.05  # Relative price difference still considered the same car
+KM_TOLERANCE = 0.03  # Relative mileage difference still considered the same car
+KM_ABSOLUTE_TOLERANCE = 1000
+MATCH_THRESHOLD = 0.8
+MIN_IMAGE_NAME_LENGTH = 12
+
+# Weights of the pair similarity score, summing to 1
+PRICE_WEIGHT = 0.4
+KM_WEIGHT = 0.4
+CITY_WEIGHT = 0.15
+IMAGE_WEIGHT = 0.05
+
+# Source of the listings of each scraper, also found in the host of their URLs,
+# which gives the source of listings saved before the 'Source' column existed
+SOURCES = ("gocar", "autoscout24", "2ememain")
+
+
+def listing_source(url):
+    """
+    Return the name of the web site a listing comes from, based on its URL.
+
+    Args:
+        url (str): The listing URL.
+
+    Returns:
+        str: One of the SOURCES, or 'unknown'.
+    """
+    if not url:
+        return "unknown"
+    host = urlparse(url).netloc.lower() or url.lower()
+    for source in SOURCES:
+        if source in host:
+            return source
+    return "unknown"
+
+
+def find_cross_source_duplicates(
+    cars, listing_keys, km_bucket_size=KM_BUCKET_SIZE, threshold=MATCH_THRESHOLD
+):
+    """
+    Find the listings of the same physical car published on several web sites.
+
+    Candidates are blocked on (make, model, year, km bucket) through a hash index,
+    each block also being compared to the next km bucket so that cars straddling a
+    bucket boundary are still matched. Within a block, candidates are sorted by
+    price and only compared while their price stays within PRICE_TOLERANCE, which
+    keeps the whole stage near-linear in the number of listings.
+
+    A cluster holds at most one listing per web site, and is named after the
+    lowest listing key of its members, so that the same listings give the same
+    canonical key from one scrape to the next.
+
+    Args:
+        cars (list): Cleaned ElectricCar objects.
+        listing_keys (np.ndarray): Listing key of each car.
+        km_bucket_size (int): Width of the kilometer buckets used for blocking.
+        threshold (float): Minimum pair score to consider two listings identical.
+
+    Returns:
+        np.ndarray: The canonical key of each car, its own listing key unless
+        it is a duplicate of a listing with a lower key.
+    """
+    sources = [car.source or listing_source(car.url) for car in cars]
+
+    index = defaultdict(list)
+    for position, car in enumerate(cars):
+        index[_blocking_key(car, km_bucket_size)].append(position)
+
+    parents = list(range(len(cars)))
+    cluster_sources = [{source} for source in sources]
+    for key, positions in index.items():
+        neighbours = []
+        if key[3] is not None:
+            neighbours = index.get((*key[:3], key[3] + 1), [])
+        _link_block(
+            cars, sources, positions, neighbours, parents, cluster_sources, threshold
+        )
+
+    listing_keys = np.asarray(listing_keys, dtype=np.int64)
+    roots = np.fromiter(
+        (_find(parents, position) for position in range(len(cars))),
+        dtype=np.int64,
+        count=len(cars),
+    )
+    lowest_keys = np.full(len(cars), np.iinfo(np.int64).max)
+    np.minimum.at(lowest_keys, roots, listing_keys)
+    canonical_keys = lowest_keys[roots]
+
+    logger.info(
+        f"Cross-source deduplication found "
+        f"{int((canonical_keys != listing_keys).sum())} duplicate listings "
+        f"among {len(cars)}"
+    )
+    return canonical_keys
+
+
+def collapse_duplicates(df):
+    """
+    Keep one row per physical car, for display.
+
+    The row of the canonical listing of each cluster is kept, and its missing
+    values are taken from the other listings of the cluster.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'Listing Key' and 'Canonical Key'
+            columns, see find_cross_source_duplicates().
+
+    Returns:
+        pd.DataFrame: The canonical rows, in their original order.
+    """
+    listing_keys = df["Listing Key"].to_numpy(dtype=np.int64)
+    canonical_keys = df["Canonical Key"].to_numpy(dtype=np.int64)
+    canonical = listing_keys == canonical_keys
+    if canonical.all():
+        return df
+
+    # Row of the canonical listing of each duplicate, -1 if it was filtered out
+    canonical_rows = pd.Series(np.flatnonzero(canonical), index=listing_keys[canonical])
+    duplicates = np.flatnonzero(~canonical)
+    targets = (
+        canonical_rows.reindex(canonical_keys[duplicates]).fillna(-1).to_numpy(np.int64)
+    )
+    duplicates, targets = duplicates[targets >= 0], targets[targets >= 0]
+
+    df = df.copy()
+    for column_number, column in enumerate(df.columns):
+        missing = df[column].isna().to_numpy()
+        fillable = missing[targets] & ~missing[duplicates]
+        if not fillable.any():
+            continue
+        # The first duplicate of a cluster having the value fills it
+        rows, first = np.unique(targets[fillable], return_index=True)
+        df.iloc[rows, column_number] = (
+            df[column].iloc[duplicates[fillable][first]].to_numpy()
+        )
+
+    return df[canonical]
+
+
+def _blocking_key(car, km_bucket_size):
+    bucket = None
+    if car.kilometers is not None:
+        bucket = car.kilometers // km_bucket_size
+    return car.brand_name, car.model_name, car.first_registration_year, bucket
+
+
+def _link_block(
+    cars, sources, positions, neighbours, parents, cluster_sources, threshold
+):
+    # Tag neighbour-bucket members so that pairs living entirely in the next
+    # bucket are left to that bucket's own pass
+    candidates = [(cars[p].price, p, False) for p in positions]
+    candidates.extend((cars[p].price, p, True) for p in neighbours)
+    candidates.sort()
+
+    for i, (price, position, is_neighbour) in enumerate(candidates):
+        for j in range(i + 1, len(candidates)):
+            other_price, other_position, other_is_neighbour = candidates[j]
+            if other_price - price > PRICE_TOLERANCE * max(other_price, 1.0):
+                break
+            if is_neighbour and other_is_neighbour:
+                continue
+            if sources[position] == sources[other_position]:
+                continue
+            score = _pair_score(cars[position], cars[other_position])
+            if score >= threshold:
+                _union(parents, cluster_sources, position, other_position)
+
+
+def _pair_score(car, other):
+    # Hash-like image file names shared by two listings mean the same photo
+    image_name = _image_name(car.image_url)
+    if len(image_name) >= MIN_IMAGE_NAME_LENGTH and image_name == _image_name(
+        other.image_url
+    ):
+        return 1.0
+
+    price_gap = abs(car.price - other.price) / max(car.price, other.price, 1.0)
+    price_score = max(0.0, 1.0 - price_gap / PRICE_TOLERANCE)
+
+    km_score = 0.5
+    if car.kilometers is not None and other.kilometers is not None:
+        km_gap = abs(car.kilometers - other.kilometers)
+        km_tolerance = max(
+            KM_ABSOLUTE_TOLERANCE,
+            KM_TOLERANCE * max(car.kilometers, other.kilometers),
+        )
+        km_score = max(0.0, 1.0 - km_gap / km_tolerance)
+
+    city_score = 0.5
+    city, other_city = _normalize(car.point_of_sale_city), _normalize(
+        other.point_of_sale_city
+    )
+    if city and other_city:
+        city_score = 1.0 if city == other_city else 0.0
+
+    image_score = 0.0 if car.image_url and other.image_url else 0.5
+
+    return (
+        PRICE_WEIGHT * price_score
+        + KM_WEIGHT * km_score
+        + CITY_WEIGHT * city_score
+        + IMAGE_WEIGHT * image_score
+    )
+
+
+def _normalize(text):
+    if not text:
+        return ""
+    return re.sub(r"[^A-Z0-9]", "", text.upper())
+
+
+def _image_name(url):
+    if not url:
+        return ""
+    return os.path.basename(urlparse(url).path).lower()
+
+
+def _find(parents, position):
+    while parents[position] != position:
+        parents[position] = parents[parents[position]]
+        position = parents[position]
+    return position
+
+
+def _union(parents, cluster_sources, position, other_position):
+    # Clusters are only merged when no web site lists a car of both, so that
+    # chained matches never merge two listings of the same site
+    root, other_root = _find(parents, position), _find(parents, other_position)
+    if root == other_root or cluster_sources[root] & cluster_sources[other_root]:
+        return
+    root, other_root = min(root, other_root), max(root, other_root)
+    parents[other_root] = root
+    cluster_sources[root] |= cluster_sources[other_root]
@@ -1,5 +1,6 @@
 import json
 from dataclasses import dataclass
+from typing import Optional
 
 
 @dataclass
@@ -14,14 +15,14 @@ class ElectricCar:
     vehicle_type: str
 
     published_date: str
-    is_pro: int
-    new: bool
-    first_registration_year: int
-    kilometers: int
+    is_pro: Optional[bool]
+    new: Optional[bool]
+    first_registration_year: Optional[int]
+    kilometers: Optional[int]
 
     price: float
-    warranty_months: int
-    car_pass: bool
+    warranty_months: Optional[int]
+    car_pass: Optional[bool]
 
     description: str
 
@@ -29,6 +30,9 @@ class ElectricCar:
     image_url: str
     point_of_sale_city: str
 
+    # Web site the listing comes from, see deduplication.SOURCES
+    source: Optional[str] = None
+
     def to_json(self):
         return json.dumps(self.__dict__, indent=4)
 
@@ -1,5 +1,9 @@
+import heapq
 import re
-from collections import OrderedDict, defaultdict
+from collections import Counter, OrderedDict, defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+from itertools import accumulate, islice
 
 from src.logging_config import setup_logging
 
@@ -7,6 +11,18 @@ from src.logging_config import setup_logging
 logger = setup_logging(__name__)
 
 
+NGRAM_SIZE = 3
+FUZZY_THRESHOLD = 0.85  # Minimum similarity of a fuzzy make and model match
+FUZZY_MAX_TOKENS = 10  # Make and model are looked for in the leading words only
+FUZZY_MAX_WINDOW = 4  # Maximum number of consecutive words matched as one name
+FUZZY_CANDIDATES = 5  # Candidates from the n-gram index re-scored by similarity
+FUZZY_MIN_MODEL_LENGTH = 4  # Shorter model names must be spelled exactly
+FUZZY_MAKE_THRESHOLD = 0.5  # Minimum n-gram similarity of a word to a make
+FUZZY_MAKE_SIMILARITY = 0.75  # Minimum edit similarity of a misspelled make
+FUZZY_MIN_NGRAM_SIMILARITY = 0.5  # Index candidates below are not re-scored
+
+_TOKEN_PATTERN = re.compile(r"[A-Z0-9]+")
+
 # Input list of makes and models
 models = [
     "ABARTH 500",
@@ -228,6 +244,229 @@ def find_make_and_model(text):
     return None, None
 
 
+def _ngrams(text):
+    padded = f"#{text}#"
+    return {padded[i : i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+def build_ngram_index(reference_list):
+    """
+    Index the reference makes and models by character n-grams.
+
+    Args:
+        reference_list (dict): Make -> [model name, cleaned model name] lists.
+
+    Returns:
+        tuple: The (make, model name, cleaned model name, cleaned full name)
+        entries, the n-gram sets of their full names, and the n-gram -> entry
+        positions index.
+    """
+    entries = []
+    entry_ngrams = []
+    index = defaultdict(list)
+    for make, model_list in reference_list.items():
+        cleaned_make = re.sub(r"[^A-Z0-9]", "", make)
+        for model_name, cleaned_model_name in model_list:
+            full_name = f"{cleaned_make}{cleaned_model_name}"
+            ngrams = _ngrams(full_name)
+            for ngram in ngrams:
+                index[ngram].append(len(entries))
+            entries.append((make, model_name, cleaned_model_name, full_name))
+            entry_ngrams.append(ngrams)
+    return entries, entry_ngrams, dict(index)
+
+
+def build_make_ngram_index(reference_list):
+    """Index the cleaned reference makes by character n-grams."""
+    index = defaultdict(list)
+    for make in reference_list:
+        cleaned_make = re.sub(r"[^A-Z0-9]", "", make)
+        for ngram in _ngrams(cleaned_make):
+            index[ngram].append(cleaned_make)
+    return dict(index)
+
+
+ngram_entries, ngram_entry_sets, ngram_index = build_ngram_index(reference_list)
+make_ngram_index = build_make_ngram_index(reference_list)
+
+
+def find_make_and_model_fuzzy(text, threshold=FUZZY_THRESHOLD):
+    """
+    Find the make and model of a listing whose text contains a misspelled name,
+    such as 'VOLKSWAGON ID3' or 'NISAN LEAF'.
+
+    Groups of consecutive leading words are looked up in the n-gram index, and
+    only the best candidates it returns are re-scored by edit similarity. The
+    first word of a group is scored against the make and the other ones against
+    the model, only the model similarity being compared to the threshold, so
+    that a correctly spelled make cannot carry another model of its brand.
+
+    Args:
+        text (str): The listing text, starting with its make and model fields.
+        threshold (float): Minimum model similarity to accept a match.
+
+    Returns:
+        tuple: (make, model name), or (None, None) if no match is confident enough.
+    """
+    tokens = [
+        match.group()
+        for match in islice(_TOKEN_PATTERN.finditer(text.upper()), FUZZY_MAX_TOKENS)
+    ]
+
+    best_match = None
+    for start in range(len(tokens)):
+        # Names are only looked for from words that look like a make
+        if not _is_make_like(tokens[start]):
+            continue
+        for end in range(start + 2, min(start + FUZZY_MAX_WINDOW, len(tokens)) + 1):
+            match = _match_window(tokens[start], "".join(tokens[start + 1 : end]))
+            if match is not None and (best_match is None or match[0] > best_match[0]):
+                best_match = match
+
+    if best_match is None or best_match[0] < threshold:
+        logger.debug(f"No fuzzy make and model match for {text}")
+        return None, None
+    return best_match[1], best_match[2]
+
+
+@lru_cache(maxsize=65536)
+def _is_make_like(token):
+    ngrams = _ngrams(token)
+    counts = Counter()
+    for ngram in ngrams:
+        counts.update(make_ngram_index.get(ngram, ()))
+    return any(
+        2 * count / (len(ngrams) + len(_ngrams(make))) >= FUZZY_MAKE_THRESHOLD
+        for make, count in counts.items()
+    )
+
+
+@lru_cache(maxsize=65536)
+def _match_window(make_part, model_part):
+    window = f"{make_part}{model_part}"
+    ngrams = _ngrams(window)
+    counts = Counter()
+    for ngram in ngrams:
+        counts.update(ngram_index.get(ngram, ()))
+    if not counts:
+        return None
+
+    similarities = {
+        position: 2 * count / (len(ngrams) + len(ngram_entry_sets[position]))
+        for position, count in counts.items()
+    }
+    candidates = [
+        position
+        for position in heapq.nlargest(
+            FUZZY_CANDIDATES, similarities, key=similarities.get
+        )
+        if similarities[position] >= FUZZY_MIN_NGRAM_SIMILARITY
+    ]
+
+    best_match = None
+    digits = re.sub(r"[^0-9]", "", window)
+    for position in candidates:
+        make, model_name, cleaned_model_name, full_name = ngram_entries[position]
+        # Model numbers are never guessed, e.g. a PEUGEOT 206 is not an e-208
+        if re.sub(r"[^0-9]", "", full_name) != digits:
+            continue
+        # Short model names are too close to each other, e.g. BMW X3 and IX3
+        if (
+            len(cleaned_model_name) < FUZZY_MIN_MODEL_LENGTH
+            and cleaned_model_name not in window
+        ):
+            continue
+        # Makes and models are scored apart, a misspelled make only having to
+        # be close enough while the model is scored against the threshold
+        make_similarity = SequenceMatcher(
+            None, make_part, full_name[: -len(cleaned_model_name)]
+        ).ratio()
+        if make_similarity < FUZZY_MAKE_SIMILARITY:
+            continue
+        similarity = SequenceMatcher(None, model_part, cleaned_model_name).ratio()
+        if best_match is None or similarity > best_match[0]:
+            best_match = (similarity, make, model_name)
+    return best_match
+
+
+def is_weak_model_match(model_name, text):
+    """
+    Tell whether an exactly matched model name is only a weak hit on the text,
+    being a single character or only found inside other words, such as the S
+    found in 'TESLA MODL Y'.
+    """
+    cleaned_model_name = re.sub(r"[^A-Z0-9]", "", model_name.upper())
+    if len(cleaned_model_name) < 2:
+        return True
+    tokens = _TOKEN_PATTERN.findall(text.upper())
+    boundaries = set(accumulate(map(len, tokens), initial=0))
+    cleaned_text = "".join(tokens)
+    position = cleaned_text.find(cleaned_model_name)
+    while position != -1:
+        if position in boundaries and position + len(cleaned_model_name) in boundaries:
+            return False
+        position = cleaned_text.find(cleaned_model_name, position + 1)
+    return True
+
+
+def find_model_fuzzy(make, text, threshold=FUZZY_THRESHOLD):
+    """
+    Find the model of a listing whose make is known but whose model name is
+    misspelled, such as 'TESLA MODLE 3'.
+
+    The words following the make are scored against the models of that make
+    only, word boundaries included, with the same rules on model numbers and
+    short model names as find_make_and_model_fuzzy.
+
+    Args:
+        make (str): The make found in the text, as in the reference list.
+        text (str): The listing text, starting with its make and model fields.
+        threshold (float): Minimum model similarity to accept a match.
+
+    Returns:
+        str: The model name, or None if no match is confident enough.
+    """
+    tokens = [
+        match.group()
+        for match in islice(_TOKEN_PATTERN.finditer(text.upper()), FUZZY_MAX_TOKENS)
+    ]
+    cleaned_make = re.sub(r"[^A-Z0-9]", "", make)
+
+    best_match = None
+    for start, token in enumerate(tokens):
+        if token != cleaned_make:
+            continue
+        for end in range(start + 2, min(start + FUZZY_MAX_WINDOW, len(tokens)) + 1):
+            match = _match_model(make, " ".join(tokens[start + 1 : end]))
+            if match is not None and (best_match is None or match[0] > best_match[0]):
+                best_match = match
+
+    if best_match is None or best_match[0] < threshold:
+        logger.debug(f"No fuzzy {make} model match for {text}")
+        return None
+    return best_match[1]
+
+
+@lru_cache(maxsize=65536)
+def _match_model(make, model_part):
+    best_match = None
+    digits = re.sub(r"[^0-9]", "", model_part)
+    for model_name, cleaned_model_name in reference_list[make]:
+        if (
+            len(cleaned_model_name) < FUZZY_MIN_MODEL_LENGTH
+            or re.sub(r"[^0-9]", "", cleaned_model_name) != digits
+        ):
+            continue
+        similarity = SequenceMatcher(
+            None, model_part, " ".join(_TOKEN_PATTERN.findall(model_name))
+        ).ratio()
+        if best_match is None or similarity > best_match[0]:
+            best_match = (similarity, model_name)
+    return best_match
+
+
 if __name__ == "__main__":
     ma, mod = find_make_and_model("skoda fabia")
     logger.info(f"{ma} | {mod}")
+    ma, mod = find_make_and_model_fuzzy("volkswagon id3 pro")
+    logger.info(f"{ma} | {mod}")
@@ -0,0 +1,150 @@
+"""Per-model depreciation regressions giving each listing a fair price."""
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.config import CACHE_DIR
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+# Cached as a numpy archive, which loads without unpickling
+COEFFICIENTS_FILE = os.path.join(CACHE_DIR, "fair_price.npz")
+COEFFICIENTS_VERSION = 1  # Bump when the features change to discard old caches
+
+# Weight pulling the coefficients of a model towards the ones of all models, so
+# that models with few listings still get sensible fair prices
+RIDGE = 5.0
+
+FEATURE_COUNT = 3  # Intercept, registration year and kilometers
+
+
+def features(years, kilometers):
+    """
+    Build the regression features of listings.
+
+    Args:
+        years (np.ndarray): Registration years, 0 when unknown.
+        kilometers (np.ndarray): Kilometers, NaN when unknown.
+
+    Returns:
+        tuple: The (n, FEATURE_COUNT) feature matrix, and the mask of the rows
+        whose features are all known.
+    """
+    years = np.asarray(years, dtype=np.float64)
+    kilometers = np.asarray(kilometers, dtype=np.float64)
+    x = np.column_stack([np.ones(len(years)), years - 2000.0, kilometers / 10000.0])
+    return x, (years > 0) & ~np.isnan(kilometers)
+
+
+def fit(groups, x, log_prices, group_count, ridge=RIDGE):
+    """
+    Fit one log-price regression per group at once, from grouped normal equations.
+
+    The X'X matrix and X'y vector of every group are summed with bincount, then
+    all the ridge systems, shrunk towards the regression of all the rows, are
+    solved in one batched call.
+
+    Args:
+        groups (np.ndarray): Group number of each row, in [0, group_count).
+        x (np.ndarray): (n, FEATURE_COUNT) features of each row.
+        log_prices (np.ndarray): Log price of each row.
+        group_count (int): Number of groups.
+        ridge (float): Shrinkage weight.
+
+    Returns:
+        np.ndarray: (group_count, FEATURE_COUNT) coefficients.
+    """
+    xtx = np.empty((group_count, FEATURE_COUNT, FEATURE_COUNT))
+    xty = np.empty((group_count, FEATURE_COUNT))
+    for i in range(FEATURE_COUNT):
+        xty[:, i] = np.bincount(
+            groups, weights=x[:, i] * log_prices, minlength=group_count
+        )
+        for j in range(i, FEATURE_COUNT):
+            xtx[:, i, j] = xtx[:, j, i] = np.bincount(
+                groups, weights=x[:, i] * x[:, j], minlength=group_count
+            )
+
+    penalty = ridge * np.eye(FEATURE_COUNT)
+    overall = np.linalg.solve(xtx.sum(axis=0) + 1e-6 * penalty, xty.sum(axis=0))
+    return np.linalg.solve(xtx + penalty, (xty + penalty @ overall)[..., None])[..., 0]
+
+
+def score_listings(models, years, kilometers, prices):
+    """
+    Estimate the fair price of each listing and how far below it it is priced.
+
+    Coefficients are cached along with the digest of the data they were fitted
+    on, and only refitted when the data changes.
+
+    Args:
+        models (list): Model name of each listing.
+        years (list): Registration year of each listing, 0 when unknown.
+        kilometers (list): Kilometers of each listing, None when unknown.
+        prices (list): Price of each listing.
+
+    Returns:
+        tuple: The fair prices, and the deal scores, the share of the fair price
+        saved, NaN where the year or kilometers are unknown.
+    """
+    groups, model_names = pd.factorize(pd.Series(models, dtype=object), sort=True)
+    x, known = features(
+        years,
+        pd.Series(kilometers, dtype="Float64").to_numpy(np.float64, na_value=np.nan),
+    )
+    prices = np.asarray(prices, dtype=np.float64)
+    known &= prices > 0
+
+    digest = _digest(model_names, groups[known], x[known], prices[known])
+    coefficients = _load_coefficients(digest)
+    if coefficients is None:
+        start = time.perf_counter()
+        coefficients = fit(
+            groups[known], x[known], np.log(prices[known]), len(model_names)
+        )
+        logger.info(
+            f"Fitted the fair price of {len(model_names)} models on "
+            f"{int(known.sum())} listings in {time.perf_counter() - start:.3f}s"
+        )
+        _save_coefficients(digest, coefficients)
+
+    fair_prices = np.full(len(prices), np.nan)
+    fair_prices[known] = np.exp(
+        np.einsum("ij,ij->i", x[known], coefficients[groups[known]])
+    )
+    return fair_prices, 1.0 - prices / fair_prices
+
+
+def _digest(model_names, groups, x, prices):
+    content = hashlib.sha256(str(COEFFICIENTS_VERSION).encode())
+    content.update("\n".join(model_names).encode())
+    for values in (groups.astype(np.int64), x, prices):
+        content.update(np.ascontiguousarray(values).tobytes())
+    return content.hexdigest()
+
+
+def _load_coefficients(digest):
+    if not os.path.exists(COEFFICIENTS_FILE):
+        return None
+    try:
+        with np.load(COEFFICIENTS_FILE, allow_pickle=False) as cached:
+            if str(cached["digest"]) == digest:
+                return cached["coefficients"]
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable fair price coefficients: {e!s}")
+    return None
+
+
+def _save_coefficients(digest, coefficients):
+    try:
+        with open(COEFFICIENTS_FILE, "wb") as f:
+            np.savez(f, digest=np.array(digest), coefficients=coefficients)
+    except OSError as e:
+        logger.warning(f"Could not cache fair price coefficients: {e!s}")
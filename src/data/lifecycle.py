@@ -0,0 +1,264 @@
+"""First and last appearance, price changes and disappearances of each listing."""
+import os
+
+import numpy as np
+import pandas as pd
+
+from src import file_management
+from src.config import LIFECYCLE_FILE
+from src.data import price_changes, snapshots
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+# Columns added to the display dataset
+LIFECYCLE_COLUMNS = ["First Seen", "Days On Market", "Price Changes", "Disappearances"]
+
+
+def empty_lifecycle():
+    """Return a lifecycle table without any listing."""
+    return pd.DataFrame(
+        {
+            snapshots.LISTING_KEY: pd.Series(dtype=np.int64),
+            "First Seen": pd.Series(dtype="datetime64[ns]"),
+            "Last Seen": pd.Series(dtype="datetime64[ns]"),
+            "Price": pd.Series(dtype=np.float64),
+            "Price Changes": pd.Series(dtype=np.int32),
+            "Disappearances": pd.Series(dtype=np.int32),
+            "Listed": pd.Series(dtype=np.bool_),
+        }
+    )
+
+
+def load_lifecycle(path=LIFECYCLE_FILE):
+    """
+    Load the lifecycle table and the name of the last snapshot applied to it.
+
+    Returns:
+        tuple: The table, sorted by listing key, and the snapshot name or None.
+    """
+    if not os.path.exists(path):
+        return empty_lifecycle(), None
+    state = file_management.load_pickle(path)
+    return state["listings"], state["snapshot"]
+
+
+def apply_snapshot(listings, keys, prices, seen_at):
+    """
+    Update the lifecycle table with the listings of a new snapshot.
+
+    The snapshot is matched with binary searches in the sorted keys of the table,
+    so each update costs O(n log n) whatever the number of past snapshots.
+
+    Args:
+        listings (pd.DataFrame): Lifecycle table, sorted by listing key.
+        keys (np.ndarray): Sorted unique listing keys of the snapshot.
+        prices (np.ndarray): Price of each listing of the snapshot.
+        seen_at (datetime): Date of the snapshot.
+
+    Returns:
+        pd.DataFrame: The updated table, sorted by listing key.
+    """
+    seen_at = np.datetime64(seen_at, "ns")
+    positions = price_changes.lookup(
+        listings[snapshots.LISTING_KEY].to_numpy(dtype=np.int64), keys
+    )
+    found = positions >= 0
+    seen = positions[found]
+
+    still_listed = np.zeros(len(listings), dtype=np.bool_)
+    still_listed[seen] = True
+    last_seen = listings["Last Seen"].to_numpy(copy=True)
+    last_seen[seen] = seen_at
+    last_prices = listings["Price"].to_numpy(dtype=np.float64, copy=True)
+    changes = listings["Price Changes"].to_numpy(dtype=np.int32, copy=True)
+    changes[seen] += last_prices[seen] != prices[found]
+    last_prices[seen] = prices[found]
+    disappearances = listings["Disappearances"].to_numpy(dtype=np.int32, copy=True)
+    disappearances += listings["Listed"].to_numpy(dtype=np.bool_) & ~still_listed
+
+    new_count = int((~found).sum())
+    updated = pd.concat(
+        [
+            listings.assign(
+                **{
+                    "Last Seen": last_seen,
+                    "Price": last_prices,
+                    "Price Changes": changes,
+                    "Disappearances": disappearances,
+                    "Listed": still_listed,
+                }
+            ),
+            pd.DataFrame(
+                {
+                    snapshots.LISTING_KEY: keys[~found],
+                    "First Seen": np.full(new_count, seen_at),
+                    "Last Seen": np.full(new_count, seen_at),
+                    "Price": prices[~found],
+                    "Price Changes": np.zeros(new_count, dtype=np.int32),
+                    "Disappearances": np.zeros(new_count, dtype=np.int32),
+                    "Listed": np.ones(new_count, dtype=np.bool_),
+                }
+            ),
+        ],
+        ignore_index=True,
+    )
+    order = np.argsort(updated[snapshots.LISTING_KEY].to_numpy(), kind="stable")
+    return updated.iloc[order].reset_index(drop=True)
+
+
+def update_lifecycle(path=LIFECYCLE_FILE, price_drops=None):
+    """
+    Apply the snapshots saved since the last update to the lifecycle table.
+
+    Args:
+        path (str): The lifecycle table file.
+        price_drops (tuple): Listing keys, new prices and times of the price
+            drops seen while scraping, applied before the new snapshots, see
+            apply_price_drops() and PriceTracker.price_drops().
+
+    Returns:
+        pd.DataFrame: The lifecycle table.
+    """
+    listings, last_snapshot = load_lifecycle(path)
+    new_snapshots = [
+        snapshot_path
+        for snapshot_path in reversed(snapshots.list_snapshots())
+        if last_snapshot is None or os.path.basename(snapshot_path) > last_snapshot
+    ]
+    drop_count = 0
+    if price_drops is not None and len(price_drops[0]):
+        listings, drop_count = apply_price_drops(listings, *price_drops)
+    if not new_snapshots and not drop_count:
+        return listings
+
+    for snapshot_path in new_snapshots:
+        keys, prices = snapshots.snapshot_prices(snapshot_path)
+        listings = apply_snapshot(
+            listings,
+            keys,
+            prices,
+            file_management.get_file_creation_time(snapshot_path),
+        )
+        last_snapshot = os.path.basename(snapshot_path)
+
+    _save_lifecycle(listings, last_snapshot, path)
+    logger.info(
+        f"Lifecycle of {len(listings)} listings updated with {drop_count} price "
+        f"drops and {len(new_snapshots)} snapshots, "
+        f"{int(listings['Listed'].sum())} listed"
+    )
+    return listings
+
+
+def apply_price_drops(listings, keys, prices, seen_at):
+    """
+    Update the lifecycle table with the price drops seen while scraping.
+
+    The last price, last appearance and number of price changes of the
+    listings already in the table are updated, so that applying their snapshot
+    afterwards finds the same price and does not count the drops again.
+    Listings missing from the table are left to the snapshot.
+
+    Args:
+        listings (pd.DataFrame): Lifecycle table, sorted by listing key.
+        keys (np.ndarray): Listing key of each drop, in the order they were seen.
+        prices (np.ndarray): New price of each drop.
+        seen_at (np.ndarray): When each drop was seen.
+
+    Returns:
+        tuple: The updated table and the number of listings updated.
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    # Last drop of each listing, with the number of its drops
+    _, last, counts = np.unique(keys[::-1], return_index=True, return_counts=True)
+    last = len(keys) - 1 - last
+    positions = price_changes.lookup(
+        listings[snapshots.LISTING_KEY].to_numpy(dtype=np.int64), keys[last]
+    )
+    found = positions >= 0
+    rows = positions[found]
+    prices = np.asarray(prices, dtype=np.float64)[last][found]
+    seen_at = np.asarray(seen_at, dtype="datetime64[ns]")[last][found]
+    counts = counts[found]
+    last_prices = listings["Price"].to_numpy(dtype=np.float64, copy=True)
+    changed = last_prices[rows] != prices
+    rows, prices, seen_at = rows[changed], prices[changed], seen_at[changed]
+    if len(rows) == 0:
+        return listings, 0
+
+    last_seen = listings["Last Seen"].to_numpy(copy=True)
+    last_seen[rows] = seen_at
+    last_prices[rows] = prices
+    changes = listings["Price Changes"].to_numpy(dtype=np.int32, copy=True)
+    changes[rows] += counts[changed].astype(np.int32)
+    listings = listings.assign(
+        **{"Last Seen": last_seen, "Price": last_prices, "Price Changes": changes}
+    )
+    return listings, len(rows)
+
+
+def lifecycle_columns(keys, prices=None, listings=None):
+    """
+    Return the lifecycle columns of the display dataset.
+
+    Listings never seen in a snapshot are considered first seen now.
+
+    Args:
+        keys (np.ndarray): Listing key of each row.
+        prices (np.ndarray): Price of each row, for a dataset scraped now and
+            not saved yet. It is then applied to a copy of the lifecycle table
+            as the next snapshot, so that its columns count the current scrape.
+        listings (pd.DataFrame): Lifecycle table, loaded if None.
+
+    Returns:
+        dict: One array per LIFECYCLE_COLUMNS name.
+    """
+    if listings is None:
+        listings, _ = load_lifecycle()
+    keys = np.asarray(keys, dtype=np.int64)
+    now = np.datetime64(pd.Timestamp.now().floor("s").to_datetime64(), "ns")
+    if prices is not None:
+        snapshot_keys, rows = price_changes.sorted_key_index(keys)
+        listings = apply_snapshot(
+            listings,
+            snapshot_keys,
+            np.asarray(prices, dtype=np.float64)[rows],
+            now,
+        )
+    positions = price_changes.lookup(
+        listings[snapshots.LISTING_KEY].to_numpy(dtype=np.int64), keys
+    )
+    found = positions >= 0
+    seen = positions[found]
+
+    first_seen = np.full(len(keys), now)
+    first_seen[found] = listings["First Seen"].to_numpy()[seen]
+    last_seen = np.full(len(keys), now)
+    last_seen[found] = listings["Last Seen"].to_numpy()[seen]
+    changes = np.zeros(len(keys), dtype=np.int32)
+    changes[found] = listings["Price Changes"].to_numpy()[seen]
+    disappearances = np.zeros(len(keys), dtype=np.int32)
+    disappearances[found] = listings["Disappearances"].to_numpy()[seen]
+
+    return {
+        "First Seen": first_seen,
+        "Days On Market": ((last_seen - first_seen) // np.timedelta64(1, "D")).astype(
+            np.int32
+        ),
+        "Price Changes": changes,
+        "Disappearances": disappearances,
+    }
+
+
+def _save_lifecycle(listings, last_snapshot, path):
+    directory, file_name = os.path.split(path)
+    file_management.save_pickle(
+        {"snapshot": last_snapshot, "listings": listings},
+        directory,
+        os.path.splitext(file_name)[0],
+        add_date_prefix=False,
+    )
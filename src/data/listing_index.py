@@ -0,0 +1,182 @@
+"""Persistent dense integer keys of (source, Id) listing pairs."""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from src import file_management
+from src.config import LISTING_INDEX_FILE
+from src.data.near_duplicates import normalize_description
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+# DataFrame columns identifying a listing without an Id. The price is left out,
+# so that a repriced listing keeps its key.
+CONTENT_COLUMNS = (
+    "Brand Name",
+    "Model Name",
+    "First Registration Year",
+    "Kilometers",
+    "Description",
+)
+
+
+class ListingIndex:
+    """
+    Global index giving each (source, Id) pair a dense int64 listing key.
+
+    Keys are assigned in order of first appearance and never change, so they
+    can be stored in snapshots and compared across them. Ids are indexed as
+    strings, whatever type the site returned them as, and listings without an
+    Id are indexed by a hash of their content, see listing_id(). Negative keys
+    are the unstored keys of pairs looked up without being assigned.
+    """
+
+    def __init__(self, pairs=()):
+        self._pairs = list(pairs)
+        self._keys = {pair: key for key, pair in enumerate(self._pairs)}
+        self.changed = False
+
+    @classmethod
+    def load(cls, path=LISTING_INDEX_FILE):
+        """Load the index saved at path, or return an empty index."""
+        if not os.path.exists(path):
+            return cls()
+        return cls(file_management.load_pickle(path))
+
+    def save(self, path=LISTING_INDEX_FILE):
+        """Save the index, as the list of pairs ordered by key."""
+        directory, file_name = os.path.split(path)
+        file_management.save_pickle(
+            self._pairs,
+            directory,
+            os.path.splitext(file_name)[0],
+            add_date_prefix=False,
+        )
+        self.changed = False
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def get_keys(self, sources, ids, contents, assign=True):
+        """
+        Return the key of each (source, Id) pair.
+
+        Args:
+            sources (iterable): The web site of each listing.
+            ids (iterable): The Id of each listing on its web site.
+            contents (iterable): The CONTENT_COLUMNS values of each listing,
+                identifying the listings without an Id.
+            assign (bool): Assign keys to the pairs missing from the index.
+                Otherwise they get a negative key hashed from the pair, which is
+                stable but never stored.
+
+        Returns:
+            np.ndarray: One int64 key per listing.
+        """
+        keys = []
+        for source, raw_id, content in zip(sources, ids, contents):
+            pair = (source, listing_id(raw_id, content))
+            key = self._keys.get(pair)
+            if key is None:
+                if not assign:
+                    key = _unindexed_key(pair)
+                else:
+                    key = self._keys[pair] = len(self._pairs)
+                    self._pairs.append(pair)
+                    self.changed = True
+            keys.append(key)
+        return np.array(keys, dtype=np.int64)
+
+    def get_pair(self, key):
+        """Return the (source, Id) pair of a listing key, None if unindexed."""
+        return self._pairs[key] if key >= 0 else None
+
+
+_index = None
+
+
+def get_listing_index():
+    """Return the listing index, loading it on first use."""
+    global _index
+    if _index is None:
+        _index = ListingIndex.load()
+    return _index
+
+
+def assign_listing_keys(sources, ids, contents):
+    """
+    Return the listing keys of (source, Id) pairs, saving the index if new
+    pairs were added to it.
+    """
+    index = get_listing_index()
+    keys = index.get_keys(sources, ids, contents)
+    if index.changed:
+        index.save()
+        logger.info(f"Listing index saved with {len(index)} listings")
+    return keys
+
+
+def lookup_listing_keys(sources, ids, contents):
+    """
+    Return the listing keys of (source, Id) pairs without changing the index,
+    for read-only paths such as loading the dashboard.
+    """
+    return get_listing_index().get_keys(sources, ids, contents, assign=False)
+
+
+def listing_id(raw_id, content):
+    """
+    Return the Id of a listing as a string, as indexed.
+
+    Listings without an Id get a hash of their content instead, so that they
+    do not all share the key of a missing Id.
+
+    Args:
+        raw_id: The Id of the listing on its web site, None if missing.
+        content (tuple): The CONTENT_COLUMNS values of the listing.
+
+    Returns:
+        str: The Id, or 'content:' followed by the hexadecimal content hash.
+    """
+    if not _is_missing(raw_id) and str(raw_id).strip():
+        return str(raw_id)
+    *fields, description = content
+    text = "\x1f".join(
+        [
+            *("" if _is_missing(value) else str(value) for value in fields),
+            normalize_description(description),
+        ]
+    )
+    return f"content:{hashlib.blake2b(text.encode(), digest_size=8).hexdigest()}"
+
+
+def car_content(car):
+    """Return the CONTENT_COLUMNS values of an ElectricCar."""
+    return (
+        car.brand_name,
+        car.model_name,
+        car.first_registration_year,
+        car.kilometers,
+        car.description,
+    )
+
+
+def frame_contents(df):
+    """Return the CONTENT_COLUMNS values of each row of a DataFrame."""
+    return zip(*(df[column].tolist() for column in CONTENT_COLUMNS))
+
+
+def _is_missing(value):
+    return value is None or (not isinstance(value, str) and bool(pd.isna(value)))
+
+
+def _unindexed_key(pair):
+    # 62 bits of a hash of the pair, below the dense keys of the index
+    digest = hashlib.blake2b("\x1f".join(pair).encode(), digest_size=8).digest()
+    return -1 - (int.from_bytes(digest, "little") >> 2)
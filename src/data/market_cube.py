@@ -0,0 +1,132 @@
+"""Price statistics by model, year, kilometers and source for each snapshot."""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src import file_management
+from src.data import snapshots
+from src.data.dataframes import listing_sources
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+CUBE_FILE_SUFFIX = "_cube.pkl"
+KM_BUCKET_SIZE = 25000
+
+# Dimensions of the cube, 'Km Bucket' being the lower bound of a kilometer
+# bucket, -1 for unknown kilometers, and 'year' 0 an unknown year
+DIMENSIONS = ["model", "year", "Km Bucket", "Source"]
+STATISTICS = ["Count", "Min", "Q1", "Median", "Q3", "Mean", "Max"]
+
+
+def build_cube(df, km_bucket_size=KM_BUCKET_SIZE):
+    """
+    Aggregate the prices of a display dataset by model, year, km bucket and source.
+
+    Args:
+        df (pd.DataFrame): Display dataset with 'model', 'year', 'Kilometers',
+            'Price' and 'URL' columns.
+        km_bucket_size (int): Width of the kilometer buckets.
+
+    Returns:
+        pd.DataFrame: One row per non-empty cell, with the DIMENSIONS and the
+        price STATISTICS.
+    """
+    kilometers = df["Kilometers"].to_numpy(dtype=np.float64, na_value=np.nan)
+    km_buckets = np.where(
+        np.isnan(kilometers),
+        -1,
+        np.floor_divide(np.nan_to_num(kilometers), km_bucket_size) * km_bucket_size,
+    ).astype(np.int32)
+    cells = pd.DataFrame(
+        {
+            "model": df["model"].astype(str).to_numpy(),
+            "year": df["year"].to_numpy(dtype=np.int16),
+            "Km Bucket": km_buckets,
+            "Source": listing_sources(df).to_numpy(dtype=object),
+            "Price": df["Price"].to_numpy(dtype=np.float64),
+        }
+    )
+
+    prices = cells.groupby(DIMENSIONS, sort=True)["Price"]
+    quartiles = prices.quantile([0.25, 0.75]).unstack()
+    cube = pd.DataFrame(
+        {
+            "Count": prices.count(),
+            "Min": prices.min(),
+            "Q1": quartiles[0.25],
+            "Median": prices.median(),
+            "Q3": quartiles[0.75],
+            "Mean": prices.mean(),
+            "Max": prices.max(),
+        }
+    )
+    cube["Count"] = cube["Count"].astype(np.int32)
+    return cube.reset_index()
+
+
+def get_cube(snapshot_path, df=None):
+    """
+    Load the cube stored next to a snapshot, building and storing it first if
+    it does not exist yet.
+
+    Args:
+        snapshot_path (str): Path of the snapshot pickle.
+        df (pd.DataFrame): The snapshot, loaded from snapshot_path if None.
+
+    Returns:
+        pd.DataFrame: The cube of the snapshot, see build_cube().
+    """
+    cube_path = _cube_path(snapshot_path)
+    if os.path.exists(cube_path):
+        return file_management.load_pickle(cube_path)
+
+    if df is None:
+        df = file_management.load_pickle(snapshot_path)
+    start = time.perf_counter()
+    cube = build_cube(df)
+    directory, file_name = os.path.split(cube_path)
+    file_management.save_pickle(
+        cube, directory, file_name[: -len(".pkl")], add_date_prefix=False
+    )
+    logger.info(
+        f"Stored a {len(cube)} cell market cube of {len(df)} listings in "
+        f"{cube_path}, built in {time.perf_counter() - start:.3f}s"
+    )
+    return cube
+
+
+def load_market_cube(window=None, snapshot_paths=None):
+    """
+    Load the cubes of the latest snapshots, only building the missing ones.
+
+    Args:
+        window (int): Number of snapshots, the latest ones being used. All of
+            them if None.
+        snapshot_paths (list): Snapshot paths latest first, defaults to all.
+
+    Returns:
+        pd.DataFrame: The cubes, with the file name of their 'Snapshot'.
+    """
+    if snapshot_paths is None:
+        snapshot_paths = snapshots.list_snapshots()
+    if window is not None:
+        snapshot_paths = snapshot_paths[:window]
+
+    cubes = [
+        get_cube(snapshot_path).assign(Snapshot=os.path.basename(snapshot_path))
+        for snapshot_path in reversed(snapshot_paths)
+    ]
+    if not cubes:
+        return pd.DataFrame(columns=["Snapshot", *DIMENSIONS, *STATISTICS])
+    cube = pd.concat(cubes, ignore_index=True)
+    return cube[["Snapshot", *DIMENSIONS, *STATISTICS]]
+
+
+def _cube_path(snapshot_path):
+    return f"{os.path.splitext(snapshot_path)[0]}{CUBE_FILE_SUFFIX}"
@@ -0,0 +1,248 @@
+"""MinHash/LSH near-duplicate detection on listing descriptions."""
+import os
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from src import file_management
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 32  # NUM_PERMUTATIONS must be a multiple of the number of bands
+SHINGLE_SIZE = 3  # Number of consecutive words per shingle
+SIMILARITY_THRESHOLD = 0.8
+# Descriptions with less distinct shingles, empty ones included, are too short
+# to tell two cars apart and are never linked
+MIN_SHINGLES = 5
+# Largest relative price and absolute mileage differences of a relisted car
+RELIST_PRICE_TOLERANCE = 0.3
+RELIST_KM_TOLERANCE = 5000
+SIGNATURE_FILE_SUFFIX = "_signatures.pkl"
+LISTING_KEY = "Listing Key"
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Signature of the descriptions with less than MIN_SHINGLES shingles
+_NO_SIGNATURE = np.full(NUM_PERMUTATIONS, _MAX_HASH, dtype=np.uint32)
+
+# Fixed seed so that signatures stored with older snapshots stay comparable
+_random = np.random.default_rng(20240101)
+_permutation_a = _random.integers(1, 1 << 32, NUM_PERMUTATIONS, dtype=np.uint64)
+_permutation_b = _random.integers(0, 1 << 32, NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalize_description(text):
+    """Upper-case the text and keep only alphanumeric words."""
+    if not isinstance(text, str):
+        return ""
+    return " ".join(re.sub(r"[^A-Z0-9]+", " ", text.upper()).split())
+
+
+def minhash_signature(text):
+    """
+    Compute the MinHash signature of the word shingles of a description.
+
+    Args:
+        text (str): The listing description.
+
+    Returns:
+        np.ndarray: NUM_PERMUTATIONS uint32 values, all of them the largest
+        uint32 value if the description has less than MIN_SHINGLES shingles.
+    """
+    words = normalize_description(text).split()
+
+    # crc32 is used rather than hash() which is salted per process
+    shingle_hashes = np.fromiter(
+        {
+            zlib.crc32(" ".join(words[i : i + SHINGLE_SIZE]).encode())
+            for i in range(len(words) - SHINGLE_SIZE + 1)
+        },
+        dtype=np.uint64,
+    )
+    if len(shingle_hashes) < MIN_SHINGLES:
+        return _NO_SIGNATURE.copy()
+    # a * x + b stays below 2**64 since a, b and x are all below 2**32
+    hashes = (
+        _permutation_a[:, None] * shingle_hashes[None, :] + _permutation_b[:, None]
+    ) % _MERSENNE_PRIME
+    return (hashes.min(axis=1) & _MAX_HASH).astype(np.uint32)
+
+
+def minhash_signatures(descriptions):
+    """Compute the signatures of several descriptions as a 2D array."""
+    signatures = np.empty((len(descriptions), NUM_PERMUTATIONS), dtype=np.uint32)
+    for row, text in enumerate(descriptions):
+        signatures[row] = minhash_signature(text)
+    return signatures
+
+
+def has_signature(signatures):
+    """Tell which signatures come from descriptions long enough to compare."""
+    return (np.asarray(signatures) != _NO_SIGNATURE).any(axis=-1)
+
+
+def estimate_similarity(signature, other_signature):
+    """Estimate the Jaccard similarity of two descriptions from their signatures."""
+    return float(np.mean(signature == other_signature))
+
+
+class LSHIndex:
+    """Banded locality-sensitive hashing index over MinHash signatures."""
+
+    def __init__(self, bands=LSH_BANDS):
+        self.bands = bands
+        self.rows = NUM_PERMUTATIONS // bands
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+        self._signatures = {}
+
+    def add(self, key, signature):
+        """
+        Index a signature under the given listing key.
+
+        Args:
+            key: The listing identifier.
+            signature (np.ndarray): The MinHash signature of the listing.
+        """
+        self._signatures[key] = signature
+        for band, buckets in enumerate(self._buckets):
+            buckets[self._band_key(signature, band)].append(key)
+
+    def query(self, signature, threshold=SIMILARITY_THRESHOLD):
+        """
+        Find the indexed listings whose description is similar to the signature.
+
+        Args:
+            signature (np.ndarray): The MinHash signature to look up.
+            threshold (float): Minimum estimated Jaccard similarity.
+
+        Returns:
+            list: (key, similarity) tuples, most similar first.
+        """
+        candidates = set()
+        for band, buckets in enumerate(self._buckets):
+            candidates.update(buckets.get(self._band_key(signature, band), ()))
+
+        matches = []
+        for key in candidates:
+            similarity = estimate_similarity(signature, self._signatures[key])
+            if similarity >= threshold:
+                matches.append((key, similarity))
+        return sorted(matches, key=lambda match: -match[1])
+
+    def _band_key(self, signature, band):
+        return signature[band * self.rows : (band + 1) * self.rows].tobytes()
+
+
+def get_signatures(snapshot_path, df):
+    """
+    Load the MinHash signatures stored next to a snapshot, computing and storing
+    them first if they do not exist yet.
+
+    Args:
+        snapshot_path (str): Path of the snapshot pickle.
+        df (pd.DataFrame): The snapshot, with a 'Description' column.
+
+    Returns:
+        np.ndarray: The signature of each row of the snapshot.
+    """
+    signature_path = _signature_path(snapshot_path)
+    if os.path.exists(signature_path):
+        return file_management.load_pickle(signature_path)
+
+    signatures = minhash_signatures(df["Description"].tolist())
+    directory, file_name = os.path.split(signature_path)
+    file_management.save_pickle(
+        signatures, directory, file_name[: -len(".pkl")], add_date_prefix=False
+    )
+    logger.info(f"Stored {len(signatures)} MinHash signatures in {signature_path}")
+    return signatures
+
+
+def link_relisted_listings(
+    df_previous,
+    df_current,
+    previous_signatures=None,
+    current_signatures=None,
+    threshold=SIMILARITY_THRESHOLD,
+):
+    """
+    Link listings that appeared in the current snapshot to a listing of the
+    previous snapshot which disappeared and had a near-identical description.
+
+    Only disappeared listings are indexed, and each new listing is probed through
+    the LSH index, so no pairwise comparison of the two snapshots is needed.
+    Candidates must also be of the same model, priced within
+    RELIST_PRICE_TOLERANCE and, when both are known, within RELIST_KM_TOLERANCE
+    kilometers.
+
+    Args:
+        df_previous (pd.DataFrame): The older snapshot.
+        df_current (pd.DataFrame): The newer snapshot.
+        previous_signatures (np.ndarray): Signatures of the older snapshot rows.
+        current_signatures (np.ndarray): Signatures of the newer snapshot rows.
+        threshold (float): Minimum estimated Jaccard similarity.
+
+    Returns:
+        dict: Listing key of each relisted listing -> listing key of its likely
+        previous incarnation.
+    """
+    previous_keys = df_previous[LISTING_KEY].to_numpy(dtype=np.int64)
+    current_keys = df_current[LISTING_KEY].to_numpy(dtype=np.int64)
+    previous_models = df_previous["model"].astype(str).to_numpy()
+    current_models = df_current["model"].astype(str).to_numpy()
+    previous_prices = df_previous["Price"].to_numpy(dtype=np.float64)
+    current_prices = df_current["Price"].to_numpy(dtype=np.float64)
+    previous_kilometers = _kilometers(df_previous)
+    current_kilometers = _kilometers(df_current)
+
+    if previous_signatures is None:
+        previous_signatures = minhash_signatures(df_previous["Description"].tolist())
+    if current_signatures is None:
+        current_signatures = minhash_signatures(df_current["Description"].tolist())
+
+    index = LSHIndex()
+    disappeared = ~np.isin(previous_keys, current_keys) & has_signature(
+        previous_signatures
+    )
+    for row in np.flatnonzero(disappeared):
+        index.add(row, previous_signatures[row])
+
+    relisted = {}
+    claimed = set()
+    appeared = ~np.isin(current_keys, previous_keys) & has_signature(current_signatures)
+    for row in np.flatnonzero(appeared):
+        for previous_row, _ in index.query(current_signatures[row], threshold):
+            if previous_row in claimed:
+                continue
+            if previous_models[previous_row] != current_models[row]:
+                continue
+            price_gap = abs(current_prices[row] - previous_prices[previous_row])
+            if price_gap > RELIST_PRICE_TOLERANCE * previous_prices[previous_row]:
+                continue
+            km_gap = abs(current_kilometers[row] - previous_kilometers[previous_row])
+            if km_gap > RELIST_KM_TOLERANCE:  # False when either is unknown
+                continue
+            relisted[int(current_keys[row])] = int(previous_keys[previous_row])
+            claimed.add(previous_row)
+            break
+
+    logger.info(f"Linked {len(relisted)} relisted listings to a previous listing")
+    return relisted
+
+
+def _kilometers(df):
+    if "Kilometers" not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df["Kilometers"]).to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _signature_path(snapshot_path):
+    return f"{os.path.splitext(snapshot_path)[0]}{SIGNATURE_FILE_SUFFIX}"
@@ -0,0 +1,120 @@
+"""Conversion of raw listing values to strictly typed car attributes."""
+import math
+import re
+
+
+_TRUE_STRINGS = {"1", "TRUE", "YES", "OUI", "JA", "Y"}
+_FALSE_STRINGS = {"0", "FALSE", "NO", "NON", "NEE", "N", ""}
+
+# The integer part of a number, with its thousands separators if it has any
+_NUMBER_PATTERN = re.compile(r"[0-9]{1,3}(?:[ .,'\u00a0][0-9]{3})+(?![0-9])|[0-9]+")
+
+
+def to_int(value):
+    """
+    Convert a raw value to an integer, or None if it is missing.
+
+    The integer part of the first number of a string is read, separators
+    followed by groups of three digits being thousands separators, so
+    '45.000 km' or '45 000' become 45000, while '45000.0' becomes 45000 and
+    '12,5' becomes 12.
+
+    Raises:
+        ValueError: If a string contains no digit at all.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return None if math.isnan(value) else int(value)
+    text = str(value).strip()
+    if not text:
+        return None
+    number = _NUMBER_PATTERN.search(text)
+    if number is None:
+        raise ValueError(f"No number in {value!r}")
+    return int(re.sub(r"[^0-9]", "", number.group()))
+
+
+def to_year(value):
+    """Convert a raw registration year to an integer, 0 meaning unknown."""
+    year = to_int(value)
+    return year or None
+
+
+def to_float(value):
+    """Convert a raw value to a float, or None if it is missing."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.replace(" ", "").replace(",", ".")
+    return float(value)
+
+
+def to_bool(value):
+    """
+    Convert a raw value to a boolean, or None if it is missing.
+
+    Raises:
+        ValueError: If a string is not a known boolean spelling.
+    """
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    text = str(value).strip().upper()
+    if text in _TRUE_STRINGS:
+        return True
+    if text in _FALSE_STRINGS:
+        return False
+    raise ValueError(f"Not a boolean: {value!r}")
+
+
+def to_str(value):
+    """Convert a raw value to a string, or None if it is missing."""
+    if value is None:
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+# ElectricCar attribute -> converter, for records saved by older versions
+CONVERTERS = {
+    "id": to_str,
+    "first_registration_year": to_year,
+    "kilometers": to_int,
+    "warranty_months": to_int,
+    "price": to_float,
+    "is_pro": to_bool,
+    "new": to_bool,
+    "car_pass": to_bool,
+    "brand_name": to_str,
+    "model_name": to_str,
+    "version": to_str,
+    "body_style": to_str,
+    "vehicle_type": to_str,
+    "published_date": to_str,
+    "description": to_str,
+    "url": to_str,
+    "point_of_sale_city": to_str,
+    "image_url": to_str,
+    "source": to_str,
+}
+
+
+def normalize_record(record):
+    """
+    Convert every attribute of a raw car record to its strict type.
+
+    Args:
+        record (dict): ElectricCar attributes, as read from a JSON file.
+
+    Returns:
+        dict: The record with typed values, unknown keys being kept as is.
+    """
+    return {
+        name: CONVERTERS[name](value) if name in CONVERTERS else value
+        for name, value in record.items()
+    }
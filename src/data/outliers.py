@@ -0,0 +1,99 @@
+"""Robust per-model and year price outlier flags."""
+import numpy as np
+import pandas as pd
+
+from src.config import (
+    OUTLIER_IQR_FACTOR,
+    OUTLIER_MAD_THRESHOLD,
+    OUTLIER_METHOD,
+    OUTLIER_MIN_GROUP_SIZE,
+)
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+# Scale making the median absolute deviation of normal prices match their
+# standard deviation
+MAD_SCALE = 1.4826
+
+
+def price_bounds(
+    df,
+    method=OUTLIER_METHOD,
+    iqr_factor=OUTLIER_IQR_FACTOR,
+    mad_threshold=OUTLIER_MAD_THRESHOLD,
+    min_group_size=OUTLIER_MIN_GROUP_SIZE,
+):
+    """
+    Compute the range of normal prices of each row, from the prices of its peers.
+
+    Peers are the listings of the same model and year, or of the same model when
+    there are less than min_group_size of them. Every group statistic is
+    computed with one groupby and mapped back to the rows by group number.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'model', 'year' and 'Price' columns.
+        method (str): 'iqr' for Tukey fences, 'mad' for median absolute deviation.
+        iqr_factor (float): Number of interquartile ranges allowed outside the
+            quartiles.
+        mad_threshold (float): Number of scaled median absolute deviations
+            allowed around the median.
+        min_group_size (int): Minimum number of listings of a model and year.
+
+    Returns:
+        tuple: Lower and upper price bound of each row, NaN for rows without
+        enough peers.
+    """
+    if method not in ("iqr", "mad"):
+        raise ValueError("Invalid outlier method. Choose 'iqr' or 'mad'.")
+
+    prices = df["Price"].to_numpy(dtype=np.float64)
+    lower = np.full(len(df), np.nan)
+    upper = np.full(len(df), np.nan)
+    for keys in (["model"], ["model", "year"]):
+        # Model and year bounds override model bounds where the group is large
+        groups = pd.DataFrame(
+            {**{key: df[key].to_numpy() for key in keys}, "Price": prices}
+        ).groupby(keys, sort=True, observed=True)
+        codes = groups.ngroup().to_numpy()
+        sizes = groups.size().to_numpy()[codes]
+        grouped = groups["Price"]
+
+        if method == "iqr":
+            quartiles = grouped.quantile([0.25, 0.75]).unstack()
+            q1 = quartiles[0.25].to_numpy()[codes]
+            q3 = quartiles[0.75].to_numpy()[codes]
+            low = q1 - iqr_factor * (q3 - q1)
+            high = q3 + iqr_factor * (q3 - q1)
+        else:
+            medians = grouped.median().to_numpy()[codes]
+            deviations = pd.Series(np.abs(prices - medians)).groupby(codes).median()
+            spread = mad_threshold * MAD_SCALE * deviations.to_numpy()[codes]
+            low, high = medians - spread, medians + spread
+
+        large = sizes >= min_group_size
+        lower[large] = low[large]
+        upper[large] = high[large]
+
+    return lower, upper
+
+
+def flag_outliers(df, **thresholds):
+    """
+    Flag the rows priced outside the range of their peers, see price_bounds().
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'model', 'year' and 'Price' columns.
+        **thresholds: Keyword arguments of price_bounds().
+
+    Returns:
+        np.ndarray: True for outliers, never for rows without enough peers.
+    """
+    lower, upper = price_bounds(df, **thresholds)
+    prices = df["Price"].to_numpy(dtype=np.float64)
+    outliers = (prices < lower) | (prices > upper)
+    logger.info(f"Flagged {int(outliers.sum())} price outliers in {len(df)} listings")
+    return outliers
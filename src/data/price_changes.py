@@ -0,0 +1,88 @@
+"""Vectorized price comparisons on sorted integer listing keys."""
+from collections import namedtuple
+
+import numpy as np
+
+
+# Listings of the current snapshot whose price changed, and the listings which
+# appeared in or disappeared from it, each as parallel arrays
+PriceComparison = namedtuple(
+    "PriceComparison",
+    [
+        "changed_keys",
+        "previous_prices",
+        "prices",
+        "new_keys",
+        "new_prices",
+        "removed_keys",
+        "removed_prices",
+    ],
+)
+
+
+def sorted_key_index(keys):
+    """
+    Sort listing keys, keeping the first row of each duplicated key.
+
+    Args:
+        keys (np.ndarray): Integer listing keys, one per row.
+
+    Returns:
+        tuple: The sorted unique keys, and the row of each of them.
+    """
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    first = np.ones(len(sorted_keys), dtype=np.bool_)
+    first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    return sorted_keys[first], order[first]
+
+
+def lookup(sorted_keys, keys):
+    """
+    Find keys in a sorted key array with a binary search.
+
+    Args:
+        sorted_keys (np.ndarray): Sorted unique keys.
+        keys (np.ndarray): Keys to look up.
+
+    Returns:
+        np.ndarray: The position of each key in sorted_keys, -1 if absent.
+    """
+    if len(sorted_keys) == 0:
+        return np.full(len(keys), -1, dtype=np.intp)
+    positions = np.searchsorted(sorted_keys, keys)
+    clipped = np.minimum(positions, len(sorted_keys) - 1)
+    return np.where(sorted_keys[clipped] == keys, clipped, -1)
+
+
+def compare_prices(previous, current):
+    """
+    Compare the prices of two snapshots.
+
+    Args:
+        previous (tuple): Sorted unique keys and prices of the older snapshot.
+        current (tuple): Sorted unique keys and prices of the newer snapshot.
+
+    Returns:
+        PriceComparison: Changed, new and removed listings, by increasing key.
+    """
+    previous_keys, previous_prices = previous
+    keys, prices = current
+
+    positions = lookup(previous_keys, keys)
+    found = positions >= 0
+    old_prices = previous_prices[positions[found]]
+    changed = old_prices != prices[found]
+
+    still_listed = np.zeros(len(previous_keys), dtype=np.bool_)
+    still_listed[positions[found]] = True
+
+    return PriceComparison(
+        keys[found][changed],
+        old_prices[changed],
+        prices[found][changed],
+        keys[~found],
+        prices[~found],
+        previous_keys[~still_listed],
+        previous_prices[~still_listed],
+    )
@@ -0,0 +1,50 @@
+"""Price-sorted row index answering price range selections with binary searches."""
+import numpy as np
+
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+class SortedPriceIndex:
+    """
+    Rows of a DataFrame sorted once by price.
+
+    A price range is then two binary searches and a slice of the sorted rows,
+    instead of two comparisons over the whole 'Price' column. Selected rows are
+    returned in their original order, so figures built from them do not change.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        prices = df["Price"].to_numpy(dtype=np.float64)
+        self._order = np.argsort(prices, kind="stable")
+        self._prices = prices[self._order]
+
+    def __len__(self):
+        return len(self._order)
+
+    def rows(self, min_price, max_price):
+        """Return the positions of the rows priced within [min_price, max_price]."""
+        start = np.searchsorted(self._prices, min_price, side="left")
+        end = np.searchsorted(self._prices, max_price, side="right")
+        return np.sort(self._order[start:end])
+
+    def select(self, min_price, max_price, excluded=None):
+        """
+        Select the rows priced within [min_price, max_price].
+
+        Args:
+            min_price (float): Lowest price, included.
+            max_price (float): Highest price, included.
+            excluded (np.ndarray): Boolean mask of rows to leave out, by position.
+
+        Returns:
+            pd.DataFrame: The selected rows, in their original order.
+        """
+        rows = self.rows(min_price, max_price)
+        if excluded is not None:
+            rows = rows[~excluded[rows]]
+        return self.df.iloc[rows]
@@ -0,0 +1,141 @@
+"""Price drop detection on each scraped page, while the crawl runs."""
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from src.config import PRICE_EVENTS_FILE
+from src.data import snapshots
+from src.data.deduplication import listing_source
+from src.data.listing_index import (
+    car_content,
+    get_listing_index,
+    listing_id,
+    lookup_listing_keys,
+)
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+class PriceTracker:
+    """
+    Last known price of each (source, Id) listing, checked page by page.
+
+    check() is meant to be given as the on_page callback of the scrapers, which
+    run in parallel threads, so the price map and the files are guarded by a
+    lock. Every drop is logged and appended to the event file as one JSON line
+    as soon as its page is parsed, and kept in memory until the scrape ends, to
+    be recorded in the lifecycle history at once, see price_drops().
+    """
+
+    def __init__(self, prices=None, events_path=PRICE_EVENTS_FILE):
+        self._prices = dict(prices or {})
+        self._drops = []
+        self._lock = threading.Lock()
+        self.events_path = events_path
+        self.drop_count = 0
+
+    @classmethod
+    def from_latest_snapshot(cls, events_path=PRICE_EVENTS_FILE):
+        """Start from the prices of the latest saved snapshot, if any."""
+        snapshot_paths = snapshots.list_snapshots()
+        if not snapshot_paths:
+            logger.info("No snapshot found, tracking prices from scratch")
+            return cls(events_path=events_path)
+
+        df = snapshots.load_snapshot_columns(
+            snapshot_paths[0], [snapshots.LISTING_KEY, "Price"]
+        )
+        index = get_listing_index()
+        pairs = [index.get_pair(key) for key in df[snapshots.LISTING_KEY].tolist()]
+        prices = {
+            pair: price
+            for pair, price in zip(pairs, df["Price"].tolist())
+            if pair is not None
+        }
+        logger.info(f"Tracking the prices of {len(prices)} listings")
+        return cls(prices, events_path)
+
+    def __len__(self):
+        return len(self._prices)
+
+    def check(self, cars):
+        """
+        Record the prices of a page of cars and report the ones that dropped.
+
+        Args:
+            cars (CarBatch): The cars of one scraped page.
+
+        Returns:
+            list: One event dict per price drop.
+        """
+        seen_at = datetime.now()
+        now = seen_at.isoformat(timespec="seconds")
+        events = []
+        with self._lock:
+            for car in cars:
+                if car.price is None:
+                    continue
+                content = car_content(car)
+                pair = (
+                    car.source or listing_source(car.url),
+                    listing_id(car.id, content),
+                )
+                previous_price = self._prices.get(pair)
+                self._prices[pair] = car.price
+                if previous_price is not None and car.price < previous_price:
+                    events.append(
+                        {
+                            "time": now,
+                            "source": pair[0],
+                            "id": pair[1],
+                            "brand_name": car.brand_name,
+                            "model_name": car.model_name,
+                            "url": car.url,
+                            "previous_price": previous_price,
+                            "price": car.price,
+                        }
+                    )
+                    self._drops.append((pair, content, car.price, seen_at))
+
+            if events:
+                self.drop_count += len(events)
+                self._append_events(events)
+
+        for event in events:
+            logger.info(
+                f"Price drop on {event['source']} {event['id']} "
+                f"({event['brand_name']} {event['model_name']}): "
+                f"{event['previous_price']:.0f} -> {event['price']:.0f}"
+            )
+        return events
+
+    def _append_events(self, events):
+        with open(self.events_path, "a", encoding="utf-8") as events_file:
+            for event in events:
+                events_file.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def price_drops(self):
+        """
+        Return the price drops reported so far, for lifecycle.update_lifecycle().
+
+        Returns:
+            tuple: The listing key, new price and time of each drop, in the
+            order they were seen.
+        """
+        with self._lock:
+            drops = list(self._drops)
+        keys = lookup_listing_keys(
+            [pair[0] for pair, _, _, _ in drops],
+            [pair[1] for pair, _, _, _ in drops],
+            [content for _, content, _, _ in drops],
+        )
+        return (
+            np.asarray(keys, dtype=np.int64),
+            np.array([price for _, _, price, _ in drops], dtype=np.float64),
+            np.array([seen_at for _, _, _, seen_at in drops], dtype="datetime64[ns]"),
+        )
@@ -0,0 +1,318 @@
+"""Saved display dataset snapshots and the price changes between them."""
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from src import file_management
+from src.config import CACHE_DIR, RESULTS_DIR
+from src.data import price_changes
+from src.data.dataframes import listing_sources
+from src.data.listing_index import frame_contents, lookup_listing_keys
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+SNAPSHOT_FILE_NAME = "df"
+SNAPSHOT_CACHE_DIR = os.path.join(CACHE_DIR, "snapshots")
+LISTING_KEY = "Listing Key"  # int64 (source, Id) key, see listing_index
+
+
+def _listing_keys(df):
+    # Snapshots saved before listing keys were stored get them from the index,
+    # without assigning keys to pairs it does not know
+    if LISTING_KEY in df.columns:
+        return df[LISTING_KEY].to_numpy(dtype=np.int64)
+    return lookup_listing_keys(listing_sources(df), df["Id"], frame_contents(df))
+
+
+# Columns computed from a snapshot rather than read from it
+DERIVED_COLUMNS = {LISTING_KEY: _listing_keys}
+
+PRICE_EVENTS = ("drop", "rise", "new", "removed")
+
+# Columns compared by diff_snapshots() by default
+DIFF_COLUMNS = ["Price", "Kilometers", "year", "Description"]
+
+# Listings added to, removed from and changed between two snapshots, and the
+# columns which changed for each changed listing
+SnapshotDiff = namedtuple("SnapshotDiff", ["added", "removed", "changed", "changes"])
+
+
+def list_snapshots():
+    """Return the paths of the saved snapshots, latest first."""
+    return file_management.list_generated_file_paths(
+        RESULTS_DIR, SNAPSHOT_FILE_NAME, ".pkl"
+    )
+
+
+def load_snapshot_columns(snapshot_path, columns):
+    """
+    Load some columns of a snapshot, through a per-column cache.
+
+    Each column is cached in its own pickle the first time it is read, so that
+    later reads skip unpickling the whole snapshot. Snapshots are never
+    rewritten, so cached columns never go stale.
+
+    Args:
+        snapshot_path (str): Path of the snapshot pickle.
+        columns (list): Snapshot columns, or DERIVED_COLUMNS names.
+
+    Returns:
+        pd.DataFrame: The requested columns, with the snapshot index.
+    """
+    data = {}
+    missing = []
+    for column in columns:
+        cache_path = _column_cache_path(snapshot_path, column)
+        if os.path.exists(cache_path):
+            data[column] = file_management.load_pickle(cache_path)
+        else:
+            missing.append(column)
+
+    if missing:
+        df = file_management.load_pickle(snapshot_path)
+        for column in missing:
+            if column in DERIVED_COLUMNS:
+                values = pd.Series(
+                    DERIVED_COLUMNS[column](df), index=df.index, name=column
+                )
+                if column == LISTING_KEY and (values < 0).any():
+                    # Pairs missing from the index may get a key later
+                    data[column] = values
+                    continue
+            else:
+                values = df[column]
+            directory, file_name = os.path.split(
+                _column_cache_path(snapshot_path, column)
+            )
+            file_management.save_pickle(
+                values, directory, file_name[: -len(".pkl")], add_date_prefix=False
+            )
+            data[column] = values
+
+    return pd.DataFrame({column: data[column] for column in columns})
+
+
+def snapshot_prices(snapshot_path):
+    """
+    Return the listing keys of a snapshot, sorted, along with their prices.
+
+    Args:
+        snapshot_path (str): Path of the snapshot pickle.
+
+    Returns:
+        tuple: Sorted unique int64 keys and float64 prices.
+    """
+    df = load_snapshot_columns(snapshot_path, [LISTING_KEY, "Price"])
+    keys, rows = price_changes.sorted_key_index(df[LISTING_KEY].to_numpy())
+    return keys, df["Price"].to_numpy(dtype=np.float64)[rows]
+
+
+def detect_price_changes(window=2, snapshot_paths=None, relisted_from=None):
+    """
+    List the price drops and rises, and the new and removed listings, between
+    each pair of consecutive snapshots of a window.
+
+    Only the key and price columns of each snapshot are loaded, and listings are
+    matched with binary searches in sorted key arrays.
+
+    Args:
+        window (int): Number of snapshots, the latest ones being used.
+        snapshot_paths (list): Snapshot paths latest first, defaults to all.
+        relisted_from (callable): Optional function of an older and a newer
+            snapshot path, returning the dict of the listing keys relisted in the
+            newer one to the key of their previous listing. Relisted listings
+            are then compared with their previous listing instead of being
+            reported as removed and new.
+
+    Returns:
+        pd.DataFrame: One row per event, with the 'Snapshot' file name where it
+        was seen, the 'Listing Key', the 'Event', and the 'Previous Price' and
+        'Price' of the listing, respectively missing for new and removed ones.
+    """
+    if snapshot_paths is None:
+        snapshot_paths = list_snapshots()
+    paths = list(reversed(snapshot_paths[:window]))
+    if len(paths) < 2:
+        logger.info("Less than two snapshots, no price change to detect")
+        return _events_frame([])
+
+    frames = []
+    previous = snapshot_prices(paths[0])
+    for older_path, path in zip(paths, paths[1:]):
+        current = snapshot_prices(path)
+        if relisted_from is not None:
+            previous = _relisted(previous, relisted_from(older_path, path))
+        comparison = price_changes.compare_prices(previous, current)
+        frames.append(_comparison_events(os.path.basename(path), comparison))
+        previous = current
+
+    events = _events_frame(frames)
+    logger.info(
+        f"Price changes over {len(paths)} snapshots: "
+        f"{events['Event'].value_counts().to_dict()}"
+    )
+    return events
+
+
+def find_snapshot(timestamp, snapshot_paths=None):
+    """
+    Return the path of the latest snapshot saved at or before a timestamp.
+
+    Args:
+        timestamp (datetime or str): Any value accepted by pd.Timestamp.
+        snapshot_paths (list): Snapshot paths latest first, defaults to all.
+
+    Returns:
+        str: The snapshot path, or None if every snapshot is more recent.
+    """
+    if snapshot_paths is None:
+        snapshot_paths = list_snapshots()
+    timestamp = pd.Timestamp(timestamp)
+    for snapshot_path in snapshot_paths:
+        if file_management.get_file_creation_time(snapshot_path) <= timestamp:
+            return snapshot_path
+    return None
+
+
+def diff_snapshots(old_snapshot_path, new_snapshot_path, columns=None):
+    """
+    List the listings added, removed and changed between two snapshots.
+
+    Only the key and compared columns of each snapshot are loaded, through the
+    column cache, and listings are matched by intersecting their sorted keys.
+
+    Args:
+        old_snapshot_path (str): Path of the older snapshot.
+        new_snapshot_path (str): Path of the newer snapshot.
+        columns (list): Columns to compare, defaults to DIFF_COLUMNS.
+
+    Returns:
+        SnapshotDiff: The 'added' and 'removed' listings with their key and
+        compared columns, the 'changed' listings with their key and each
+        compared column before and after, suffixed ' Before' and ' After', and
+        the 'changes' boolean mask of the changed columns of each of them.
+    """
+    columns = list(DIFF_COLUMNS if columns is None else columns)
+    old = load_snapshot_columns(old_snapshot_path, [LISTING_KEY, *columns])
+    new = load_snapshot_columns(new_snapshot_path, [LISTING_KEY, *columns])
+
+    old_keys, old_rows = price_changes.sorted_key_index(old[LISTING_KEY].to_numpy())
+    new_keys, new_rows = price_changes.sorted_key_index(new[LISTING_KEY].to_numpy())
+    _, old_common, new_common = np.intersect1d(
+        old_keys, new_keys, assume_unique=True, return_indices=True
+    )
+    removed = np.ones(len(old_keys), dtype=np.bool_)
+    removed[old_common] = False
+    added = np.ones(len(new_keys), dtype=np.bool_)
+    added[new_common] = False
+
+    before = old.iloc[old_rows[old_common]].reset_index(drop=True)
+    after = new.iloc[new_rows[new_common]].reset_index(drop=True)
+    changes = pd.DataFrame(
+        {column: _changed(before[column], after[column]) for column in columns}
+    )
+    changed = changes.any(axis=1).to_numpy()
+
+    diff = SnapshotDiff(
+        new.iloc[new_rows[added]].reset_index(drop=True),
+        old.iloc[old_rows[removed]].reset_index(drop=True),
+        pd.concat(
+            [
+                after[[LISTING_KEY]],
+                before[columns].add_suffix(" Before"),
+                after[columns].add_suffix(" After"),
+            ],
+            axis=1,
+        )[changed].reset_index(drop=True),
+        changes[changed].reset_index(drop=True),
+    )
+    logger.info(
+        f"{os.path.basename(old_snapshot_path)} -> "
+        f"{os.path.basename(new_snapshot_path)}: {len(diff.added)} added, "
+        f"{len(diff.removed)} removed, {len(diff.changed)} changed"
+    )
+    return diff
+
+
+def _comparison_events(snapshot_name, comparison):
+    changes = comparison.prices - comparison.previous_prices
+    missing_new = np.full(len(comparison.new_keys), np.nan)
+    missing_removed = np.full(len(comparison.removed_keys), np.nan)
+    events = np.concatenate(
+        [
+            np.where(changes < 0, "drop", "rise"),
+            np.full(len(comparison.new_keys), "new"),
+            np.full(len(comparison.removed_keys), "removed"),
+        ]
+    )
+    return pd.DataFrame(
+        {
+            "Snapshot": snapshot_name,
+            LISTING_KEY: np.concatenate(
+                [comparison.changed_keys, comparison.new_keys, comparison.removed_keys]
+            ),
+            "Event": pd.Categorical(events, categories=PRICE_EVENTS),
+            "Previous Price": np.concatenate(
+                [comparison.previous_prices, missing_new, comparison.removed_prices]
+            ),
+            "Price": np.concatenate(
+                [comparison.prices, comparison.new_prices, missing_removed]
+            ),
+        }
+    )
+
+
+def _relisted(prices, relisted_from):
+    # Give the previous listing of each relisted listing its new key
+    if not relisted_from:
+        return prices
+    keys, values = prices
+    new_keys = np.fromiter(relisted_from.keys(), np.int64, len(relisted_from))
+    previous_keys = np.fromiter(relisted_from.values(), np.int64, len(relisted_from))
+    positions = price_changes.lookup(keys, previous_keys)
+    found = positions >= 0
+    keys = keys.copy()
+    keys[positions[found]] = new_keys[found]
+    keys, rows = price_changes.sorted_key_index(keys)
+    return keys, values[rows]
+
+
+def _events_frame(frames):
+    if frames:
+        return pd.concat(frames, ignore_index=True)
+    return pd.DataFrame(
+        {
+            "Snapshot": pd.Series(dtype=object),
+            LISTING_KEY: pd.Series(dtype=np.int64),
+            "Event": pd.Categorical([], categories=PRICE_EVENTS),
+            "Previous Price": pd.Series(dtype=np.float64),
+            "Price": pd.Series(dtype=np.float64),
+        }
+    )
+
+
+def _changed(before, after):
+    # Missing on both sides is unchanged, missing on one side is a change
+    if isinstance(before.dtype, pd.CategoricalDtype):
+        before = before.astype(before.cat.categories.dtype)
+    if isinstance(after.dtype, pd.CategoricalDtype):
+        after = after.astype(after.cat.categories.dtype)
+    before_missing = before.isna().to_numpy()
+    after_missing = after.isna().to_numpy()
+    different = before.ne(after).fillna(False).to_numpy(dtype=np.bool_)
+    return (different | (before_missing != after_missing)) & ~(
+        before_missing & after_missing
+    )
+
+
+def _column_cache_path(snapshot_path, column):
+    snapshot_name = os.path.splitext(os.path.basename(snapshot_path))[0]
+    return os.path.join(
+        SNAPSHOT_CACHE_DIR, f"{snapshot_name}.{column.replace(' ', '_')}.pkl"
+    )
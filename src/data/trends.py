@@ -0,0 +1,153 @@
+"""Weekly price trends per model over all the saved snapshots."""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src import file_management
+from src.data import snapshots
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+TREND_FILE_SUFFIX = "_trend.pkl"
+
+# Edges of the log-spaced price bins, each about 3% wide, of the partial
+# aggregates. Medians are interpolated within a bin, so they are approximate.
+PRICE_BIN_EDGES = np.geomspace(100, 1_000_000, 301)
+BIN_COUNT = len(PRICE_BIN_EDGES) - 1
+
+
+def partial_aggregate(snapshot_path):
+    """
+    Load the price histogram of each model of a snapshot, computing and storing
+    it next to the snapshot first if it does not exist yet.
+
+    Only the 'model' and 'Price' columns of the snapshot are read, through the
+    snapshot column cache. Histograms of several snapshots can be summed, which
+    medians cannot.
+
+    Args:
+        snapshot_path (str): Path of the snapshot pickle.
+
+    Returns:
+        pd.DataFrame: One row per non-empty (model, price bin), with the 'Count'
+        and the 'Price Sum' of the listings in the bin.
+    """
+    trend_path = f"{os.path.splitext(snapshot_path)[0]}{TREND_FILE_SUFFIX}"
+    if os.path.exists(trend_path):
+        return file_management.load_pickle(trend_path)
+
+    df = snapshots.load_snapshot_columns(snapshot_path, ["model", "Price"])
+    prices = df["Price"].to_numpy(dtype=np.float64)
+    known = ~np.isnan(prices)
+    codes, models = pd.factorize(df["model"].astype(str).to_numpy()[known])
+    bins = np.clip(
+        np.searchsorted(PRICE_BIN_EDGES, prices[known], side="right") - 1,
+        0,
+        BIN_COUNT - 1,
+    )
+    cells = codes * BIN_COUNT + bins
+    size = len(models) * BIN_COUNT
+    counts = np.bincount(cells, minlength=size)
+    sums = np.bincount(cells, weights=prices[known], minlength=size)
+    filled = np.flatnonzero(counts)
+
+    partial = pd.DataFrame(
+        {
+            "model": np.asarray(models, dtype=object)[filled // BIN_COUNT],
+            "Bin": (filled % BIN_COUNT).astype(np.int16),
+            "Count": counts[filled].astype(np.int32),
+            "Price Sum": sums[filled],
+        }
+    )
+    directory, file_name = os.path.split(trend_path)
+    file_management.save_pickle(
+        partial, directory, file_name[: -len(".pkl")], add_date_prefix=False
+    )
+    return partial
+
+
+def weekly_trends(weeks=52, snapshot_paths=None):
+    """
+    Compute the weekly listing count, median and mean price of each model.
+
+    Snapshots are processed one at a time, and only the ones without a stored
+    partial aggregate are read, so each scrape adds one snapshot to process.
+
+    Args:
+        weeks (int): Number of weeks, up to the week of the latest snapshot.
+        snapshot_paths (list): Snapshot paths latest first, defaults to all.
+
+    Returns:
+        pd.DataFrame: One row per week and model, with the Monday of the 'Week',
+        the 'model', the 'Count' of listings over the snapshots of the week,
+        and their 'Median Price' and 'Mean Price'.
+    """
+    if snapshot_paths is None:
+        snapshot_paths = snapshots.list_snapshots()
+    if not snapshot_paths:
+        return pd.DataFrame(
+            columns=["Week", "model", "Count", "Median Price", "Mean Price"]
+        )
+
+    def week_of(snapshot_path):
+        return (
+            pd.Timestamp(file_management.get_file_creation_time(snapshot_path))
+            .to_period("W")
+            .start_time
+        )
+
+    first_week = week_of(snapshot_paths[0]) - pd.Timedelta(weeks=weeks - 1)
+    start = time.perf_counter()
+    partials = []
+    for snapshot_path in snapshot_paths:
+        week = week_of(snapshot_path)
+        if week < first_week:
+            break
+        partials.append(partial_aggregate(snapshot_path).assign(Week=week))
+
+    histograms = (
+        pd.concat(partials, ignore_index=True)
+        .groupby(["Week", "model", "Bin"], sort=True)[["Count", "Price Sum"]]
+        .sum()
+        .reset_index()
+    )
+    trends = _trends_from_histograms(histograms)
+    logger.info(
+        f"Weekly trends of {trends['model'].nunique()} models over "
+        f"{len(partials)} snapshots computed in {time.perf_counter() - start:.3f}s"
+    )
+    return trends
+
+
+def _trends_from_histograms(histograms):
+    # Histograms are sorted by week, model and bin
+    groups = histograms.groupby(["Week", "model"], sort=False)
+    counts = histograms["Count"].to_numpy(dtype=np.float64)
+    cumulative = groups["Count"].cumsum().to_numpy(dtype=np.float64)
+    totals = groups["Count"].transform("sum").to_numpy(dtype=np.float64)
+
+    # The median is in the first bin reaching half of the count of its group,
+    # interpolated geometrically between the bin edges
+    half = totals / 2
+    median_rows = np.flatnonzero((cumulative >= half) & (cumulative - counts < half))
+    bins = histograms["Bin"].to_numpy()[median_rows]
+    fraction = (half - (cumulative - counts))[median_rows] / counts[median_rows]
+    lower = PRICE_BIN_EDGES[bins]
+    medians = lower * (PRICE_BIN_EDGES[bins + 1] / lower) ** fraction
+
+    summary = groups[["Count", "Price Sum"]].sum()
+    return pd.DataFrame(
+        {
+            "Week": summary.index.get_level_values("Week"),
+            "model": summary.index.get_level_values("model"),
+            "Count": summary["Count"].to_numpy(dtype=np.int64),
+            "Median Price": medians,
+            "Mean Price": (summary["Price Sum"] / summary["Count"]).to_numpy(),
+        }
+    )
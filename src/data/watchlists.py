@@ -0,0 +1,314 @@
+"""Saved searches matched against the new and repriced listings of each scrape."""
+import re
+import time
+from collections import defaultdict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from src import file_management
+from src.config import WATCHLIST_RESULTS, WATCHLISTS_FILE
+from src.data import deduplication, price_changes, snapshots
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+# A saved search. Missing bounds and a missing brand or model match anything.
+Watchlist = namedtuple(
+    "Watchlist",
+    [
+        "name",
+        "brand",
+        "model",
+        "min_price",
+        "max_price",
+        "min_year",
+        "max_year",
+        "min_km",
+        "max_km",
+    ],
+    defaults=(None,) * 8,
+)
+
+# Watchlist names, used as the file names of their matches
+WATCHLIST_NAME_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]*")
+
+# Columns written for each match
+MATCH_COLUMNS = [
+    "Id",
+    "Brand Name",
+    "Model Name",
+    "year",
+    "Kilometers",
+    "Price",
+    "URL",
+]
+
+# Maximum number of (listing, candidate watchlist) pairs checked at once
+_BLOCK_SIZE = 1 << 20
+
+_BOUNDS = ["min_price", "max_price", "min_year", "max_year", "min_km", "max_km"]
+
+
+def load_watchlists(path=WATCHLISTS_FILE):
+    """
+    Load the saved searches of a JSON file, a list of Watchlist fields objects.
+
+    Returns:
+        list: The Watchlist objects, brands and models in upper case.
+    """
+    watchlists = []
+    for fields in file_management.load_json(path) or []:
+        watchlist = Watchlist(**fields)
+        watchlists.append(
+            watchlist._replace(
+                brand=watchlist.brand.upper() if watchlist.brand else None,
+                model=watchlist.model.upper() if watchlist.model else None,
+            )
+        )
+    return watchlists
+
+
+class WatchlistIndex:
+    """
+    Watchlist criteria bucketed by (brand, model).
+
+    None stands for any brand or model, so a listing is only compared to the
+    four buckets it can belong to. Within a bucket, each of the six bounds is
+    kept as a sorted array of endpoints, ascending for the minimums and
+    descending for the maximums, so that the watchlists a value satisfies are a
+    prefix of each one, found by binary search. A listing is only compared to
+    the watchlists of its shortest prefix, which are kept if they are within
+    the other five prefixes as well, by comparing their rank in each sorted
+    array. Matching a listing thus costs six binary searches and the size of
+    its most selective prefix, instead of a scan of its buckets.
+
+    Raises:
+        ValueError: If a watchlist name is not a WATCHLIST_NAME_PATTERN file
+            name, or is used by several watchlists.
+    """
+
+    def __init__(self, watchlists):
+        self.watchlists = list(watchlists)
+        _check_names(self.watchlists)
+        positions = defaultdict(list)
+        for position, watchlist in enumerate(self.watchlists):
+            positions[(watchlist.brand, watchlist.model)].append(position)
+
+        self._buckets = {}
+        for key, bucket_positions in positions.items():
+            # Minimums, and negated maximums, sorted so that the watchlists a
+            # value satisfies come first
+            endpoints = np.array(
+                [
+                    [
+                        _endpoint(getattr(self.watchlists[position], name), name)
+                        for position in bucket_positions
+                    ]
+                    for name in _BOUNDS
+                ]
+            )
+            orders = np.argsort(endpoints, axis=1, kind="stable")
+            # Smallest integers, which numpy sorts in linear time up to 16 bits
+            orders = orders.astype(np.min_scalar_type(len(bucket_positions)))
+            ranks = np.empty_like(orders)
+            np.put_along_axis(
+                ranks,
+                orders,
+                np.arange(len(bucket_positions), dtype=orders.dtype)[None, :],
+                axis=1,
+            )
+            self._buckets[key] = {
+                "endpoints": np.take_along_axis(endpoints, orders, axis=1),
+                "orders": orders,
+                "ranks": ranks,
+                "position": np.array(bucket_positions),
+            }
+
+    def __len__(self):
+        return len(self.watchlists)
+
+    def match(self, df):
+        """
+        Match listings against every watchlist.
+
+        Args:
+            df (pd.DataFrame): Listings with 'Brand Name', 'Model Name', 'Price',
+                'year' and 'Kilometers' columns, a 'year' of 0 being unknown.
+
+        Returns:
+            dict: The sorted rows of df matched by each watchlist, by name.
+        """
+        brands = df["Brand Name"].astype(str).str.upper().to_numpy(dtype=object)
+        models = df["Model Name"].astype(str).str.upper().to_numpy(dtype=object)
+        prices = df["Price"].to_numpy(dtype=np.float64, na_value=np.nan)
+        years = df["year"].to_numpy(dtype=np.float64, na_value=np.nan)
+        years[years == 0] = np.nan
+        kilometers = df["Kilometers"].to_numpy(dtype=np.float64, na_value=np.nan)
+        # Values compared with the endpoints of each bound, unknown values only
+        # satisfying the missing ones
+        queries = np.stack([prices, -prices, years, -years, kilometers, -kilometers])
+        queries[np.isnan(queries)] = -np.inf
+
+        groups = pd.DataFrame({"brand": brands, "model": models})
+        listing_groups = {
+            (None, None): np.arange(len(df)),
+            **{
+                (brand, None): rows
+                for brand, rows in groups.groupby("brand").indices.items()
+            },
+            **{
+                (None, model): rows
+                for model, rows in groups.groupby("model").indices.items()
+            },
+            **groups.groupby(["brand", "model"]).indices,
+        }
+
+        matches = defaultdict(list)
+        for key, bucket in self._buckets.items():
+            rows = listing_groups.get(key)
+            if rows is not None and len(rows) > 0:
+                _match_bucket(bucket, rows, queries[:, rows], matches)
+
+        return {
+            self.watchlists[position].name: np.sort(np.concatenate(position_rows))
+            for position, position_rows in matches.items()
+        }
+
+
+def evaluate_watchlists(df, previous_snapshot_path=None, watchlists=None):
+    """
+    Match the new and repriced listings of a scrape against the watchlists and
+    save the matches of each watchlist.
+
+    A car listed on several web sites is matched once, on its canonical row as
+    collapsed by deduplication.collapse_duplicates(), when any of its listings
+    is new or repriced.
+
+    Args:
+        df (pd.DataFrame): The display dataset of the scrape.
+        previous_snapshot_path (str): Snapshot to compare prices with, every
+            listing being new if None.
+        watchlists (list): Watchlist objects, defaults to the WATCHLISTS_FILE ones.
+
+    Returns:
+        dict: The matched rows of df, by watchlist name.
+
+    Raises:
+        ValueError: If a watchlist name is invalid or duplicated, see
+            WatchlistIndex.
+    """
+    if watchlists is None:
+        watchlists = load_watchlists()
+    if not watchlists or df.empty:
+        return {}
+
+    changed = np.ones(len(df), dtype=np.bool_)
+    if previous_snapshot_path is not None:
+        previous_keys, previous_prices = snapshots.snapshot_prices(
+            previous_snapshot_path
+        )
+        positions = price_changes.lookup(
+            previous_keys, df[snapshots.LISTING_KEY].to_numpy(dtype=np.int64)
+        )
+        found = positions >= 0
+        changed = ~found
+        changed[found] = (
+            previous_prices[positions[found]]
+            != df["Price"].to_numpy(dtype=np.float64)[found]
+        )
+
+    if "Canonical Key" in df.columns:
+        canonical_keys = df["Canonical Key"].to_numpy(dtype=np.int64)
+        canonical = df[snapshots.LISTING_KEY].to_numpy(dtype=np.int64) == canonical_keys
+        repriced = np.isin(canonical_keys[canonical], canonical_keys[changed])
+        rows = np.flatnonzero(canonical)[repriced]
+        candidates = deduplication.collapse_duplicates(df)[repriced]
+    else:
+        rows = np.flatnonzero(changed)
+        candidates = df.iloc[rows]
+
+    start = time.perf_counter()
+    candidate_matches = WatchlistIndex(watchlists).match(candidates)
+    logger.info(
+        f"{len(candidates)} new or repriced listings matched against "
+        f"{len(watchlists)} watchlists in {time.perf_counter() - start:.3f}s"
+    )
+
+    for name, matched_rows in candidate_matches.items():
+        records = candidates.iloc[matched_rows][MATCH_COLUMNS].astype(object)
+        records = records.where(records.notna(), None).to_dict("records")
+        file_path = file_management.save_json(records, WATCHLIST_RESULTS, name)
+        logger.info(f"Watchlist {name}: {len(records)} matches saved to {file_path}")
+    return {
+        name: rows[matched_rows] for name, matched_rows in candidate_matches.items()
+    }
+
+
+def _check_names(watchlists):
+    names = set()
+    for name in (watchlist.name for watchlist in watchlists):
+        if not isinstance(name, str) or not WATCHLIST_NAME_PATTERN.fullmatch(name):
+            raise ValueError(
+                f"Invalid watchlist name {name!r}: use letters, digits, '_' and '-'"
+            )
+        if name in names:
+            raise ValueError(f"Duplicate watchlist name {name!r}")
+        names.add(name)
+
+
+def _endpoint(value, name):
+    if value is None:
+        return -np.inf
+    return float(value) if name.startswith("min") else -float(value)
+
+
+def _match_bucket(bucket, rows, queries, matches):
+    # Length of the prefix of watchlists each listing satisfies, for each bound
+    counts = np.stack(
+        [
+            np.searchsorted(endpoints, values, side="right")
+            for endpoints, values in zip(bucket["endpoints"], queries)
+        ]
+    )
+    shortest = counts.argmin(axis=0)
+    sizes = counts[shortest, np.arange(len(rows))]
+
+    # Blocks of listings with at most _BLOCK_SIZE candidates, or a single listing
+    totals = np.cumsum(sizes)
+    start = 0
+    while start < len(rows):
+        end = max(
+            start + 1,
+            int(
+                np.searchsorted(
+                    totals, totals[start] - sizes[start] + _BLOCK_SIZE, side="right"
+                )
+            ),
+        )
+        block_sizes = sizes[start:end]
+        listings = np.repeat(np.arange(start, end), block_sizes)
+        offsets = np.arange(len(listings)) - np.repeat(
+            np.cumsum(block_sizes) - block_sizes, block_sizes
+        )
+        candidates = bucket["orders"][shortest[listings], offsets]
+        # Candidates within the prefix of every other bound
+        for ranks, bound_counts in zip(bucket["ranks"], counts):
+            kept = ranks[candidates] < bound_counts[listings]
+            candidates, listings = candidates[kept], listings[kept]
+        _add_matches(bucket, rows, listings, candidates, matches)
+        start = end
+
+
+def _add_matches(bucket, rows, listings, candidates, matches):
+    order = np.argsort(candidates, kind="stable")
+    candidates, listings = candidates[order], listings[order]
+    starts = np.flatnonzero(np.diff(candidates)) + 1
+    for bucket_row, matched in zip(
+        candidates[np.r_[0, starts]] if len(candidates) else [],
+        np.split(listings, starts),
+    ):
+        matches[bucket["position"][bucket_row]].append(rows[matched])
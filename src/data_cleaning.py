@@ -1,125 +1,201 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+
 import src.data.electric_car_models
+from src.config import CACHE_DIR, CLEANING_RULES_FILE
 from src.logging_config import setup_logging
 
 # Set up logging
 logger = setup_logging(__name__)
 
 
-forbidden_list = [
-    "ESSENCE",
-    "BENZINE",
-    "DIESEL",
-    "PETROL",
-    "CNG",
-    "HYBRID",
-    "HYBRIDE",
-    "CYLINDRE",
-    "CYLINDREE",
-    "CC",
-    "CM2",
-    "0.9",
-    "1.0",
-    "1.1",
-    "1.2",
-    "1.3",
-    "1.4",
-    "1.5",
-    "1.6",
-    "1.7",
-    "1.8",
-    "1.9",
-    "2.0",
-    "2.1",
-    "2.2",
-    "2.3" "TCE",
-    "TFSI",
-    "CRDI",
-    "TDI",
-    "TDCI",
-    "VTVT",
-    "SHVS",
-    "D4D",
-    "DTEC",
-    "MULTIJET",
-    "DCI",
-    "7G-DCT",
-    "TSI",
-    "CDI",
-    "VTECH",
-    "GTI",
-    "HDI",
-    "118I",
-    "318I",
-    "420D",
-    "428I",
-    "520D",
-    "530XD",
-    "730D",
-    "FIAT 695",
-    "S TRONIC",
-    "FOCUS",
-    "180 D",
-    "C 220",
-    "TEKNA",
-    "GOLF 1",
-    "SCENIC",
-    "MEGANE",
-    "488 GTB",
-    "S2000",
-    "216D",
-    "316",
-    "430I",
-    "525D",
-    "M125I",
-    "320CI",
-    "330E",
-    "435I",
-    "530E",
-    "520 M",
-    "DOKKER",
-    "220D",
-    "M135I",
-    "GTD",
-    "TWINGO PHASE",
-    "SOUPAPE",
-    "BIELLE",
-    "CULASSE",
-    "TOY",
-    "BRADSHAW",
-    "LINDE",
-]
+COMPILED_RULES_FILE = os.path.join(CACHE_DIR, "cleaning_rules.pkl")
+COMPILED_RULES_VERSION = 1  # Bump when CleaningRules changes to discard old caches
 
 
-def clean_car_list(cars):
-    # Clean
-    cars = [
-        car
-        for car in cars
-        if not any(
-            forbidden_term in car.description.upper()
-            for forbidden_term in src.data_cleaning.forbidden_list
+class CleaningRules:
+    """Cleaning rules compiled into single-pass matchers."""
+
+    def __init__(self, rules):
+        self.forbidden_terms = sorted(
+            {term.upper() for term in rules.get("forbidden_terms", [])},
+            key=len,
+            reverse=True,
         )
-    ]
-    filtered_cars = []
-    for car in cars:
-        description = (
-            f"{car.brand_name} {car.model_name} {car.description} {car.version}"
+        # Forbidden terms keep their historical substring semantics
+        self.forbidden_pattern = _compile_alternation(self.forbidden_terms)
+
+        self.aliases = {
+            alias.upper(): target.upper()
+            for section in ("make_aliases", "model_aliases")
+            for alias, target in rules.get(section, {}).items()
+        }
+        # Aliases only match whole words, e.g. 'VW' but not 'VWX'
+        self.alias_pattern = _compile_alternation(
+            sorted(self.aliases, key=len, reverse=True),
+            prefix=r"(?<![A-Z0-9])",
+            suffix=r"(?![A-Z0-9])",
         )
-        make, model = src.data.electric_car_models.find_make_and_model(description)
 
-        if make is None or model is None:
-            logger.debug(f"Could not find make and model for {description}")
-            continue
+        year_fixes = rules.get("year_fixes", {})
+        self.null_years = {int(value) for value in year_fixes.get("null_values", [])}
+        self.min_year = year_fixes.get("min_year", 2000)
+        self.below_min_offset = year_fixes.get("below_min_offset", 100)
+
+    def is_forbidden(self, text):
+        """Check whether the text contains any forbidden term."""
+        if self.forbidden_pattern is None or not text:
+            return False
+        return self.forbidden_pattern.search(text.upper()) is not None
+
+    def apply_aliases(self, text):
+        """Replace make and model aliases by their reference name."""
+        text = text.upper()
+        if self.alias_pattern is None:
+            return text
+        return self.alias_pattern.sub(lambda match: self.aliases[match.group()], text)
+
+    def fix_year(self, year):
+        """Return the registration year with the configured fixes applied."""
+        if year is None or year in self.null_years:
+            return None
+        if year < self.min_year:
+            return year + self.below_min_offset
+        return year
+
+
+_rules = None
+_rules_mtime = None
+
+
+def get_rules():
+    """
+    Return the compiled cleaning rules, reloading them when the rules file changed.
+
+    The compiled rules are cached on disk along with the digest of the rules file
+    they were built from, so they are only rebuilt when the file content changes.
+
+    Returns:
+        CleaningRules: The compiled rules.
+    """
+    global _rules, _rules_mtime
+
+    mtime = os.path.getmtime(CLEANING_RULES_FILE)
+    if _rules is not None and mtime == _rules_mtime:
+        return _rules
+
+    with open(CLEANING_RULES_FILE, "rb") as rules_file:
+        content = rules_file.read()
+    digest = hashlib.sha256(content + str(COMPILED_RULES_VERSION).encode()).hexdigest()
+
+    rules = _load_compiled_rules(digest)
+    if rules is None:
+        logger.info(f"Compiling cleaning rules from {CLEANING_RULES_FILE}")
+        rules = CleaningRules(json.loads(content.decode("utf-8")))
+        _save_compiled_rules(digest, rules)
+
+    _rules, _rules_mtime = rules, mtime
+    return _rules
 
-        car.brand_name = make
-        car.model_name = model
 
-        if (
-            car.first_registration_year not in [None, "0"]
-            and int(car.first_registration_year) < 2000
-        ):
-            car.first_registration_year = int(car.first_registration_year) + 100
+def clean_car(car, rules=None, makes=None):
+    """
+    Apply every cleaning rule to a car in a single pass.
 
-        filtered_cars.extend([car])
+    Args:
+        car (ElectricCar): The car to clean, updated in place.
+        rules (CleaningRules): The rules to apply, defaults to get_rules().
+        makes (set): If given, also discard the cars of any other make, before
+            trying the fuzzy matcher on cars whose make is not found exactly,
+            or whose model is only a weak exact match.
 
+    Returns:
+        bool: False if the car must be discarded.
+    """
+    rules = rules or get_rules()
+
+    if rules.is_forbidden(car.description):
+        return False
+
+    description = rules.apply_aliases(
+        f"{car.brand_name} {car.model_name} {car.description} {car.version}"
+    )
+    make, model = src.data.electric_car_models.find_make_and_model(description)
+    if makes is not None and model is not None and make not in makes:
+        return False
+    if make is None:
+        # An exactly matched make with an unknown model is most likely a
+        # combustion model of that make, so only misspelled makes are guessed
+        make, model = src.data.electric_car_models.find_make_and_model_fuzzy(
+            description
+        )
+    elif model is not None and src.data.electric_car_models.is_weak_model_match(
+        model, description
+    ):
+        # A single character or a part of another word, such as the S of TESLA,
+        # gives way to a misspelled model name of the same make
+        model = (
+            src.data.electric_car_models.find_model_fuzzy(make, description) or model
+        )
+
+    if make is None or model is None:
+        logger.debug(f"Could not find make and model for {description}")
+        return False
+    if makes is not None and make not in makes:
+        return False
+
+    car.brand_name = make
+    car.model_name = model
+    car.first_registration_year = rules.fix_year(car.first_registration_year)
+    return True
+
+
+def clean_car_list(cars):
+    """Clean and validate car data."""
+    logger.info(f"Starting cleaning of {len(cars)} cars")
+    rules = get_rules()
+
+    filtered_cars = []
+    for car in cars:
+        try:
+            if clean_car(car, rules):
+                filtered_cars.append(car)
+        except Exception as e:
+            logger.error(f"Error cleaning car data: {e!s}", exc_info=True)
+            continue
+
+    logger.info(f"Cleaning completed. {len(filtered_cars)} cars remaining")
     return filtered_cars
+
+
+def _compile_alternation(terms, prefix="", suffix=""):
+    if not terms:
+        return None
+    alternation = "|".join(re.escape(term) for term in terms)
+    return re.compile(f"{prefix}(?:{alternation}){suffix}")
+
+
+def _load_compiled_rules(digest):
+    if not os.path.exists(COMPILED_RULES_FILE):
+        return None
+    try:
+        with open(COMPILED_RULES_FILE, "rb") as f:
+            # Compiled patterns do not fit JSON. The cache is only ever written
+            # by _save_compiled_rules(), next to the snapshots it trusts alike
+            cached = pickle.load(f)  # noqa: S301
+        if cached["digest"] == digest:
+            return cached["rules"]
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable compiled cleaning rules: {e!s}")
+    return None
+
+
+def _save_compiled_rules(digest, rules):
+    try:
+        with open(COMPILED_RULES_FILE, "wb") as f:
+            pickle.dump({"digest": digest, "rules": rules}, f)
+    except OSError as e:
+        logger.warning(f"Could not cache compiled cleaning rules: {e!s}")
@@ -3,8 +3,20 @@ import concurrent.futures
 import pandas
 
 from src import data_cleaning, file_management
-from src.config import RESULTS_DIR
-from src.data import electric_car_models, dataframes
+from src.config import PRICE_DROP_WINDOW, RESULTS_DIR
+from src.data import (
+    backends,
+    dataframes,
+    deduplication,
+    fair_price,
+    lifecycle,
+    listing_index,
+    market_cube,
+    near_duplicates,
+    outliers,
+    snapshots,
+)
+from src.data.car_batch import CarBatch
 from src.logging_config import setup_logging
 from src.sites.autoscout24 import autoscout24
 from src.sites.deuxieme_main import deuxieme_main
@@ -14,36 +26,44 @@ from src.visualization import get_registration_year
 # Set up logging
 logger = setup_logging(__name__)
 
-file_name = "df"
+file_name = snapshots.SNAPSHOT_FILE_NAME
 
+# Snapshot columns read to link relisted listings, see near_duplicates
+RELIST_COLUMNS = [snapshots.LISTING_KEY, "model", "Price", "Kilometers", "Description"]
 
-def get_cars(source="web"):
+
+def get_cars(source="web", on_page=None):
     """
     Get cars from all sources, either from web or file.
     If source is 'web', scrapes all sources in parallel.
 
     Args:
         source (str): Either 'web' or 'file'
+        on_page (callable): Called with the CarBatch of each scraped page, from
+            the scraping threads. Only used when scraping the web.
 
     Returns:
-        list: Combined list of ElectricCar objects from all sources
+        CarBatch: Combined cars from all sources
     """
     if source == "web":
-        return _get_cars_parallel()
+        return _get_cars_parallel(on_page)
     elif source == "file":
         return _get_cars_from_files()
     else:
         raise ValueError("Invalid data source. Choose 'web' or 'file'.")
 
 
-def _get_cars_parallel():
+def _get_cars_parallel(on_page=None):
     """
     Scrape cars from all sources in parallel using ThreadPoolExecutor.
 
+    Args:
+        on_page (callable): Called with the CarBatch of each scraped page.
+
     Returns:
-        list: Combined list of ElectricCar objects from all sources
+        CarBatch: Combined cars from all sources
     """
-    all_cars = []
+    all_cars = CarBatch()
     scraping_functions = [
         ("Gocar", gocar.get_cars_from_web_site),
         ("AutoScout24", autoscout24.get_cars_from_web_site),
@@ -56,7 +76,7 @@ def _get_cars_parallel():
     with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
         # Submit all scraping tasks
         future_to_source = {
-            executor.submit(func): name for name, func in scraping_functions
+            executor.submit(func, on_page): name for name, func in scraping_functions
         }
 
         # Process results as they complete
@@ -78,9 +98,9 @@ def _get_cars_from_files():
     Load cars from the most recent files for all sources.
 
     Returns:
-        list: Combined list of ElectricCar objects from all sources
+        CarBatch: Combined cars from all sources
     """
-    cars = []
+    cars = CarBatch()
     try:
         logger.info("Loading cars from Gocar")
         cars.extend(gocar.get_cars_from_last_file())
@@ -131,53 +151,28 @@ def split_description(description):
 
 def clean_car_list(cars):
     """Clean and validate car data."""
-    logger.info(f"Starting cleaning of {len(cars)} cars")
-
-    # Remove cars with forbidden terms
-    cars = [
-        car
-        for car in cars
-        if not any(
-            forbidden_term in car.description.upper()
-            for forbidden_term in data_cleaning.forbidden_list
-        )
-    ]
-
-    logger.info(f"{len(cars)} cars remaining after forbidden term filtering")
-
-    filtered_cars = []
-    for car in cars:
-        try:
-            description = (
-                f"{car.brand_name} {car.model_name} {car.description} {car.version}"
-            )
-            make, model = electric_car_models.find_make_and_model(description)
-
-            if make is None or model is None:
-                continue
-
-            car.brand_name = make
-            car.model_name = model
-
-            if (
-                car.first_registration_year is not None
-                and car.first_registration_year != "0"
-                and int(car.first_registration_year) < 2000
-            ):
-                car.first_registration_year = int(car.first_registration_year) + 100
+    return data_cleaning.clean_car_list(cars)
 
-            filtered_cars.append(car)
 
-        except Exception as e:
-            logger.error(f"Error cleaning car data: {e!s}", exc_info=True)
-            continue
+def prepare_dataset_for_display(cars, columns=None, update_index=True):
+    """
+    Prepare car data for visualization.
 
-    logger.info(f"Cleaning completed. {len(filtered_cars)} cars remaining")
-    return filtered_cars
+    Stages whose columns are not selected are skipped.
 
+    Args:
+        cars (list): Cleaned cars.
+        columns (list): Columns to keep, including 'model' and 'year' if needed.
+            Defaults to every column.
+        update_index (bool): The cars were just scraped. The listing keys of
+            new listings are saved to the listing index, and the lifecycle
+            columns count the cars as the next snapshot. Otherwise new listings
+            get unstored keys, see listing_index.lookup_listing_keys().
 
-def prepare_dataset_for_display(cars):
-    """Prepare car data for visualization."""
+    Returns:
+        pd.DataFrame: One row per unique listing, sorted by year and model, the
+        listings of a car on several web sites sharing their 'Canonical Key'.
+    """
     logger.info("Preparing dataset for display")
 
     try:
@@ -185,16 +180,79 @@ def prepare_dataset_for_display(cars):
             f"{car.brand_name.upper()} {car.model_name.upper()}".strip() for car in cars
         ]
         registration_years = [get_registration_year(car) for car in cars]
+        added_columns = {"model": model_names, "year": registration_years}
+
+        if _selected(
+            columns, "Listing Key", "Canonical Key", *lifecycle.LIFECYCLE_COLUMNS
+        ):
+            get_keys = (
+                listing_index.assign_listing_keys
+                if update_index
+                else listing_index.lookup_listing_keys
+            )
+            listing_keys = get_keys(
+                [car.source or deduplication.listing_source(car.url) for car in cars],
+                [car.id for car in cars],
+                [listing_index.car_content(car) for car in cars],
+            )
+            added_columns["Listing Key"] = listing_keys
+        if _selected(columns, "Canonical Key"):
+            # Every listing is kept, cross-source duplicates only being collapsed
+            # for display, so that each listing has its own history
+            added_columns["Canonical Key"] = deduplication.find_cross_source_duplicates(
+                cars, listing_keys
+            )
+        if _selected(columns, *lifecycle.LIFECYCLE_COLUMNS):
+            # A new scrape is counted as the next snapshot of the lifecycle
+            added_columns.update(
+                lifecycle.lifecycle_columns(
+                    listing_keys,
+                    [car.price for car in cars] if update_index else None,
+                )
+            )
+        if _selected(columns, "fair_price", "deal_score"):
+            added_columns["fair_price"], added_columns["deal_score"] = (
+                fair_price.score_listings(
+                    model_names,
+                    registration_years,
+                    [car.kilometers for car in cars],
+                    [car.price for car in cars],
+                )
+            )
 
-        df = dataframes.create_dataframe(cars)
-        df["model"] = pandas.Series(model_names)
-        df["year"] = pandas.Series(registration_years)
-        df["desc"] = df["Description"].apply(split_description)
-
-        df_sorted = df.sort_values(by=["year", "model"], ascending=[True, True])
-        df_sorted.drop_duplicates(inplace=True)
-
-        logger.info(f"Dataset prepared with {len(df_sorted)} unique entries")
+        # Outliers are flagged on the pandas frame, from the prices of the rows
+        flag_outliers = _selected(columns, "Outlier")
+        built_columns = selected_columns = None
+        if columns is not None:
+            selected_columns = [column for column in columns if column != "Outlier"]
+            if flag_outliers:
+                selected_columns = list(
+                    dict.fromkeys([*selected_columns, "model", "year", "Price"])
+                )
+            built_columns = selected_columns + dataframes.row_hash_input_columns()
+
+        backend = backends.get_backend()
+        df = backend.create_dataframe(cars, built_columns)
+        df = backend.add_columns(df, **added_columns)
+        df = backend.add_row_hash(df)
+
+        df = backend.sort_and_deduplicate(df)
+        if columns is not None:
+            df = backend.select(df, selected_columns)
+        df_sorted = backend.to_pandas(df)
+        if flag_outliers:
+            df_sorted["Outlier"] = outliers.flag_outliers(df_sorted)
+        if columns is not None:
+            df_sorted = df_sorted[columns]
+        # Descriptions are split for display lazily, when a point is hovered
+        df_sorted = dataframes.optimize_dataframe(df_sorted)
+
+        report = dataframes.memory_usage_report(df_sorted)
+        logger.info(
+            f"Dataset prepared with {len(df_sorted)} unique entries, "
+            f"{report['Bytes'].sum() / 1024:.0f} KiB in memory"
+        )
+        logger.debug(f"Memory usage per column:\n{report.to_string(index=False)}")
         return df_sorted
 
     except Exception as e:
@@ -202,23 +260,43 @@ def prepare_dataset_for_display(cars):
         return pandas.DataFrame()
 
 
+def _selected(columns, *names):
+    # Whether any of the names is kept, every column being kept if columns is None
+    return columns is None or any(name in columns for name in names)
+
+
 def save_dataframe(df):
-    """Save DataFrame to pickle file."""
+    """
+    Save DataFrame to pickle file, along with its description signatures and its
+    market cube.
+    """
     try:
         file_path = file_management.save_pickle(df, RESULTS_DIR, file_name)
         logger.info(f"DataFrame saved to {file_path}")
+        near_duplicates.get_signatures(file_path, df)
+        market_cube.get_cube(file_path, df)
         return file_path
     except Exception as e:
         logger.error(f"Error saving DataFrame: {e!s}", exc_info=True)
         return None
 
 
-def detect_price_drops():
-    """Detect price drops between the last two scraped datasets."""
+def detect_price_drops(window=PRICE_DROP_WINDOW):
+    """
+    Detect price drops between each pair of consecutive snapshots among the
+    latest ones.
+
+    Args:
+        window (int): Number of snapshots compared, the latest ones being used.
+
+    Returns:
+        tuple: The 'drop' events of snapshots.detect_price_changes() with their
+        'Price_Drop', and the listings of the latest snapshot which dropped
+        their price within the window, with their total 'Price_Drop', or
+        (None, None) if no price dropped.
+    """
     try:
-        file_paths = file_management.get_two_lasts_generated_file_path(
-            RESULTS_DIR, file_name, ".pkl"
-        )
+        file_paths = snapshots.list_snapshots()
 
         if not file_paths:
             logger.warning("No files found for price drop detection")
@@ -228,28 +306,55 @@ def detect_price_drops():
             logger.info("Only one file found, cannot detect price drops")
             return None, None
 
-        logger.info("Loading DataFrames for price drop detection")
-        df_day1 = file_management.load_pickle(file_paths[1])
-        df_day2 = file_management.load_pickle(file_paths[0])
-
-        df_drop = dataframes.detect_price_drops(df_day1, df_day2)
+        events = snapshots.detect_price_changes(
+            window, file_paths, relisted_from=_relisted_from
+        )
+        df_drop = events[events["Event"] == "drop"].reset_index(drop=True)
+        df_drop["Price_Drop"] = df_drop["Previous Price"] - df_drop["Price"]
 
         if df_drop.empty:
             logger.info("No price drops detected")
             return None, None
 
-        ids_with_price_drop = df_drop["Id"]
-        df_day2_filtered = df_day2[df_day2["Id"].isin(ids_with_price_drop)]
-        df_day2_filtered = pandas.merge(
-            df_day2_filtered, df_drop[["Id", "Price_Drop"]], on="Id", how="inner"
+        df_latest = _load_snapshot(file_paths[0])
+        total_drops = df_drop.groupby(snapshots.LISTING_KEY)["Price_Drop"].sum()
+        df_latest_filtered = df_latest[
+            df_latest[snapshots.LISTING_KEY].isin(total_drops.index)
+        ]
+        df_latest_filtered = df_latest_filtered.assign(
+            Price_Drop=df_latest_filtered[snapshots.LISTING_KEY].map(total_drops)
         )
 
         logger.info(f"Detected {len(df_drop)} price drops")
         logger.info("\nPrice Drop Summary:")
-        logger.info(df_day2_filtered.describe())
+        logger.info(df_latest_filtered.describe())
 
-        return df_drop, df_day2_filtered
+        return df_drop, df_latest_filtered
 
     except Exception as e:
         logger.error(f"Error detecting price drops: {e!s}", exc_info=True)
         return None, None
+
+
+def _relisted_from(older_path, newer_path):
+    # Follow listings relisted under a new Id through their previous key
+    df_older, df_newer = (
+        snapshots.load_snapshot_columns(path, RELIST_COLUMNS)
+        for path in (older_path, newer_path)
+    )
+    return near_duplicates.link_relisted_listings(
+        df_older,
+        df_newer,
+        near_duplicates.get_signatures(older_path, df_older),
+        near_duplicates.get_signatures(newer_path, df_newer),
+    )
+
+
+def _load_snapshot(snapshot_path):
+    df = file_management.load_pickle(snapshot_path)
+    if snapshots.LISTING_KEY not in df.columns:
+        # Snapshots saved before listing keys were stored
+        df[snapshots.LISTING_KEY] = snapshots.load_snapshot_columns(
+            snapshot_path, [snapshots.LISTING_KEY]
+        )[snapshots.LISTING_KEY]
+    return df
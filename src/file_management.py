@@ -97,7 +97,7 @@ def get_last_generated_file_path(
     add_date_prefix=True,
     date_prefix_format="%Y%m%d%H%M%S",
 ):
-    file_paths = _list_generated_file_paths(
+    file_paths = list_generated_file_paths(
         file_path, file_name, file_extension, add_date_prefix, date_prefix_format
     )
     if file_paths:
@@ -113,7 +113,7 @@ def get_two_lasts_generated_file_path(
     add_date_prefix=True,
     date_prefix_format="%Y%m%d%H%M%S",
 ):
-    file_paths = _list_generated_file_paths(
+    file_paths = list_generated_file_paths(
         file_path, file_name, file_extension, add_date_prefix, date_prefix_format
     )
     if file_paths:
@@ -125,13 +125,14 @@ def get_two_lasts_generated_file_path(
         return None
 
 
-def _list_generated_file_paths(
+def list_generated_file_paths(
     file_path,
     file_name,
     file_extension,
     add_date_prefix=True,
     date_prefix_format="%Y%m%d%H%M%S",
 ):
+    """Return the paths of all the generated files of a kind, latest first."""
     file_paths = []
 
     # Check if directory exists
@@ -143,14 +144,15 @@ def _list_generated_file_paths(
             file_paths.append(os.path.join(file_path, file))
     if add_date_prefix:
         file_paths.sort(
-            key=lambda x: _get_file_creation_time(x, date_prefix_format), reverse=True
+            key=lambda x: get_file_creation_time(x, date_prefix_format), reverse=True
         )
     else:
         file_paths.sort(key=os.path.getctime, reverse=True)
     return file_paths
 
 
-def _get_file_creation_time(file_path, date_prefix_format):
+def get_file_creation_time(file_path, date_prefix_format="%Y%m%d%H%M%S"):
+    """Return the date prefixed to the name of a generated file."""
     file_name = os.path.basename(file_path)
     date_string = file_name.split("_", 1)[0]  # Extract date prefix from file name
     return datetime.strptime(date_string, date_prefix_format)
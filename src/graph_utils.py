@@ -1,7 +1,12 @@
+import threading
+from collections import OrderedDict
+
 import matplotlib.colors as mcolors
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 
+from src.config import FIGURE_CACHE_SIZE
 from src.logging_config import setup_logging
 
 # Set up logging
@@ -19,8 +24,10 @@ def generate_color_scale(size, cmap_name="viridis"):
     Returns:
     - List of color codes in hex format.
     """
+    if size == 0:
+        return []
     cmap = plt.get_cmap(cmap_name)
-    color_scale = [mcolors.to_hex(cmap(i / (size - 1))) for i in range(size)]
+    color_scale = [mcolors.to_hex(cmap(i / max(size - 1, 1))) for i in range(size)]
     color_scale[0] = "#808080"
     return color_scale
 
@@ -32,6 +39,123 @@ def generate_log_marks(min_val, max_val):
     return marks
 
 
+def box_statistics(df, keys, whisker_factor=1.5):
+    """
+    Compute the box plot statistics of the prices of each group, as plotly does.
+
+    Parameters:
+    - df (pd.DataFrame): DataFrame with a 'Price' column and the key columns.
+    - keys (list): Columns defining the groups.
+    - whisker_factor (float): Number of interquartile ranges the whiskers reach
+      beyond the quartiles, at most.
+
+    Returns:
+    - Tuple of a DataFrame with one row per group, its keys and its 'Q1',
+      'Median', 'Q3', 'Lower Fence' and 'Upper Fence', and the group number of
+      each row of df.
+    """
+    prices = df["Price"].to_numpy(dtype=np.float64)
+    groups = pd.DataFrame(
+        {**{key: df[key].to_numpy() for key in keys}, "Price": prices}
+    ).groupby(keys, sort=True)
+    codes = groups.ngroup().to_numpy()
+    quartiles = groups["Price"].quantile([0.25, 0.5, 0.75]).unstack()
+    q1 = quartiles[0.25].to_numpy()
+    q3 = quartiles[0.75].to_numpy()
+
+    # Whiskers end at the furthest prices within the fences
+    spread = whisker_factor * (q3 - q1)
+    inside = (prices >= (q1 - spread)[codes]) & (prices <= (q3 + spread)[codes])
+    fences = pd.Series(prices[inside]).groupby(codes[inside]).agg(["min", "max"])
+    statistics = quartiles.index.to_frame(index=False)
+    statistics["Q1"] = q1
+    statistics["Median"] = quartiles[0.5].to_numpy()
+    statistics["Q3"] = q3
+    statistics["Lower Fence"] = fences["min"].to_numpy()
+    statistics["Upper Fence"] = fences["max"].to_numpy()
+    return statistics, codes
+
+
+def stratified_sample(codes, sample_size, seed=0):
+    """
+    Sample rows in proportion to the size of their group, at least one per group.
+
+    Parameters:
+    - codes (np.ndarray): Group number of each row.
+    - sample_size (int): Approximate number of rows to sample.
+    - seed (int): Seed of the sampling, so that a selection always shows the
+      same rows.
+
+    Returns:
+    - Sorted positions of the sampled rows.
+    """
+    if len(codes) <= sample_size:
+        return np.arange(len(codes))
+    sizes = np.bincount(codes)
+    quotas = np.maximum(np.round(sizes * sample_size / len(codes)), 1)
+
+    # Rank the rows of each group in a random order and keep the first ones
+    shuffled = np.random.default_rng(seed).permutation(len(codes))
+    order = shuffled[np.argsort(codes[shuffled], kind="stable")]
+    starts = np.cumsum(sizes) - sizes
+    ranks = np.empty(len(codes), dtype=np.int64)
+    ranks[order] = np.arange(len(codes)) - np.repeat(starts, sizes)
+    return np.flatnonzero(ranks < quotas[codes])
+
+
+class FigureCache:
+    """
+    Bounded least recently used cache of serialized figures.
+
+    Keys should identify everything a figure is built from, the snapshot the
+    data was loaded from included, and clear() must be called when a new
+    dataset is loaded. Dash may run callbacks in several threads, so the cache
+    is guarded by a lock, figures being built outside of it.
+    """
+
+    def __init__(self, max_size=FIGURE_CACHE_SIZE):
+        self.max_size = max_size
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._figures)
+
+    def get(self, key, build):
+        """
+        Return the figure of a key, building and caching it on a miss.
+
+        Parameters:
+        - key (tuple): Hashable description of the figure.
+        - build (callable): Returns the plotly Figure of the key.
+
+        Returns:
+        - The figure serialized as a dict, as Dash accepts it.
+        """
+        with self._lock:
+            figure = self._figures.get(key)
+            if figure is not None:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return figure
+            self.misses += 1
+
+        figure = build().to_plotly_json()
+        with self._lock:
+            self._figures[key] = figure
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.max_size:
+                self._figures.popitem(last=False)
+        return figure
+
+    def clear(self):
+        """Drop every cached figure."""
+        with self._lock:
+            self._figures.clear()
+
+
 if __name__ == "__main__":
 
     Viridis = generate_color_scale(10)
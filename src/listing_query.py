@@ -0,0 +1,199 @@
+"""Lazy, optimized query API over the listing pipeline."""
+
+from collections import namedtuple
+
+from src import data_cleaning, data_preparation, visualization
+from src.logging_config import setup_logging
+
+
+# Set up logging
+logger = setup_logging(__name__)
+
+
+# Pipeline operations, in the order they are executed once optimized
+QueryPlan = namedtuple(
+    "QueryPlan",
+    ["source", "cars", "min_price", "max_price", "brands", "clean", "sort", "columns"],
+)
+
+
+class ListingQuery:
+    """
+    Chainable description of a listing pipeline, only run by collect().
+
+    Operations are recorded in any order and optimized into a single pass:
+    the price filter runs before cleaning, since cleaning never changes prices,
+    and the brand filter runs inside make and model matching, so that cars
+    exactly matched to another brand never reach the fuzzy matcher. Cleaning,
+    filtering and sort key computation share one loop over the cars, and only
+    the selected columns are built in the display DataFrame, the stages
+    computing other columns being skipped. New listings are only added to the
+    listing index when scraping the web, so that reading files never changes it.
+
+    Example:
+        df_cars = (
+            ListingQuery.scan("file")
+            .clean()
+            .filter_price(500, 300000)
+            .sort()
+            .select(["Price", "model", "year"])
+            .collect()
+        )
+    """
+
+    def __init__(self, source=None, cars=None, operations=(), on_page=None):
+        self._source = source
+        self._cars = cars
+        self._operations = tuple(operations)
+        self._on_page = on_page
+
+    @classmethod
+    def scan(cls, source="web", on_page=None):
+        """
+        Start a query over the cars of get_cars(source), 'web' or 'file', with
+        on_page called on each scraped page.
+        """
+        return cls(source=source, on_page=on_page)
+
+    @classmethod
+    def from_cars(cls, cars):
+        """Start a query over already loaded cars."""
+        return cls(cars=cars)
+
+    def clean(self):
+        """Discard non-electric cars and normalize make, model and year."""
+        return self._then("clean")
+
+    def filter_price(self, min_price=500, max_price=150000):
+        """Keep the cars priced within [min_price, max_price]."""
+        return self._then("filter_price", min_price=min_price, max_price=max_price)
+
+    def filter_brands(self, brands):
+        """Keep the cars of the given makes, as named after cleaning."""
+        return self._then("filter_brands", brands=brands)
+
+    def sort(self):
+        """Sort the cars by make and model, then registration year."""
+        return self._then("sort")
+
+    def select(self, columns):
+        """Only build the given columns of the display DataFrame."""
+        return self._then("select", columns=columns)
+
+    def optimize(self):
+        """
+        Merge the recorded operations into a single plan.
+
+        Returns:
+            QueryPlan: Intersected price range and brands, and the union of the
+            selected columns, None meaning every column.
+        """
+        min_price, max_price = float("-inf"), float("inf")
+        brands = None
+        columns = None
+        clean = sort = False
+
+        for name, arguments in self._operations:
+            if name == "filter_price":
+                min_price = max(min_price, arguments["min_price"])
+                max_price = min(max_price, arguments["max_price"])
+            elif name == "filter_brands":
+                selected = {brand.upper() for brand in arguments["brands"]}
+                brands = selected if brands is None else brands & selected
+            elif name == "select":
+                columns = list(dict.fromkeys([*(columns or []), *arguments["columns"]]))
+            elif name == "clean":
+                clean = True
+            elif name == "sort":
+                sort = True
+
+        return QueryPlan(
+            self._source,
+            self._cars,
+            min_price,
+            max_price,
+            frozenset(brands) if brands is not None else None,
+            clean,
+            sort,
+            columns,
+        )
+
+    def explain(self):
+        """Describe the optimized plan, one stage per line."""
+        plan = self.optimize()
+        stages = [
+            f"scan {plan.source or 'cars'}",
+            f"fused pass: price in [{plan.min_price}, {plan.max_price}]"
+            + (", clean" if plan.clean else "")
+            + (f", brands in {sorted(plan.brands)}" if plan.brands is not None else "")
+            + (", sort keys" if plan.sort else ""),
+        ]
+        if plan.sort:
+            stages.append("sort")
+        stages.append(
+            "prepare display dataset with "
+            + ("all columns" if plan.columns is None else ", ".join(plan.columns))
+        )
+        return "\n".join(stages)
+
+    def collect(self):
+        """
+        Run the optimized plan.
+
+        Returns:
+            pd.DataFrame: The display dataset, see prepare_dataset_for_display().
+        """
+        plan = self.optimize()
+        logger.info(f"Running listing query:\n{self.explain()}")
+
+        cars = plan.cars
+        if cars is None:
+            cars = data_preparation.get_cars(plan.source, self._on_page)
+
+        cars = _fused_pass(cars, plan)
+        return data_preparation.prepare_dataset_for_display(
+            cars, plan.columns, update_index=plan.source == "web"
+        )
+
+    def _then(self, name, **arguments):
+        return ListingQuery(
+            self._source,
+            self._cars,
+            (*self._operations, (name, arguments)),
+            self._on_page,
+        )
+
+
+def _fused_pass(cars, plan):
+    rules = data_cleaning.get_rules() if plan.clean else None
+
+    kept = []
+    sort_keys = []
+    for car in cars:
+        if not plan.min_price <= car.price <= plan.max_price:
+            continue
+        if rules is not None:
+            try:
+                if not data_cleaning.clean_car(car, rules, makes=plan.brands):
+                    continue
+            except Exception as e:
+                logger.error(f"Error cleaning car data: {e!s}", exc_info=True)
+                continue
+        elif plan.brands is not None and car.brand_name.upper() not in plan.brands:
+            continue
+
+        kept.append(car)
+        if plan.sort:
+            sort_keys.append(
+                (
+                    visualization.get_sort_key(car.brand_name, car.model_name),
+                    visualization.get_registration_year(car),
+                )
+            )
+
+    if plan.sort:
+        order = sorted(range(len(kept)), key=sort_keys.__getitem__)
+        kept = [kept[position] for position in order]
+
+    logger.info(f"Listing query kept {len(kept)} of {len(cars)} cars")
+    return kept
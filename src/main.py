@@ -1,24 +1,56 @@
+import os
+import time
 import webbrowser
 
+import numpy as np
+import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 from dash import Dash, callback_context, dcc, exceptions, html, no_update
 from dash.dependencies import Input, Output
 
-from src import graph_utils, visualization, data_preparation
-from src.data_cleaning import clean_car_list
-from src.data_preparation import (
-    get_cars,
-    filter_cars,
-    prepare_dataset_for_display,
-    save_dataframe,
-)
+from src import data_preparation, graph_utils
+from src.config import DASHBOARD_RENDER_MODE, DASHBOARD_SAMPLE_SIZE, HIDE_OUTLIERS
+from src.data import deduplication, lifecycle, snapshots, watchlists
+from src.data.price_index import SortedPriceIndex
+from src.data.price_tracker import PriceTracker
+from src.data_preparation import save_dataframe
+from src.listing_query import ListingQuery
 from src.logging_config import setup_logging
 
 # Set up logging
 logger = setup_logging(__name__)
 
 
-def generate_graph(df_cars):
+# Columns of the listings sent along with their points, read by the callbacks
+HOVER_COLUMNS = [
+    "URL",
+    "Image URL",
+    "Description",
+    "Brand Name",
+    "Model Name",
+    "year",
+    "Kilometers",
+    "Price",
+    "Days On Market",
+]
+
+# Columns read by the graph and its callbacks
+DASHBOARD_COLUMNS = [
+    *HOVER_COLUMNS,
+    "model",
+    "Listing Key",
+    "Canonical Key",
+    "Outlier",
+]
+
+
+def generate_graph(df_cars, render_mode=DASHBOARD_RENDER_MODE):
+    if render_mode == "summary":
+        return generate_summary_graph(df_cars)
+    if render_mode != "points":
+        raise ValueError("Invalid render mode. Choose 'points' or 'summary'.")
+
     color_scale = graph_utils.generate_color_scale(df_cars["year"].unique().size)
     plot_height = len(df_cars["model"].unique()) * 25
     fig = px.box(
@@ -26,21 +58,100 @@ def generate_graph(df_cars):
         x="Price",
         y="model",
         points="all",
-        custom_data=[
-            "URL",
-            "Image URL",
-            "desc",
-            "Brand Name",
-            "Model Name",
-            "year",
-            "Kilometers",
-            "Price",
-        ],
+        custom_data=HOVER_COLUMNS,
         color="year",
         color_discrete_sequence=color_scale,
         height=plot_height,
     )
     fig.update_layout(yaxis={"categoryorder": "category descending"})
+    return style_graph(fig)
+
+
+def generate_summary_graph(df_cars, sample_size=DASHBOARD_SAMPLE_SIZE):
+    """
+    Draw the same boxes as generate_graph(), from statistics computed here.
+
+    Only the quartiles and whiskers of each model and year are sent to the
+    browser, along with the points of a stratified sample of the listings and
+    of the listings beyond the whiskers, drawn with WebGL.
+
+    Args:
+        df_cars (pd.DataFrame): Listings with the DASHBOARD_COLUMNS.
+        sample_size (int): Approximate number of sampled listings.
+
+    Returns:
+        go.Figure: The figure.
+    """
+    if df_cars.empty:
+        return style_graph(go.Figure())
+    models = np.sort(df_cars["model"].unique())
+    years = np.sort(df_cars["year"].unique())
+    color_scale = graph_utils.generate_color_scale(years.size)
+    fig = go.Figure(layout={"height": len(models) * 25})
+
+    statistics, codes = graph_utils.box_statistics(df_cars, ["model", "year"])
+    prices = df_cars["Price"].to_numpy(dtype=np.float64)
+    beyond_whiskers = (prices < statistics["Lower Fence"].to_numpy()[codes]) | (
+        prices > statistics["Upper Fence"].to_numpy()[codes]
+    )
+    shown = np.zeros(len(df_cars), dtype=bool)
+    shown[graph_utils.stratified_sample(codes, sample_size)] = True
+    shown |= beyond_whiskers
+
+    # Models are numbered from the top of the graph, and the boxes of their
+    # years side by side within a band of height 1, as boxes are grouped
+    model_positions = pd.Series(np.arange(len(models))[::-1], index=models)
+    box_width = 0.8 / len(years)
+    generator = np.random.default_rng(0)
+    for year_number, (year, color) in enumerate(zip(years, color_scale)):
+        offset = -0.4 + (year_number + 0.5) * box_width
+        year_statistics = statistics[statistics["year"] == year]
+        fig.add_trace(
+            go.Box(
+                name=str(year),
+                legendgroup=str(year),
+                orientation="h",
+                y=model_positions[year_statistics["model"]].to_numpy() + offset,
+                q1=year_statistics["Q1"],
+                median=year_statistics["Median"],
+                q3=year_statistics["Q3"],
+                lowerfence=year_statistics["Lower Fence"],
+                upperfence=year_statistics["Upper Fence"],
+                width=box_width * 0.9,
+                marker_color=color,
+            )
+        )
+
+        points = df_cars[shown & (df_cars["year"] == year).to_numpy()]
+        jitter = generator.uniform(-0.3, 0.3, len(points)) * box_width
+        fig.add_trace(
+            go.Scattergl(
+                name=str(year),
+                legendgroup=str(year),
+                showlegend=False,
+                mode="markers",
+                x=points["Price"],
+                y=model_positions[points["model"]].to_numpy() + offset + jitter,
+                customdata=points[HOVER_COLUMNS].to_numpy(dtype=object),
+                hovertemplate="%{x}<extra></extra>",
+                marker={"color": color, "size": 4},
+            )
+        )
+
+    fig.update_layout(
+        yaxis={
+            "tickmode": "array",
+            "tickvals": model_positions.to_numpy(),
+            "ticktext": models,
+            "range": [-0.5, len(models) - 0.5],
+        },
+        xaxis_title="Price",
+        yaxis_title="model",
+    )
+    return style_graph(fig)
+
+
+def style_graph(fig):
     fig.update_layout(
         legend=dict(
             title="Year",
@@ -59,21 +170,26 @@ def generate_graph(df_cars):
 
 
 def scrap_ads():
-    cars = get_cars("web")
-
-    # Save the dataframe
-    cars = clean_car_list(cars)
-    cars = filter_cars(cars, min_price=500, max_price=300000)
-    cars = sorted(
-        cars,
-        key=lambda car: (
-            visualization.get_sort_key(car.brand_name, car.model_name),
-            visualization.get_registration_year(car),
-        ),
+    # Report price drops page by page, while the crawl runs
+    tracker = PriceTracker.from_latest_snapshot()
+    previous_snapshots = snapshots.list_snapshots()
+    df_cars = (
+        ListingQuery.scan("web", on_page=tracker.check)
+        .clean()
+        .filter_price(min_price=500, max_price=300000)
+        .sort()
+        .collect()
     )
-    df_cars = prepare_dataset_for_display(cars)
 
+    logger.info(f"{tracker.drop_count} price drops reported while scraping")
+
+    # Save the dataframe
     save_dataframe(df_cars)
+    lifecycle.update_lifecycle(price_drops=tracker.price_drops())
+
+    watchlists.evaluate_watchlists(
+        df_cars, previous_snapshots[0] if previous_snapshots else None
+    )
 
     detect_price_drops()
 
@@ -82,20 +198,83 @@ def detect_price_drops():
     data_preparation.detect_price_drops()
 
 
-def run_server():
-    cars = get_cars("file")
-    cars = clean_car_list(cars)
-    cars = filter_cars(cars, min_price=500, max_price=300000)
-    cars = sorted(
-        cars,
-        key=lambda car: (
-            visualization.get_sort_key(car.brand_name, car.model_name),
-            visualization.get_registration_year(car),
+def load_dashboard_data(snapshot_path=None):
+    """
+    Load the listings shown by the dashboard, with their outlier flags.
+
+    Args:
+        snapshot_path (str): Snapshot to read, whose columns were prepared when
+            it was scraped. Without one, the last scraped files are prepared.
+
+    Returns:
+        tuple: The listings, their SortedPriceIndex and their outlier mask.
+    """
+    df_cars = None
+    if snapshot_path is not None:
+        try:
+            df_cars = snapshots.load_snapshot_columns(snapshot_path, DASHBOARD_COLUMNS)
+        except KeyError as e:
+            logger.warning(
+                f"Snapshot {os.path.basename(snapshot_path)} lacks the column {e!s}, "
+                "preparing the last scraped files instead"
+            )
+    if df_cars is None:
+        df_cars = (
+            ListingQuery.scan("file")
+            .clean()
+            .filter_price(min_price=500, max_price=300000)
+            .sort()
+            .select(DASHBOARD_COLUMNS)
+            .collect()
+        )
+    # A car listed on several web sites is shown once
+    df_cars = deduplication.collapse_duplicates(df_cars)
+    # Built once, so that a price range is a slice rather than a full scan
+    price_index = SortedPriceIndex(df_cars)
+    # Outliers are flagged when the dataset is prepared
+    outliers = df_cars["Outlier"].to_numpy(dtype=bool)
+    return df_cars, price_index, outliers
+
+
+def get_latest_snapshot():
+    """Path of the latest snapshot, which changes when a scrape is saved."""
+    snapshot_paths = snapshots.list_snapshots()
+    return snapshot_paths[0] if snapshot_paths else None
+
+
+def get_figure(
+    figure_cache, snapshot_path, price_index, outliers, price_range, outlier_options
+):
+    """
+    Return the figure of the graph callbacks for a price range.
+
+    Args:
+        figure_cache (graph_utils.FigureCache): Figures already built.
+        snapshot_path (str): Snapshot the listings were loaded from.
+        price_index (SortedPriceIndex): Index of the listings.
+        outliers (np.ndarray): Outlier mask of the listings, by position.
+        price_range (list): Value of the price range slider.
+        outlier_options (list): Value of the outlier checklist.
+
+    Returns:
+        dict: The serialized figure, built on a cache miss.
+    """
+    hide_outliers = "hide" in outlier_options
+    min_selected, max_selected = min(price_range), max(price_range)
+    return figure_cache.get(
+        (snapshot_path, min_selected, max_selected, hide_outliers),
+        lambda: generate_graph(
+            price_index.select(
+                min_selected, max_selected, outliers if hide_outliers else None
+            )
         ),
     )
-    df_cars = prepare_dataset_for_display(cars)
 
-    filtered_df_cars = df_cars
+
+def run_server():
+    snapshot_path = get_latest_snapshot()
+    df_cars, price_index, outliers = load_dashboard_data(snapshot_path)
+    figure_cache = graph_utils.FigureCache()
 
     min_price = df_cars["Price"].min()
     max_price = df_cars["Price"].max()
@@ -115,32 +294,39 @@ def run_server():
                 max=max_price,
                 value=[default_selected_min_price, default_selected_max_price],
             ),
+            dcc.Checklist(
+                id="outlier-checklist",
+                options=[{"label": "Hide outliers", "value": "hide"}],
+                value=["hide"] if HIDE_OUTLIERS else [],
+            ),
             dcc.Graph(
                 id="graph-id",
-                figure=generate_graph(filtered_df_cars),
+                figure=get_figure(
+                    figure_cache,
+                    snapshot_path,
+                    price_index,
+                    outliers,
+                    [default_selected_min_price, default_selected_max_price],
+                    ["hide"] if HIDE_OUTLIERS else [],
+                ),
                 clear_on_unhover=True,
             ),
-            dcc.Interval(
-                id="interval-component",
-                interval=1 * 1000,  # 1 second
-                n_intervals=0,  # initial value
-                disabled=False,  # initially enabled
-            ),
             dcc.Tooltip(id="graph-tooltip"),
-            html.Div(id="output-container-range-slider"),
         ]
     )
 
     @app.callback(
-        [Output("graph-id", "figure"), Output("interval-component", "disabled")],
+        Output("graph-id", "figure"),
         [
             Input("refresh-button", "n_clicks"),
-            Input("interval-component", "n_intervals"),
+            Input("range-slider", "value"),
+            Input("outlier-checklist", "value"),
             Input("graph-id", "clickData"),
         ],
+        prevent_initial_call=True,
     )
-    def update_graph(n_clicks, n_intervals, click_data):
-        nonlocal filtered_df_cars
+    def update_graph(n_clicks, price_range, outlier_options, click_data):
+        nonlocal snapshot_path, df_cars, price_index, outliers
 
         ctx = callback_context
 
@@ -150,14 +336,38 @@ def run_server():
         trigger_id = ctx.triggered[0]["prop_id"].split(".")[0]
 
         if trigger_id == "graph-id" and click_data:
+            if "customdata" not in click_data["points"][0]:
+                # Boxes of the summary graph have no listing
+                raise exceptions.PreventUpdate
             url = click_data["points"][0]["customdata"][0]
             webbrowser.open_new_tab(url)
             raise exceptions.PreventUpdate
 
-        if trigger_id == "refresh-button" or trigger_id == "interval-component":
-            return generate_graph(filtered_df_cars), True
-
-        return no_update, no_update
+        if trigger_id == "refresh-button":
+            latest_snapshot = get_latest_snapshot()
+            if latest_snapshot != snapshot_path:
+                logger.info(
+                    f"Loading the data of snapshot {os.path.basename(latest_snapshot)}"
+                )
+                df_cars, price_index, outliers = load_dashboard_data(latest_snapshot)
+                snapshot_path = latest_snapshot
+                figure_cache.clear()
+
+        start = time.perf_counter()
+        misses = figure_cache.misses
+        figure = get_figure(
+            figure_cache,
+            snapshot_path,
+            price_index,
+            outliers,
+            price_range,
+            outlier_options,
+        )
+        logger.info(
+            f"Graph updated in {(time.perf_counter() - start) * 1000:.1f} ms "
+            f"({'rebuilt' if figure_cache.misses > misses else 'cached'})"
+        )
+        return figure
 
     @app.callback(
         Output("graph-tooltip", "show"),
@@ -170,22 +380,26 @@ def run_server():
             return False, no_update, no_update
 
         hover_data = hover_data["points"][0]
+        if "customdata" not in hover_data:
+            return False, no_update, no_update
         bbox = hover_data["bbox"]
         custom_data = hover_data["customdata"]
         url = custom_data[0]
         image_url = custom_data[1]
-        desc = custom_data[2]
+        desc = data_preparation.split_description(custom_data[2])
         make = custom_data[3]
         model = custom_data[4]
         year = custom_data[5] if custom_data[5] is not None else "-"
         km = f"{custom_data[6]}km" if custom_data[6] is not None else ""
         price = custom_data[7]
+        days_on_market = custom_data[8]
 
         children = [
             html.Div(
                 [
                     dcc.Markdown(
-                        f"**{make} {model}**<br>{year} | {km}<br>**{price}€**",
+                        f"**{make} {model}**<br>{year} | {km}<br>**{price}€**"
+                        f"<br>{days_on_market} days on market",
                         dangerously_allow_html=True,
                     ),
                     html.Img(
@@ -200,18 +414,6 @@ def run_server():
 
         return True, bbox, children
 
-    @app.callback(
-        Output("output-container-range-slider", "children"),
-        [Input("range-slider", "value")],
-    )
-    def update_output(value):
-        nonlocal filtered_df_cars
-        lower_price = min(value)
-        upper_price = max(value)
-        filtered_df_cars = df_cars[
-            (df_cars["Price"] >= lower_price) & (df_cars["Price"] <= upper_price)
-        ]
-
     app.run(debug=True, use_reloader=False)
 
 
@@ -11,7 +11,8 @@ from webdriver_manager.chrome import ChromeDriverManager
 
 from src import file_management, utilities
 from src.config import AUTOSCOUT24_RESULTS
-from src.data.electric_car_data import ElectricCar
+from src.data import normalization
+from src.data.car_batch import CarBatch
 from src.logging_config import setup_logging
 
 
@@ -27,15 +28,17 @@ request_url = (
 )
 request_url_page = "&page="
 file_name = "autoscout24"
+source_name = "autoscout24"
 
 
-def get_cars_from_web_site():
+def get_cars_from_web_site(on_page=None):
     """
     Scrape car listings from AutoScout24 website.
-    Returns list of ElectricCar objects.
+    on_page, if given, is called with the CarBatch of each scraped page.
+    Returns CarBatch of the cars.
     """
     page = 1
-    all_cars = []
+    all_cars = CarBatch()
     consecutive_errors = 0
     max_consecutive_errors = 3
 
@@ -44,9 +47,9 @@ def get_cars_from_web_site():
     while True:
         try:
             logger.info(f"AutoScout24: scraping page {page}")
-            json_cars = _scrape_page(page)
+            cars = _scrape_page(page)
 
-            if not json_cars:  # Handle empty result
+            if cars is None:  # Handle failed page
                 logger.warning(f"No data found on page {page}")
                 consecutive_errors += 1
                 if consecutive_errors >= max_consecutive_errors:
@@ -56,12 +59,12 @@ def get_cars_from_web_site():
                     break
                 continue
 
-            cars = [json.loads(x) for x in json.loads(json_cars)]
-
             if len(cars) == 0:
                 logger.info("No more cars found. Finishing scraping.")
                 break
 
+            if on_page is not None:
+                on_page(cars)
             all_cars.extend(cars)
             consecutive_errors = 0  # Reset error counter on success
             _wait()
@@ -83,7 +86,7 @@ def get_cars_from_web_site():
 def get_cars_from_last_file():
     """
     Load car listings from the most recent JSON file.
-    Returns list of ElectricCar objects.
+    Returns CarBatch of the cars.
     """
     try:
         json_file_path = file_management.get_last_generated_file_path(
@@ -164,7 +167,7 @@ def _create_driver():
 def _scrape_page(page):
     """
     Scrape a single page of car listings.
-    Returns JSON string containing car data.
+    Returns CarBatch of the cars, or None if the page could not be scraped.
     """
     driver = None
     try:
@@ -175,6 +178,7 @@ def _scrape_page(page):
         driver.get(url)
         time.sleep(2)  # Allow time for JavaScript to execute
 
+        cpu_start = time.process_time()
         soup = BeautifulSoup(driver.page_source, "html.parser")
         json_data = _extract_json_from_html(soup)
 
@@ -184,12 +188,15 @@ def _scrape_page(page):
 
         listings_json_data = json_data["props"]["pageProps"]["listings"]
         cars = _get_car_list_from_json(listings_json_data)
+        logger.info(
+            f"Parsed {len(cars)} cars of page {page} in "
+            f"{time.process_time() - cpu_start:.3f}s of CPU time"
+        )
 
-        if not cars:
+        if len(cars) == 0:
             logger.info("No cars found on this page")
-            return json.dumps([])
 
-        return json.dumps([car.to_json() for car in cars])
+        return cars
 
     except WebDriverException as e:
         logger.error(
@@ -240,13 +247,13 @@ def _validate_json_structure(json_data):
 
 def _get_car_list_from_json(listing_json_data):
     """
-    Convert JSON listing data to ElectricCar objects.
-    Returns list of ElectricCar objects.
+    Convert JSON listing data to cars.
+    Returns CarBatch of the cars.
     """
-    cars = []
+    cars = CarBatch()
     for result in listing_json_data:
         try:
-            car = ElectricCar(
+            cars.append(
                 id=result["id"],
                 brand_name=(
                     result["vehicle"]["make"].upper()
@@ -271,7 +278,7 @@ def _get_car_list_from_json(listing_json_data):
                 first_registration_year=utilities.extract_year(
                     result["tracking"]["firstRegistration"]
                 ),
-                kilometers=result["tracking"]["mileage"],
+                kilometers=normalization.to_int(result["tracking"]["mileage"]),
                 price=float(result["tracking"]["price"]),
                 warranty_months=0,
                 car_pass=False,
@@ -283,8 +290,8 @@ def _get_car_list_from_json(listing_json_data):
                 image_url=_strip_after_jpg(
                     result["images"][0] if result["images"] else None
                 ),
+                source=source_name,
             )
-            cars.append(car)
 
         except Exception as e:
             logger.error(f"Error processing car data: {e!s}", exc_info=True)
@@ -295,25 +302,22 @@ def _get_car_list_from_json(listing_json_data):
 
 def _save_and_return(all_cars):
     """
-    Save cars to JSON file and return the list.
-    Returns list of ElectricCar objects.
+    Save cars to JSON file and return them.
+    Returns CarBatch of the cars.
     """
-    if not all_cars:
+    if len(all_cars) == 0:
         logger.warning("No cars to save")
-        return []
+        return all_cars
 
     try:
-        all_cars_json = json.dumps(all_cars)
         json_file_path = file_management.save_json(
-            all_cars_json, AUTOSCOUT24_RESULTS, file_name, ".json"
+            all_cars.to_records(), AUTOSCOUT24_RESULTS, file_name, ".json"
         )
-
         logger.info(f"Saved {len(all_cars)} cars to {json_file_path}")
-        return _get_car_list_from_json_file(json_file_path)
-
     except Exception as e:
         logger.error(f"Error saving cars: {e!s}", exc_info=True)
-        return []
+
+    return all_cars
 
 
 def _wait():
@@ -336,17 +340,16 @@ def _strip_after_jpg(url):
 def _get_car_list_from_json_file(json_file_path):
     """
     Load cars from JSON file.
-    Returns list of ElectricCar objects.
+    Returns CarBatch of the cars.
     """
     try:
         json_data = file_management.load_json(json_file_path)
-        cars = []
+        cars = CarBatch()
 
-        # json_data is already parsed by file_management.load_json()
-        # No need to call json.loads() again
+        # load_json() also decodes the JSON string saved by older versions
         for result in json_data:
-            car = ElectricCar.from_json(json.dumps(result))
-            cars.append(car)
+            record = normalization.normalize_record(result)
+            cars.append(**{**record, "source": source_name})
         logger.info(f"Loaded {len(cars)} cars from file")
         return cars
 
@@ -17,6 +17,7 @@ sortBy=SORT_INDEX
 sortOrder=DECREASING
 viewOptions=list-view
 """
+
 import json
 import random
 import time
@@ -25,7 +26,8 @@ import requests
 
 from src import data_cleaning, file_management, utilities
 from src.config import DEUXIEMEMAIN_RESULTS
-from src.data.electric_car_data import ElectricCar
+from src.data import normalization
+from src.data.car_batch import CarBatch
 from src.logging_config import setup_logging
 
 
@@ -40,10 +42,16 @@ page_parameter = f"&limit={items_per_page}&offset="
 
 query_url_search = f"{query_url}{search}"
 file_name = "deuxieme_main"
+source_name = "2ememain"
 
 
-def get_cars_from_web_site():
-    all_cars = []
+def get_cars_from_web_site(on_page=None):
+    """
+    Scrape car listings from 2ememain.
+    on_page, if given, is called with the CarBatch of each scraped page.
+    Returns CarBatch of the cars.
+    """
+    all_cars = CarBatch()
     page = 1
 
     try:
@@ -61,6 +69,8 @@ def get_cars_from_web_site():
 
         listing_json_data = json_data.get("listings", [])
         cars = _get_car_list_from_json(listing_json_data)
+        if on_page is not None:
+            on_page(cars)
         all_cars.extend(cars)
 
         logger.info(f"Found {max_allowed_page_number} pages to scrape")
@@ -79,6 +89,8 @@ def get_cars_from_web_site():
 
                 listing_json_data = json_data.get("listings", [])
                 cars = _get_car_list_from_json(listing_json_data)
+                if on_page is not None:
+                    on_page(cars)
                 all_cars.extend(cars)
 
             except Exception as e:
@@ -137,7 +149,7 @@ def _save_and_return(all_cars):
         return []
 
     try:
-        all_cars_json = json.dumps(list([car.__dict__ for car in all_cars]))
+        all_cars_json = json.dumps(all_cars.to_records())
         file_management.save_json(
             all_cars_json, DEUXIEMEMAIN_RESULTS, file_name, ".json"
         )
@@ -154,22 +166,32 @@ def _wait():
 
 
 def _get_car_list_from_json(listing_json_data):
-    cars = []
+    cars = CarBatch()
+    rules = data_cleaning.get_rules()
     for data in listing_json_data:
         try:
             make = next(
                 (x for x in data["verticals"] if x not in ["cars", "automotive"]), None
             )
-            year = next(
-                (
-                    d["value"]
-                    for d in data["attributes"]
-                    if d["key"] == "constructionYear"
-                ),
-                None,
+            year = normalization.to_year(
+                next(
+                    (
+                        d["value"]
+                        for d in data["attributes"]
+                        if d["key"] == "constructionYear"
+                    ),
+                    None,
+                )
             )
+            description = _build_description(data)
 
-            car = ElectricCar(
+            if rules.is_forbidden(description):
+                continue
+
+            if year is None:
+                year = utilities.extract_year(description)
+
+            cars.append(
                 id=data["itemId"],
                 brand_name=make.upper() if make is not None else "UNKNOWN",
                 model_name=next(
@@ -193,39 +215,27 @@ def _get_car_list_from_json(listing_json_data):
                 published_date=data["date"],
                 is_pro=True,
                 new=False,
-                first_registration_year=year,
-                kilometers=next(
-                    (d["value"] for d in data["attributes"] if d["key"] == "mileage"),
-                    None,
+                first_registration_year=rules.fix_year(year),
+                kilometers=normalization.to_int(
+                    next(
+                        (
+                            d["value"]
+                            for d in data["attributes"]
+                            if d["key"] == "mileage"
+                        ),
+                        None,
+                    )
                 ),
                 price=float(data["priceInfo"]["priceCents"] / 100),
                 warranty_months=0,
                 car_pass=False,
-                description=_build_description(data),
+                description=description,
                 url=f'{root_url}{data["vipUrl"]}',
                 point_of_sale_city=data["location"]["cityName"],
                 image_url=_get_image_url(data),
+                source=source_name,
             )
 
-            if year is None:
-                year = utilities.extract_year(car.description)
-                if year is not None:
-                    car.first_registration_year = int(year)
-
-            if (
-                car.first_registration_year is not None
-                and int(car.first_registration_year) < 2000
-            ):
-                car.first_registration_year = int(car.first_registration_year) + 100
-
-            forbidden = any(
-                forbidden_term in car.description.upper()
-                for forbidden_term in data_cleaning.forbidden_list
-            )
-
-            if not forbidden:
-                cars.append(car)
-
         except Exception as e:
             logger.error(f"Error processing car data: {e!s}", exc_info=True)
             continue
@@ -267,7 +277,7 @@ def _get_car_list_from_json_file(json_file_path):
             logger.error(f"JSON data is not a list: {type(json_data)}")
             return []
 
-        cars = []
+        cars = CarBatch()
         for item in json_data:
             # Skip any non-dictionary items
             if not isinstance(item, dict):
@@ -275,9 +285,10 @@ def _get_car_list_from_json_file(json_file_path):
                 continue
 
             try:
-                cars.append(ElectricCar(**item))
-            except TypeError as e:
-                logger.warning(f"Could not create ElectricCar from item {item}: {e!s}")
+                record = normalization.normalize_record(item)
+                cars.append(**{**record, "source": source_name})
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Could not create car from item {item}: {e!s}")
                 continue
 
         return cars
@@ -5,10 +5,10 @@ from dotenv import load_dotenv
 
 from src import file_management, utilities
 from src.config import GOCAR_RESULTS
-from src.data.electric_car_data import ElectricCar
+from src.data import normalization
+from src.data.car_batch import CarBatch
 from src.logging_config import setup_logging
 from src.sites import http_client
-from src.sites.gocar.gocar_data import Formatted
 from src.sites.search_settings import SearchSettings
 
 # Set up logging
@@ -32,17 +32,24 @@ if not bearer_token:
 script_dir = os.path.dirname(os.path.abspath(__file__))
 result_file_path = GOCAR_RESULTS
 file_name = "gocar"
+source_name = "gocar"
 query_url = (
     "https://search.gocar.be/multi-search"  # "https://search.gocar.be/multi-search"
 )
 request_json_file_path = os.path.join(script_dir, "gocar_electric_car_search.json")
 
 
-def get_cars_from_web_site():
+def get_cars_from_web_site(on_page=None):
+    """
+    Fetch the Gocar listings, which come as a single page.
+    on_page, if given, is called with the CarBatch of the page.
+    """
     logger.info("Starting Gocar data scraping")
     json_data = _perform_http_request()
     file_management.save_json(json_data, result_file_path, file_name, ".json")
     car_list = _get_car_list_from_json(json_data)
+    if on_page is not None:
+        on_page(car_list)
     logger.info(f"Gocar: Found {len(car_list)} cars")
     return car_list
 
@@ -92,44 +99,18 @@ def _get_car_list_from_json_file(json_file_path):
 
 
 def _get_car_list_from_json(json_data):
-    cars = []
+    cars = CarBatch()
     try:
         hits = json_data["results"][0].get("hits", [])
         logger.debug(f"Processing {len(hits)} car hits from Gocar JSON data")
 
         for result in hits:
             try:
-                formatted_data = Formatted(**result["_formatted"])
-
-                p = formatted_data.price
-                pr = float(p.get("for_filtering", p.get("unformatted", 0.0)))
-
-                car = ElectricCar(
-                    id=formatted_data.id,
-                    brand_name=formatted_data.l_bmarque.upper(),
-                    model_name=formatted_data.l_model.upper(),
-                    version=formatted_data.l_b_version.upper(),
-                    body_style=formatted_data.body_style,
-                    vehicle_type=formatted_data.vehicle_type,
-                    published_date=formatted_data.published_date,
-                    is_pro=bool(formatted_data.is_pro),
-                    new=formatted_data.new,
-                    first_registration_year=utilities.extract_year(
-                        formatted_data.first_registration_year
-                    ),
-                    kilometers=formatted_data.kilometers,
-                    price=pr,
-                    warranty_months=utilities.extract_int(formatted_data.warranty_months),
-                    car_pass=formatted_data.has_carpass_check,
-                    description=formatted_data.description,
-                    url=formatted_data.url,
-                    point_of_sale_city=formatted_data.point_of_sale_city,
-                    image_url=formatted_data.cover,
-                )
-
-                cars.append(car)
+                cars.append(**_decode_hit(result))
             except Exception as e:
-                logger.error(f"Error processing individual Gocar car data: {e!s}", exc_info=True)
+                logger.error(
+                    f"Error processing individual Gocar car data: {e!s}", exc_info=True
+                )
                 continue
 
     except Exception as e:
@@ -138,6 +119,48 @@ def _get_car_list_from_json(json_data):
     return cars
 
 
+def _decode_hit(hit):
+    """
+    Decode the ElectricCar attributes of a Gocar search hit.
+
+    Only the used keys of the hit are read, so keys added by Gocar are ignored
+    instead of failing the whole car as building a Formatted dataclass would.
+
+    Args:
+        hit (dict): One element of the 'hits' list of a multi-search response.
+
+    Returns:
+        dict: The ElectricCar attributes, typed as CarBatch.append() expects.
+    """
+    formatted = hit["_formatted"]
+    get = formatted.get
+
+    price = get("price") or {}
+    return {
+        "id": normalization.to_str(formatted["id"]),
+        "brand_name": formatted["l_bmarque"].upper(),
+        "model_name": formatted["l_model"].upper(),
+        "version": formatted["l_b_version"].upper(),
+        "body_style": get("body_style"),
+        "vehicle_type": get("vehicle_type"),
+        "published_date": get("published_date"),
+        "is_pro": normalization.to_bool(get("is_pro")),
+        "new": normalization.to_bool(get("new")),
+        "first_registration_year": utilities.extract_year(
+            normalization.to_str(get("first_registration_year"))
+        ),
+        "kilometers": normalization.to_int(get("kilometers")),
+        "price": float(price.get("for_filtering", price.get("unformatted", 0.0))),
+        "warranty_months": normalization.to_int(get("warranty_months")),
+        "car_pass": normalization.to_bool(get("has_carpass_check")),
+        "description": get("description"),
+        "url": get("url"),
+        "point_of_sale_city": get("point_of_sale_city"),
+        "image_url": get("cover"),
+        "source": source_name,
+    }
+
+
 def _strip_after_jpg(url):
     if url is None:
         return None
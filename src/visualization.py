@@ -4,9 +4,5 @@ def get_sort_key(brand_name, model_name):
 
 
 def get_registration_year(car):
-    # Return 0 if first_registration_year is None, otherwise return the integer value
-    return (
-        int(car.first_registration_year)
-        if car.first_registration_year is not None
-        else 0
-    )
+    # Return 0 if first_registration_year is None, otherwise the year itself
+    return car.first_registration_year or 0
@@ -0,0 +1,65 @@
+"""Parity of the DataFrame backends with the pandas reference backend."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_records
+from src.data.backends import PandasBackend, get_backend
+from src.data.car_batch import CarBatch
+
+
+pytest.importorskip("polars")
+
+
+def make_batch(rows, seed, missing_ids=0.0):
+    return CarBatch.from_records(synthetic_records(rows, seed, missing_ids))
+
+
+def run_pipeline(backend, batch, key):
+    models = [f"{car.brand_name} {car.model_name}" for car in batch]
+    years = [car.first_registration_year or 0 for car in batch]
+
+    df = backend.create_dataframe(batch)
+    df = backend.add_columns(df, model=models, year=years)
+    df = backend.add_row_hash(df, key)
+    df = backend.sort_and_deduplicate(df)
+    return backend.to_pandas(df).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("key", ["listing", "content"])
+def test_polars_dataset_matches_pandas(key):
+    batch = make_batch(2000, seed=0)
+
+    expected = run_pipeline(PandasBackend(), batch, key)
+    actual = run_pipeline(get_backend("polars"), batch, key)
+
+    # Row Hash included: both backends must save the same snapshots
+    pd.testing.assert_frame_equal(expected, actual)
+    pd.testing.assert_series_equal(expected.dtypes, actual.dtypes)
+
+
+@pytest.mark.parametrize("missing_ids", [0.0, 0.2])
+def test_polars_price_drops_match_pandas(missing_ids):
+    reference = PandasBackend()
+    frame = reference.create_dataframe(make_batch(2000, 0, missing_ids))
+    other_frame = reference.create_dataframe(make_batch(2000, 1, missing_ids))
+
+    expected = reference.detect_price_drops(frame, other_frame)
+    actual = get_backend("polars").detect_price_drops(frame, other_frame)
+
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(expected, actual, check_index_type=False)
+
+
+def test_polars_price_drops_by_listing_key_match_pandas():
+    reference = PandasBackend()
+    day1, day2 = (
+        reference.create_dataframe(make_batch(2000, seed=seed)) for seed in (0, 1)
+    )
+    day1["Listing Key"] = day1["Id"].astype(np.int64)
+    day2["Listing Key"] = day2["Id"].astype(np.int64)
+
+    expected = reference.detect_price_drops(day1, day2)
+    actual = get_backend("polars").detect_price_drops(day1, day2)
+
+    pd.testing.assert_frame_equal(expected, actual, check_index_type=False)
@@ -0,0 +1,37 @@
+"""Column storage of the car batches."""
+import pytest
+
+from src.data.car_batch import CarBatch
+
+
+def make_batch():
+    return CarBatch.from_records(
+        [
+            {"id": "1", "price": 1000.0, "kilometers": 5000, "is_pro": True},
+            {"id": "2", "price": None, "kilometers": None, "is_pro": None},
+        ]
+    )
+
+
+def test_batch_grows_and_changes_after_conversion():
+    batch = make_batch()
+    df = batch.to_dataframe()
+
+    batch.append(id="3", price=3000.0, kilometers=1000, is_pro=False)
+    batch[0].kilometers = 7000
+    batch[0].price = 1500.0
+
+    assert len(batch) == 3
+    assert all(len(column.values) == 3 for column in batch._columns.values())
+    # The DataFrame keeps the values it was created with
+    assert df["Kilometers"][0] == 5000
+    assert df["Price"].tolist()[0] == 1000.0
+
+
+def test_boolean_set_checks_the_value_type():
+    car = make_batch()[0]
+
+    with pytest.raises(TypeError):
+        car.is_pro = "yes"
+    car.is_pro = None
+    assert car.is_pro is None
@@ -0,0 +1,50 @@
+"""Make and model matching of the cleaning step."""
+import pytest
+
+from src.data.electric_car_data import ElectricCar
+from src.data_cleaning import CleaningRules, clean_car
+
+
+def make_car(brand_name, model_name, description=""):
+    return ElectricCar(
+        id="1",
+        brand_name=brand_name,
+        model_name=model_name,
+        version="",
+        body_style="BERLINE",
+        vehicle_type="",
+        published_date="2024-01-01",
+        is_pro=False,
+        new=False,
+        first_registration_year=2021,
+        kilometers=12000,
+        price=30000.0,
+        warranty_months=0,
+        car_pass=None,
+        description=description,
+        url="https://www.gocar.be/a/1",
+        image_url="",
+        point_of_sale_city="",
+    )
+
+
+@pytest.mark.parametrize(
+    ("brand_name", "model_name", "expected"),
+    [
+        # Weak exact hits: the single character 3, and the S of TESLA
+        ("TESLA", "MODLE 3", "MODEL 3"),
+        ("TESLA", "MODL Y", "MODEL Y"),
+        ("TESLA", "MODEL Y", "MODEL Y"),
+        ("TESLA", "3", "3"),
+        ("VOLKSWAGON", "ID3", "ID.3"),
+    ],
+)
+def test_clean_car_matches_misspelled_models(brand_name, model_name, expected):
+    car = make_car(brand_name, model_name, "Long range")
+
+    assert clean_car(car, CleaningRules({}))
+    assert car.model_name == expected
+
+
+def test_clean_car_discards_unknown_models_of_known_makes():
+    assert not clean_car(make_car("RENAULT", "CLIO"), CleaningRules({}))
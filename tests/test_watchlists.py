@@ -0,0 +1,79 @@
+"""Watchlist matching against a brute force scan."""
+import numpy as np
+import pandas as pd
+
+from src.data.watchlists import Watchlist, WatchlistIndex
+
+
+MAKES = [("TESLA", "MODEL 3"), ("TESLA", "MODEL Y"), ("RENAULT", "ZOE")]
+
+
+def random_bound(generator, low, high):
+    return None if generator.random() < 0.3 else int(generator.integers(low, high))
+
+
+def test_index_matches_brute_force():
+    generator = np.random.default_rng(0)
+    watchlists = []
+    for number in range(300):
+        brand, model = MAKES[generator.integers(len(MAKES))]
+        scope = generator.random()
+        watchlists.append(
+            Watchlist(
+                f"watchlist_{number}",
+                brand if scope < 0.9 else None,
+                model if scope < 0.7 else None,
+                random_bound(generator, 1000, 20000),
+                random_bound(generator, 10000, 60000),
+                random_bound(generator, 2012, 2022),
+                random_bound(generator, 2018, 2026),
+                random_bound(generator, 0, 50000),
+                random_bound(generator, 40000, 200000),
+            )
+        )
+    rows = 2000
+    chosen = generator.integers(len(MAKES), size=rows)
+    unknown = generator.random((3, rows)) < 0.1
+    df = pd.DataFrame(
+        {
+            "Brand Name": [MAKES[number][0] for number in chosen],
+            "Model Name": [MAKES[number][1] for number in chosen],
+            "Price": np.where(
+                unknown[0], np.nan, generator.integers(2000, 70000, rows)
+            ),
+            "year": np.where(unknown[1], 0, generator.integers(2012, 2025, rows)),
+            "Kilometers": np.where(
+                unknown[2], np.nan, generator.integers(0, 250000, rows)
+            ),
+        }
+    )
+
+    def within(values, low, high):
+        # Unknown values only match unbounded criteria
+        if low is None and high is None:
+            return np.ones(len(values), dtype=np.bool_)
+        low = -np.inf if low is None else low
+        high = np.inf if high is None else high
+        return (low <= values) & (values <= high)
+
+    expected = {}
+    for watchlist in watchlists:
+        mask = (
+            within(df["Price"], watchlist.min_price, watchlist.max_price)
+            & within(
+                df["year"].replace(0, np.nan), watchlist.min_year, watchlist.max_year
+            )
+            & within(df["Kilometers"], watchlist.min_km, watchlist.max_km)
+        )
+        if watchlist.brand is not None:
+            mask &= df["Brand Name"] == watchlist.brand
+        if watchlist.model is not None:
+            mask &= df["Model Name"] == watchlist.model
+        if mask.any():
+            expected[watchlist.name] = np.flatnonzero(mask.to_numpy())
+
+    actual = WatchlistIndex(watchlists).match(df)
+
+    assert actual.keys() == expected.keys()
+    for name, rows in expected.items():
+        np.testing.assert_array_equal(actual[name], rows)